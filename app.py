@@ -1,21 +1,55 @@
-from flask import Flask, jsonify
+from flask import Flask, g, request
 import os
+import time
+
+import instrumentation
+import wglog
+from app_metrics import RequestMetrics, web_threads
+from app_payloads import ProbeFastPath, StaticPayload, compression_settings
 
 app = Flask(__name__)
 
+# PERFORMANCE_MONITORING times every request and exposes /metrics
+if os.getenv('PERFORMANCE_MONITORING', 'true').lower() == 'true':
+    metrics = RequestMetrics(worker_threads=web_threads())
+    metrics.init_app(app)
+
+# Static payloads are serialised, compressed and tagged once at import
+HOME = StaticPayload.json({
+    "message": "Welcome to WoodenGhost!",
+    "status": "running",
+    "environment": os.getenv('ENV', 'production')
+}, **compression_settings())
+HEALTH = StaticPayload.json({"status": "healthy"}, **compression_settings())
+
+# PROBE_FAST_PATH answers orchestrator health probes without entering flask
+if os.getenv('PROBE_FAST_PATH', 'true').lower() == 'true':
+    app.wsgi_app = ProbeFastPath(app.wsgi_app, {'/health': HEALTH})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "message": "Welcome to WoodenGhost!",
-        "status": "running",
-        "environment": os.getenv('ENV', 'production')
-    })
+    return HOME.response(request)
 
 @app.route('/health')
 def health_check():
-    return jsonify({"status": "healthy"}), 200
+    return HEALTH.response(request)
+
+def instrument_requests(application: Flask):
+    """Time every request as a phase of the instrumentation summary written when the server stops"""
+    @application.before_request
+    def start_phase():
+        g.instrument_started = (time.perf_counter(), time.thread_time())
+
+    @application.teardown_request
+    def end_phase(exc):
+        started = g.pop('instrument_started', None)
+        if started is not None:
+            instrumentation.record('request', time.perf_counter() - started[0], time.thread_time() - started[1])
 
 if __name__ == '__main__':
+    wglog.configure()
+    if instrumentation.setup('app').enabled:
+        instrument_requests(app)
     port = int(os.getenv('PORT', 8000))
     debug = os.getenv('ENV') == 'development'
     app.run(host='0.0.0.0', port=port, debug=debug) 
\ No newline at end of file
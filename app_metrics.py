@@ -0,0 +1,178 @@
+"""
+app_metrics   request timing and process statistics for the woodenghost flask app
+times every request by route method and status into fixed bucket histograms
+and renders them with process stats in prometheus text format on /metrics
+each gunicorn worker keeps its own numbers, samples carry a pid label to tell them apart
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from flask import Flask, Response, g, request
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Upper bounds in seconds, in the spirit of the prometheus client defaults
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def env_int(name: str, default: int) -> int:
+    """Integer setting from the environment, the default when it is unset or malformed"""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def web_threads() -> int:
+    """Threads per worker from WEB_THREADS, shared by the app and serve.py so both agree"""
+    return max(1, env_int('WEB_THREADS', 4))
+
+
+class BucketHistogram:
+    """Cumulative-ready bucket counts, one list increment per observation"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def resident_memory_bytes() -> int:
+    """Current RSS on Linux, peak RSS elsewhere, -1 when unknown"""
+    if resource is None:
+        return -1
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def open_file_descriptors() -> int:
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return -1
+
+
+class RequestMetrics:
+    """Flask extension collecting per route latency histograms and serving /metrics"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, worker_threads: int = 1):
+        self.buckets = buckets
+        self.worker_threads = max(1, worker_threads)
+        self.histograms: Dict[Tuple[str, str, str], BucketHistogram] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask, path: str = '/metrics'):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        app.add_url_rule(path, 'metrics', self.metrics_view)
+
+    def _before(self):
+        g._metrics_start = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+            if self.in_flight > self.peak_in_flight:
+                self.peak_in_flight = self.in_flight
+
+    def _after(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _teardown(self, exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        status = str(g.pop('_metrics_status', 500))
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        key = (route, request.method, status)
+        with self._lock:
+            self.in_flight -= 1
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = BucketHistogram(self.buckets)
+            histogram.observe(elapsed)
+
+    def render(self) -> str:
+        pid = os.getpid()
+        lines: List[str] = [
+            '# HELP woodenghost_request_duration_seconds Request latency by route, method and status',
+            '# TYPE woodenghost_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            snapshot = [(key, list(h.counts), h.total, h.count) for key, h in sorted(self.histograms.items())]
+            in_flight = self.in_flight
+            peak = self.peak_in_flight
+
+        for (route, method, status), counts, total, count in snapshot:
+            labels = f'route="{route}",method="{method}",status="{status}",pid="{pid}"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'woodenghost_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'woodenghost_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'woodenghost_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'woodenghost_request_duration_seconds_count{{{labels}}} {count}')
+
+        gauges = [
+            ('requests_in_flight', 'Requests currently being served by this worker', in_flight),
+            ('requests_in_flight_peak', 'Highest concurrent requests seen by this worker', peak),
+            ('worker_threads', 'Request threads configured per worker', self.worker_threads),
+            ('thread_pool_saturation', 'In flight requests over configured threads', in_flight / self.worker_threads),
+            ('process_threads', 'Live Python threads', threading.active_count()),
+            ('process_resident_memory_bytes', 'Resident set size', resident_memory_bytes()),
+            ('process_open_fds', 'Open file descriptors', open_file_descriptors()),
+            ('process_cpu_seconds_total', 'User and system CPU time', time.process_time()),
+            ('process_start_time_seconds', 'Unix time the metrics were initialised', self.started),
+        ]
+        for name, help_text, value in gauges:
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            lines += [
+                f'# HELP woodenghost_{name} {help_text}',
+                f'# TYPE woodenghost_{name} {kind}',
+                f'woodenghost_{name}{{pid="{pid}"}} {value}',
+            ]
+
+        lines += [
+            '# HELP woodenghost_gc_collections_total Garbage collector runs per generation',
+            '# TYPE woodenghost_gc_collections_total counter',
+        ]
+        for generation, stats in enumerate(gc.get_stats()):
+            lines.append(f'woodenghost_gc_collections_total{{generation="{generation}",pid="{pid}"}} {stats["collections"]}')
+        lines += [
+            '# HELP woodenghost_gc_objects_tracked Objects pending collection per generation',
+            '# TYPE woodenghost_gc_objects_tracked gauge',
+        ]
+        for generation, pending in enumerate(gc.get_count()):
+            lines.append(f'woodenghost_gc_objects_tracked{{generation="{generation}",pid="{pid}"}} {pending}')
+
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self) -> Response:
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,145 @@
+"""
+app_payloads   pre encoded responses for the woodenghost flask app
+static json payloads are serialised and compressed once at startup and served as bytes
+with strong etags and 304 answers to conditional requests
+probe routes can skip flask entirely through a wsgi fast path
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from flask import Request, Response
+
+from app_metrics import env_int
+
+try:
+    import brotli
+except ImportError:
+    # Optional, gzip alone covers every client
+    brotli = None
+
+# Payloads smaller than this go out as they are, compressing them saves less than the headers cost
+DEFAULT_MIN_SIZE = 1024
+NOT_MODIFIED = '304 Not Modified'
+
+Headers = List[Tuple[str, str]]
+
+
+@lru_cache(maxsize=64)
+def accepted_encodings(header: str) -> FrozenSet[str]:
+    """Codings an Accept-Encoding header allows, clients send only a handful of distinct headers"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q=') and params[2:].strip('0.') == '':
+            continue
+        accepted.add(coding.strip().lower())
+    return frozenset(accepted)
+
+
+def etag_matches(header: Optional[str], tags: FrozenSet[str]) -> bool:
+    """Weak If-None-Match comparison, any representation of the same payload counts"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(candidate.strip().removeprefix('W/') in tags for candidate in header.split(','))
+
+
+class StaticPayload:
+    """One response body in every encoding worth sending, with its headers built ahead of time"""
+
+    def __init__(self, body: bytes, content_type: str = 'application/json', status: int = 200,
+                 min_size: int = DEFAULT_MIN_SIZE, compress: bool = True, cache_control: str = 'no-cache'):
+        self.status = f"{status} {HTTPStatus(status).phrase}"
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        common = [('Content-Type', content_type), ('Cache-Control', cache_control)]
+        variants: Dict[str, Tuple[bytes, Headers]] = {}
+
+        encodings = {}
+        if compress and len(body) >= min_size:
+            # mtime=0 keeps the bytes, and so the etag, identical across workers and restarts
+            encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                encodings['br'] = brotli.compress(body, quality=11)
+        vary = [('Vary', 'Accept-Encoding')] if encodings else []
+
+        identity_tag = f'"{digest}"'
+        variants['identity'] = (body, common + vary + [('ETag', identity_tag),
+                                                       ('Content-Length', str(len(body)))])
+        for coding, encoded in encodings.items():
+            if len(encoded) < len(body):
+                variants[coding] = (encoded, common + vary + [('ETag', f'"{digest}-{coding}"'),
+                                                              ('Content-Encoding', coding),
+                                                              ('Content-Length', str(len(encoded)))])
+        self.variants = variants
+        # Preferred first, brotli is smaller when both are on offer
+        self.preference = [coding for coding in ('br', 'gzip') if coding in variants]
+        self.tags = frozenset(dict(headers)['ETag'] for _, headers in variants.values())
+        self.not_modified = {coding: [(name, value) for name, value in headers
+                                      if name in ('ETag', 'Cache-Control', 'Vary')]
+                             for coding, (_, headers) in variants.items()}
+
+    @classmethod
+    def json(cls, payload, **kwargs) -> 'StaticPayload':
+        """Serialise like flask's jsonify does so clients see the same bytes as before"""
+        body = (json.dumps(payload, separators=(',', ':'), sort_keys=True) + '\n').encode('utf-8')
+        return cls(body, **kwargs)
+
+    def select(self, accept_encoding: Optional[str]) -> str:
+        if accept_encoding and self.preference:
+            accepted = accepted_encodings(accept_encoding)
+            for coding in self.preference:
+                if coding in accepted:
+                    return coding
+        return 'identity'
+
+    def respond(self, if_none_match: Optional[str], accept_encoding: Optional[str]) -> Tuple[str, Headers, bytes]:
+        """Status line, headers and body for a request, all of them prepared at startup"""
+        coding = self.select(accept_encoding)
+        if etag_matches(if_none_match, self.tags):
+            return NOT_MODIFIED, self.not_modified[coding], b''
+        body, headers = self.variants[coding]
+        return self.status, headers, body
+
+    def response(self, request: Request) -> Response:
+        """The payload as a flask response for views that still go through the app"""
+        status, headers, body = self.respond(request.headers.get('If-None-Match'),
+                                             request.headers.get('Accept-Encoding'))
+        return Response(body, status=status, headers=headers)
+
+
+class ProbeFastPath:
+    """WSGI middleware answering GET and HEAD on probe paths before flask builds a request
+
+    Probes served here skip before and after request hooks, so they do not show
+    up in /metrics or the instrumentation summary, that is the point of it.
+    """
+
+    def __init__(self, wsgi_app, probes: Dict[str, StaticPayload]):
+        self.wsgi_app = wsgi_app
+        self.probes = probes
+
+    def __call__(self, environ, start_response):
+        payload = self.probes.get(environ.get('PATH_INFO'))
+        method = environ.get('REQUEST_METHOD')
+        if payload is None or (method != 'GET' and method != 'HEAD'):
+            return self.wsgi_app(environ, start_response)
+        status, headers, body = payload.respond(environ.get('HTTP_IF_NONE_MATCH'),
+                                                environ.get('HTTP_ACCEPT_ENCODING'))
+        start_response(status, list(headers))
+        return [] if method == 'HEAD' or status is NOT_MODIFIED else [body]
+
+
+def compression_settings() -> Dict:
+    """StaticPayload keyword arguments from RESPONSE_COMPRESSION and COMPRESS_MIN_BYTES"""
+    return {
+        'compress': os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true',
+        'min_size': env_int('COMPRESS_MIN_BYTES', DEFAULT_MIN_SIZE),
+    }
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+bench   performance baselines for wooden ghost tools
+times the hot path of every tool over generated fixtures and keeps the results as json
+compare checks a run against a baseline and fails when anything got slower than the threshold allows
+importtime holds every entry point to an import time budget measured with python -X importtime
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import wglog
+
+logger = logging.getLogger('WoodenGhost.Bench')
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_RESULTS = 'bench_results.json'
+
+# Milliseconds each entry point may spend importing, cumulative as python -X importtime reports it.
+# Roughly twice what a slow single core machine measures, so only a new eager heavy import trips them.
+IMPORT_BUDGETS = {
+    'app': 300,
+    'bench': 150,
+    'chat': 200,
+    'cleanmd': 120,
+    'eve_analyze': 250,
+    'eve_api_tester': 200,
+    'eve_batch': 200,
+    'eve_journal': 120,
+    'gistsync': 200,
+    'pomrepair': 150,
+    'repairxml': 120,
+    'serve': 300,
+    'standin': 450,
+    'syntaxguru': 120,
+    'workspace': 120,
+}
+
+MARKDOWN_TEMPLATE = """# Note {index}
+
+Some text about [wooden ghost](https://example.com/{index}) and the way it drifts.
+
+## Section
+
+* first point
+* second point with a [link](https://example.com/a/{index})
+- third point
+
+---
+
+Closing paragraph {index} with no markup at all, only words that repeat words that repeat.
+"""
+
+XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<config id="{index}">
+  <name>fixture {index}</name>
+  <entries>
+{entries}  </entries>
+</config>
+"""
+
+PYTHON_TEMPLATE = '''"""fixture module {index}"""
+
+import os
+
+
+class Fixture{index}:
+    def __init__(self, value):
+        self.value = value
+
+    def compute(self, factor=2):
+        total = 0
+        for step in range(self.value):
+            total += step * factor
+        return total
+
+
+def helper_{index}(items):
+    return [item for item in items if item and os.path.basename(str(item))]
+'''
+
+POM_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <groupId>com.example</groupId>
+    <artifactId>fixture-{index}</artifactId>
+    <version>1.0.{index}</version>
+    <packaging>jar</packaging>
+    <properties>
+        <maven.compiler.source>17</maven.compiler.source>
+    </properties>
+    <dependencies>
+{dependencies}    </dependencies>
+    <build>
+        <plugins>
+            <plugin>
+                <groupId>org.apache.maven.plugins</groupId>
+                <artifactId>maven-compiler-plugin</artifactId>
+                <version>3.11.0</version>
+                <configuration>
+                    <source>17</source>
+                    <target>17</target>
+                </configuration>
+            </plugin>
+        </plugins>
+    </build>
+</project>
+"""
+
+POM_DEPENDENCY = """        <dependency>
+            <groupId>org.example.lib{number}</groupId>
+            <artifactId>library-{number}</artifactId>
+            <version>2.{number}.0</version>
+            <scope>compile</scope>
+        </dependency>
+"""
+
+
+def corrupt_pom(text: str) -> str:
+    """The damage pomrepair exists for, every angle bracket after the prolog stripped"""
+    prolog, _, body = text.partition('\n')
+    return prolog + '\n' + body.replace('<', '').replace('>', '')
+
+
+def build_fixtures(root: Path, count: int, poms: int, dependencies: int):
+    """Write count markdown, xml and python files spread over nested directories, plus corrupted poms"""
+    for index in range(count):
+        directory = root / 'tree' / f'group{index % 16:02d}' / f'part{index % 5}'
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f'note{index}.md').write_text(MARKDOWN_TEMPLATE.format(index=index), encoding='utf-8')
+        entries = ''.join(f'    <entry key="k{n}">value {n}</entry>\n' for n in range(index % 20 + 1))
+        (directory / f'config{index}.xml').write_text(XML_TEMPLATE.format(index=index, entries=entries),
+                                                      encoding='utf-8')
+        (directory / f'module{index}.py').write_text(PYTHON_TEMPLATE.format(index=index), encoding='utf-8')
+    # A few files the tools have something to do with
+    broken = root / 'tree' / 'group00' / 'part0'
+    (broken / 'garbage.xml').write_text('﻿\x00junk<root><leaf/></root>\n', encoding='utf-8')
+    (broken / 'broken.py').write_text('def broken(:\n    pass\n', encoding='utf-8')
+    for index in range(poms):
+        deps = ''.join(POM_DEPENDENCY.format(number=n) for n in range(dependencies))
+        directory = root / 'poms' / f'pom{index}'
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / 'pom.xml').write_text(corrupt_pom(POM_TEMPLATE.format(index=index, dependencies=deps)),
+                                           encoding='utf-8')
+
+
+def measure(name: str, call: Callable[[], object], rounds: int,
+            setup: Optional[Callable[[], None]] = None, operations: float = 1, unit: str = 'ops') -> Dict:
+    """Run call rounds times, setup before each round is not timed, operations counts units of work per round"""
+    samples = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    result = {
+        'rounds': rounds,
+        'operations': operations,
+        'min': min(samples),
+        'median': median,
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'ops_per_sec': operations / median if median > 0 else 0.0,
+        'unit': unit,
+    }
+    logger.info(f"◆ {name:<32} median {median * 1000:9.2f} ms  "
+                f"{result['ops_per_sec']:10.1f} {unit}/s  ±{result['stdev'] * 1000:.2f} ms")
+    return result
+
+
+class BenchmarkSuite:
+    """Every benchmark case, run in turn over one generated fixture tree"""
+
+    def __init__(self, workdir: Path, count: int, rounds: int, poms: int, dependencies: int,
+                 requests: int, concurrency: int, only: Optional[List[str]] = None):
+        self.workdir = workdir
+        self.count = count
+        self.rounds = rounds
+        self.poms = poms
+        self.dependencies = dependencies
+        self.requests = requests
+        self.concurrency = concurrency
+        self.only = only
+        self.results: Dict[str, Dict] = {}
+        self.skipped: Dict[str, str] = {}
+
+    def cases(self) -> Dict[str, Callable[[], None]]:
+        return {
+            'cleanmd': self.bench_cleanmd,
+            'repairxml': self.bench_repairxml,
+            'syntaxguru': self.bench_syntaxguru,
+            'pomrepair': self.bench_pomrepair,
+            'flask': self.bench_flask,
+            'tester': self.bench_tester,
+        }
+
+    def run(self) -> Dict[str, Dict]:
+        build_fixtures(self.workdir / 'fixtures', self.count, self.poms, self.dependencies)
+        for name, case in self.cases().items():
+            if self.only and name not in self.only:
+                continue
+            try:
+                case()
+            except ImportError as e:
+                # Optional dependencies, the other cases are still worth having
+                self.skipped[name] = str(e)
+                logger.warning(f"⚠ skipped {name}: {e}")
+        return self.results
+
+    def fresh_tree(self, name: str) -> Path:
+        """A private copy of the fixture tree for tools that change files or leave caches behind"""
+        target = self.workdir / name
+        if target.exists():
+            shutil.rmtree(target)
+        shutil.copytree(self.workdir / 'fixtures' / 'tree', target)
+        return target
+
+    def bench_cleanmd(self):
+        from cleanmd import SafeMarkdownConverter
+        converter = SafeMarkdownConverter(str(self.workdir))
+        sample = MARKDOWN_TEMPLATE.format(index=0)
+        document = sample * 2000
+        self.results['cleanmd.convert_content'] = measure(
+            'cleanmd.convert_content', lambda: converter.convert_content(document), self.rounds,
+            operations=len(document) / 1e6, unit='MB')
+
+        state = {}
+
+        def setup():
+            state['root'] = self.fresh_tree('cleanmd')
+
+        def call():
+            SafeMarkdownConverter(str(state['root'])).process_files()
+
+        self.results['cleanmd.process_files'] = measure('cleanmd.process_files', call, self.rounds,
+                                                        setup=setup, operations=self.count, unit='files')
+
+    def bench_repairxml(self):
+        from repairxml import XMLRepairer
+        root = self.fresh_tree('repairxml')
+        files = self.count + 1
+        self.results['repairxml.cold'] = measure(
+            'repairxml.scan_and_repair cold', lambda: XMLRepairer(str(root), force=True).scan_and_repair(),
+            self.rounds, operations=files, unit='files')
+        XMLRepairer(str(root)).scan_and_repair()
+        self.results['repairxml.warm'] = measure(
+            'repairxml.scan_and_repair warm', lambda: XMLRepairer(str(root)).scan_and_repair(),
+            self.rounds, operations=files, unit='files')
+
+    def bench_syntaxguru(self):
+        # The command line end to end, its module state lives for one run only
+        root = self.fresh_tree('syntaxguru')
+        script = str(HERE / 'syntaxguru.py')
+
+        def audit(*flags: str):
+            subprocess.run([sys.executable, script, str(root), *flags], cwd=str(HERE),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        files = self.count * 2 + 2
+        self.results['syntaxguru.cold'] = measure('syntaxguru.main cold', lambda: audit('--no-cache'),
+                                                  self.rounds, operations=files, unit='files')
+        audit()
+        self.results['syntaxguru.warm'] = measure('syntaxguru.main warm', audit, self.rounds,
+                                                  operations=files, unit='files')
+
+    def bench_pomrepair(self):
+        from pomrepair import repair_pom_text, repair_poms, find_poms
+        text = corrupt_pom(POM_TEMPLATE.format(
+            index=0, dependencies=''.join(POM_DEPENDENCY.format(number=n) for n in range(self.dependencies))))
+        self.results['pomrepair.repair_pom_text'] = measure(
+            'pomrepair.repair_pom_text', lambda: repair_pom_text(text), self.rounds,
+            operations=len(text) / 1e6, unit='MB')
+
+        state = {}
+
+        def setup():
+            target = self.workdir / 'poms'
+            if target.exists():
+                shutil.rmtree(target)
+            shutil.copytree(self.workdir / 'fixtures' / 'poms', target)
+            state['poms'] = find_poms(str(target))
+
+        self.results['pomrepair.repair_poms'] = measure(
+            'pomrepair.repair_poms (fixpom)', lambda: repair_poms(state['poms']), self.rounds,
+            setup=setup, operations=self.poms, unit='poms')
+
+    def bench_flask(self):
+        from app import app
+        client = app.test_client()
+        requests = max(100, self.requests)
+
+        def call():
+            for _ in range(requests):
+                client.get('/health')
+
+        self.results['flask.health'] = measure('app /health', call, self.rounds, operations=requests,
+                                               unit='req')
+
+    def bench_tester(self):
+        import asyncio
+
+        from standin import StandinConfig, running_standin
+        from eve_api_tester import EVEAPITester
+
+        async def load_once(endpoint: str = 'health', method: str = 'GET', data: Optional[Dict] = None,
+                            stream: bool = False):
+            async with running_standin(StandinConfig(seed=1, reply_words=20)) as base_url:
+                os.environ['KINDROID_BASE_URL'] = base_url
+                tester = EVEAPITester(config_path=str(HERE / 'environment.config'), use_cache=False)
+                try:
+                    report = await tester.run_load_test(endpoint, method, data, concurrency=self.concurrency,
+                                                        rate=0, total_requests=self.requests, stream=stream)
+                finally:
+                    await tester.close()
+                if report.error_count:
+                    raise RuntimeError(f"{report.error_count} of {report.total_requests} requests failed")
+
+        message = {'message': 'benchmark'}
+        previous = os.environ.get('KINDROID_BASE_URL')
+        try:
+            self.results['tester.load'] = measure('eve_api_tester load vs standin',
+                                                  lambda: asyncio.run(load_once()), self.rounds,
+                                                  operations=self.requests, unit='req')
+            self.results['tester.messages'] = measure(
+                'eve_api_tester messages', lambda: asyncio.run(load_once('messages', 'POST', message)),
+                self.rounds, operations=self.requests, unit='req')
+            self.results['tester.stream'] = measure(
+                'eve_api_tester messages streamed',
+                lambda: asyncio.run(load_once('messages', 'POST', message, stream=True)),
+                self.rounds, operations=self.requests, unit='req')
+        finally:
+            if previous is None:
+                os.environ.pop('KINDROID_BASE_URL', None)
+            else:
+                os.environ['KINDROID_BASE_URL'] = previous
+
+
+def run_suite(args: argparse.Namespace) -> int:
+    sys.path.insert(0, str(HERE))
+    workdir = Path(tempfile.mkdtemp(prefix='wg-bench-'))
+    suite = BenchmarkSuite(workdir, args.files, args.rounds, args.poms, args.dependencies,
+                           args.requests, args.concurrency, args.only)
+    logger.info(f"◇ fixtures: {args.files} of each kind, {args.poms} poms, {args.rounds} rounds in {workdir}")
+    # The tools log every file they touch, which would be timed too, only our own lines stay
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    root_logger.setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    try:
+        results = suite.run()
+    finally:
+        root_logger.setLevel(previous_level)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    document = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'files': args.files,
+            'poms': args.poms,
+            'rounds': args.rounds,
+            'requests': args.requests,
+            'skipped': suite.skipped,
+        },
+        'benchmarks': results,
+    }
+    Path(args.output).write_text(json.dumps(document, indent=2) + '\n', encoding='utf-8')
+    logger.info(f"✓ {len(results)} benchmarks written to {args.output}")
+    return 0
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Names of the benchmarks whose median grew by more than threshold, a fraction of the baseline"""
+    regressions = []
+    for key in ('files', 'poms', 'requests', 'cpus'):
+        if baseline.get('meta', {}).get(key) != current.get('meta', {}).get(key):
+            logger.warning(f"⚠ runs differ in {key}, timings are not directly comparable")
+    base_runs = baseline.get('benchmarks', {})
+    for name, result in sorted(current.get('benchmarks', {}).items()):
+        base = base_runs.get(name)
+        if base is None:
+            logger.info(f"○ {name:<32} new, no baseline")
+            continue
+        change = result['median'] / base['median'] - 1 if base['median'] > 0 else 0.0
+        if change > threshold:
+            marker = '✗'
+            regressions.append(name)
+        elif change < -threshold:
+            marker = '✓'
+        else:
+            marker = '○'
+        logger.info(f"{marker} {name:<32} {base['median'] * 1000:9.2f} ms -> {result['median'] * 1000:9.2f} ms  "
+                    f"{change * 100:+6.1f}%")
+    for name in sorted(set(base_runs) - set(current.get('benchmarks', {}))):
+        logger.info(f"◇ {name:<32} missing from this run")
+    return regressions
+
+
+def compare_files(args: argparse.Namespace) -> int:
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    current = json.loads(Path(args.current).read_text(encoding='utf-8'))
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        logger.error(f"✗ {len(regressions)} benchmarks slower than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    logger.info(f"✓ no regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+def import_profile(module: str) -> Dict:
+    """Cumulative import time of module and its three heaviest direct imports, in milliseconds"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=HERE, capture_output=True, text=True)
+    launch = time.perf_counter() - started
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    total = 0.0
+    children = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative) / 1000
+        elif depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+    return {'import': total, 'launch': launch * 1000, 'heaviest': sorted(children, reverse=True)[:3]}
+
+
+def check_import_budgets(args: argparse.Namespace) -> int:
+    """Fastest of a few runs per module, so a busy machine does not fail the check on its own"""
+    over = []
+    for module, budget in sorted(IMPORT_BUDGETS.items()):
+        if args.only and module not in args.only:
+            continue
+        try:
+            runs = [import_profile(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            logger.warning(f"⚠ {module:<16} not importable here: {e}")
+            continue
+        best = min(runs, key=lambda run: run['import'])
+        limit = budget * args.scale
+        marker = '✓' if best['import'] <= limit else '✗'
+        logger.info(f"{marker} {module:<16} {best['import']:7.1f} ms import {best['launch']:7.1f} ms launch  "
+                    f"budget {limit:5.0f} ms")
+        if best['import'] > limit:
+            over.append(module)
+            for cost, name in best['heaviest']:
+                logger.info(f"    □ {name:<28} {cost:7.1f} ms")
+    if over:
+        logger.error(f"✗ {len(over)} entry points over their import budget: {', '.join(over)}")
+        return 1
+    logger.info("✓ every entry point within its import budget")
+    return 0
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the wooden ghost tools and compare runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="time every tool over generated fixtures")
+    run.add_argument("--output", default=DEFAULT_RESULTS, help=f"results file (default: {DEFAULT_RESULTS})")
+    run.add_argument("--files", type=int, default=500, help="markdown, xml and python files each (default: 500)")
+    run.add_argument("--poms", type=int, default=20, help="corrupted pom.xml files (default: 20)")
+    run.add_argument("--dependencies", type=int, default=50, help="dependencies per pom (default: 50)")
+    run.add_argument("--rounds", type=int, default=5, help="timed rounds per benchmark (default: 5)")
+    run.add_argument("--requests", type=int, default=500, help="requests per http round (default: 500)")
+    run.add_argument("--concurrency", type=int, default=16, help="requests in flight against the stand-in")
+    run.add_argument("--only", nargs="+", default=None,
+                     choices=["cleanmd", "repairxml", "syntaxguru", "pomrepair", "flask", "tester"],
+                     help="run these benchmarks only")
+    run.add_argument("--keep", action="store_true", help="leave the fixture directory behind")
+
+    compare = commands.add_parser("compare", help="fail when a run is slower than a baseline")
+    compare.add_argument("baseline", help="results file to compare against")
+    compare.add_argument("current", nargs="?", default=DEFAULT_RESULTS, help="results file of this run")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="allowed slowdown of the median as a fraction (default: 0.10)")
+
+    importtime = commands.add_parser("importtime", help="fail when an entry point imports more than its budget")
+    importtime.add_argument("--repeat", type=int, default=3, help="imports per module, the fastest counts")
+    importtime.add_argument("--scale", type=float, default=1.0,
+                            help="multiply every budget, for machines far slower or faster than usual")
+    importtime.add_argument("--only", nargs="+", default=None, choices=sorted(IMPORT_BUDGETS),
+                            help="check these modules only")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    if args.command == "run":
+        return run_suite(args)
+    if args.command == "importtime":
+        return check_import_budgets(args)
+    return compare_files(args)
+
+
+if __name__ == '__main__':
+    wglog.configure('%(asctime)s %(message)s')
+    sys.exit(main())
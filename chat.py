@@ -6,9 +6,15 @@ wooden.ghost interactive chat interface
 this script provides a simple and aesthetic
 command line interface for real time interaction with eve
 based on the temporal optimization framework
+replies are streamed and printed as they arrive
 """
 
 import asyncio
+import logging
+import sys
+
+import instrumentation
+import wglog
 from kindroidadapter.client import KindroidClient
 from kindroidadapter.utils.logger import log
 
@@ -33,8 +39,16 @@ async def chat_with_eve():
             if not user_input.strip():
                 continue
 
-            response = await client.send_message(user_input)
-            log.info(response)
+            with instrumentation.phase('network'):
+                stream = client.stream_message(user_input)
+                sys.stdout.write("eve ◆ ")
+                async for chunk in stream:
+                    sys.stdout.write(chunk)
+                    sys.stdout.flush()
+                sys.stdout.write("\n")
+            timing = stream.timing
+            log.debug(f"first byte {timing.ttfb:.3f}s, first text {timing.first_chunk:.3f}s, "
+                      f"whole reply {timing.total:.3f}s over {timing.chunks} chunks")
 
     except KeyboardInterrupt:
         log.info("\nsession interrupted. ending temporal synchronization.")
@@ -45,6 +59,10 @@ async def chat_with_eve():
         log.info("session closed.")
 
 if __name__ == "__main__":
+    wglog.configure()
+    if instrumentation.setup('chat').verbose:
+        # Per message timings are debug output
+        log.setLevel(logging.DEBUG)
     try:
         asyncio.run(chat_with_eve())
     except KeyboardInterrupt:
@@ -4,65 +4,336 @@ cleanmd   safe markdown to text converter
 this script exclusively targets .md and .mdx files for conversion to plain text
 it avoids scanning or modifying other file types to prevent code corruption
 """
+import argparse
+import hashlib
+import io
+import json
 import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
+from typing import Callable, Dict, List, Optional
+
+import instrumentation
+import wglog
+from workspace import collect_files
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s ○ %(message)s', datefmt='%H:%M:%S')
 logger = logging.getLogger('WoodenGhost.CleanMD')
 
+MARKDOWN_SUFFIXES = ('.md', '.mdx', '.markdown')
+MANIFEST_NAME = '.cleanmd_manifest.json'
+
+# Below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+# Text converted at once, big enough to amortise the regex calls and small enough to bound memory
+SEGMENT_SIZE = 1 << 20
+READ_SIZE = 1 << 16
+
+# Characters a rule needs to see before it can change anything
+RULE_MARKERS = {
+    'headers': '#',
+    'lists': '*-',
+    'links': '[',
+    'separators': '-*_',
+}
+SAFE_LINE_ENDINGS = '.,;:!?"\''
+
+# Progress of the link rule through [text](url), tracked across reads
+LINK_IDLE, LINK_TEXT_EMPTY, LINK_TEXT, LINK_CLOSED, LINK_URL_EMPTY, LINK_URL = range(6)
+
+def _last_safe_line_end(text: str, before: str = '') -> int:
+    """Index just past the last newline in text that a segment may end on, 0 when none
+
+    before is the character preceding text, what a newline at its very start ends.
+    """
+    end = len(text)
+    while True:
+        newline = text.rfind('\n', 0, end)
+        if newline < 0:
+            return 0
+        last = text[newline - 1] if newline else before
+        if last and (last.isalnum() or last in SAFE_LINE_ENDINGS):
+            return newline + 1
+        end = newline
+
+def _advance_links(state: int, text: str) -> int:
+    """Feed text to the link matcher, LINK_IDLE means no link can still span what follows"""
+    position = 0
+    length = len(text)
+    while position < length:
+        if state == LINK_IDLE:
+            position = text.find('[', position)
+            if position < 0:
+                return LINK_IDLE
+            state = LINK_TEXT_EMPTY
+            position += 1
+        elif state == LINK_CLOSED:
+            if text[position] == '(':
+                state = LINK_URL_EMPTY
+                position += 1
+            else:
+                # No link here, rescan this character from idle
+                state = LINK_IDLE
+        else:
+            closing = ']' if state in (LINK_TEXT_EMPTY, LINK_TEXT) else ')'
+            end = text.find(closing, position)
+            if end < 0:
+                return state + 1 if state in (LINK_TEXT_EMPTY, LINK_URL_EMPTY) else state
+            filled = state in (LINK_TEXT, LINK_URL) or end > position
+            position = end + 1
+            # An empty [] or () is no link, and a finished url completes one
+            state = LINK_CLOSED if closing == ']' and filled else LINK_IDLE
+    return state
+
 class SafeMarkdownConverter:
-    def __init__(self, root_path: str = "."):
+    def __init__(self, root_path: str = ".", workers: Optional[int] = None,
+                 dry_run: bool = False, force: bool = False):
         self.root_path = Path(root_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.dry_run = dry_run
+        self.force = force
+        self.manifest_path = self.root_path / MANIFEST_NAME
         self.processed_count = 0
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.bytes_read = 0
         self.hebrew_markers = ['א', 'ב', 'ג', 'ד', 'ה', 'ו', 'ז', 'ח', 'ט', 'י']
         self.markdown_patterns = {
             'headers': [(re.compile(r'^#{1,6}\s+', re.MULTILINE), '')],
             'lists': [(re.compile(r'^\s*[\*\-]\s+', re.MULTILINE), '○ ')],
             'links': [(re.compile(r'\[([^\]]+)\]\([^\)]+\)'), r'\1')]
         }
+        self.separator_pattern = re.compile(r'^\s*[\-\*\_]{3,}\s*$', re.MULTILINE)
 
-    def convert_content(self, content: str) -> str:
+    def convert_segment(self, content: str) -> str:
+        """Apply every rule to a self contained piece of text, skipping rules whose marker is absent"""
         for category, patterns in self.markdown_patterns.items():
+            if not any(marker in content for marker in RULE_MARKERS[category]):
+                continue
             for pattern, replacement in patterns:
                 content = pattern.sub(replacement, content)
         # Replace remaining horizontal lines or separators
-        content = re.sub(r'^\s*[\-\*\_]{3,}\s*$', '◇◆◇◆◇', content, flags=re.MULTILINE)
+        if any(marker in content for marker in RULE_MARKERS['separators']):
+            content = self.separator_pattern.sub('◇◆◇◆◇', content)
         return content
 
-    def process_files(self):
-        logger.info("starting safe markdown conversion process")
-        target_files = []
-        for extension in ['*.md', '*.mdx', '*.markdown']:
-            target_files.extend(self.root_path.rglob(extension))
-
-        logger.info(f"found {len(target_files)} markdown files to convert")
-
-        for file_path in target_files:
-            try:
-                original_content = file_path.read_text(encoding='utf-8', errors='ignore')
-                converted_content = self.convert_content(original_content)
-                
-                # Create new .txt file path
-                new_path = file_path.with_suffix('.txt')
-                
-                # Write converted content to new file
-                new_path.write_text(converted_content, encoding='utf-8')
-                
-                # Remove original markdown file
-                file_path.unlink()
-                
+    def convert_stream(self, read: Callable[[int], str], write: Callable[[str], object],
+                       segment_size: int = SEGMENT_SIZE):
+        """Convert text pulled from read in bounded segments, output identical to converting it whole
+
+        A segment is only cut after a line ending in a letter, digit or sentence punctuation
+        with no link left open. No rule can match across such a cut: headers, list markers and
+        separators need whitespace or marker characters there and links cannot span it.
+        """
+        # head ends on the latest safe line end with its link state known, tail is what came after.
+        # Each block is searched for a cut and fed to the link matcher once, and pending text is only
+        # joined when a segment is written, so input without safe cuts costs no more than any other.
+        head: List[str] = []
+        tail: List[str] = []
+        head_size = 0
+        tail_size = 0
+        before = ''
+        link_state = LINK_IDLE
+        while True:
+            block = read(READ_SIZE)
+            if not block:
+                break
+            cut = _last_safe_line_end(block, before)
+            before = block[-1]
+            if cut > 0:
+                tail.append(block[:cut])
+                link_state = _advance_links(link_state, ''.join(tail))
+                head += tail
+                head_size += tail_size + cut
+                tail = [block[cut:]]
+                tail_size = len(block) - cut
+            else:
+                tail.append(block)
+                tail_size += len(block)
+            if head and head_size + tail_size >= segment_size and link_state == LINK_IDLE:
+                write(self.convert_segment(''.join(head)))
+                head = []
+                head_size = 0
+        if head or tail:
+            write(self.convert_segment(''.join(head + tail)))
+
+    def convert_content(self, content: str) -> str:
+        if len(content) <= SEGMENT_SIZE:
+            return self.convert_segment(content)
+        parts: List[str] = []
+        self.convert_stream(io.StringIO(content, newline='\n').read, parts.append)
+        return ''.join(parts)
+
+    def load_manifest(self) -> Dict[str, Dict]:
+        """Size, mtime, content hash and output of every file converted on earlier runs"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest: Dict[str, Dict]):
+        if self.dry_run:
+            return
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def convert_file(self, file_path: Path, known_hash: Optional[str] = None) -> Dict:
+        """Convert one file to .txt and remove the original
+
+        A file whose content hashes to known_hash while its .txt is still there is left
+        alone, neither rewritten nor removed, only a file converted here is ever deleted.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+        digest = digest.hexdigest()
+        new_path = file_path.with_suffix('.txt')
+        result = {
+            'path': str(file_path),
+            'output': str(new_path),
+            'bytes': size,
+            'sha256': digest,
+            'converted': False,
+        }
+
+        if digest == known_hash and new_path.exists():
+            # Same content as last run and its text twin is still there
+            return result
+
+        result['converted'] = True
+        if self.dry_run:
+            return result
+
+        # Same decoding and newline handling as read_text and write_text, a segment at a time
+        temp_path = new_path.with_name(new_path.name + '.partial')
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore', buffering=READ_SIZE) as source, \
+                    open(temp_path, 'w', encoding='utf-8', buffering=READ_SIZE) as target:
+                self.convert_stream(source.read, target.write)
+            os.replace(temp_path, new_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        # Remove original markdown file
+        file_path.unlink()
+        return result
+
+    def _manifest_key(self, path: Path) -> str:
+        """Path relative to root, absolute for files outside it such as symlink targets"""
+        try:
+            return str(path.relative_to(self.root_path))
+        except ValueError:
+            return str(path.absolute())
+
+    def process_files(self, files: Optional[List[Path]] = None):
+        """Convert the given markdown files, or every one found by a workspace walk of root"""
+        logger.info("starting safe markdown conversion process" + (" (dry run)" if self.dry_run else ""))
+        started = time.perf_counter()
+        with instrumentation.phase('read'):
+            manifest = self.load_manifest()
+
+        pending = []
+        if files is None:
+            files = collect_files(self.root_path, MARKDOWN_SUFFIXES)
+        with instrumentation.phase('stat'):
+            for file_path in files:
+                key = self._manifest_key(file_path)
+                entry = None if self.force else manifest.get(key)
+                try:
+                    stat = file_path.stat()
+                except OSError as e:
+                    logger.error(f"could not process {file_path}: {e}")
+                    self.failed_count += 1
+                    continue
+                # Size and mtime can stay the same across an edit, only the content hash decides a skip
+                known = entry.get('sha256') if entry and entry['size'] == stat.st_size else None
+                pending.append((file_path, key, stat, known))
+
+        logger.info(f"found {len(pending)} markdown files")
+
+        with instrumentation.phase('convert'):
+            if len(pending) >= POOL_THRESHOLD and self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    futures = [pool.submit(_convert_in_worker, str(self.root_path), self.dry_run,
+                                           str(path), known)
+                               for path, _, _, known in pending]
+                    outcomes = [self._collect(future.result) for future in futures]
+            else:
+                outcomes = [self._collect(lambda: self.convert_file(path, known))
+                            for path, _, _, known in pending]
+
+        for (file_path, key, stat, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                self.failed_count += 1
+                logger.error(f"could not process {file_path}: {outcome}")
+                continue
+            self.bytes_read += outcome['bytes']
+            if outcome['converted']:
                 self.processed_count += 1
-                logger.info(f"converted {file_path} to {new_path}")
-            except Exception as e:
-                logger.error(f"could not process {file_path}: {e}")
-        
-        logger.info(f"conversion complete. processed {self.processed_count} files.")
+                verb = "would convert" if self.dry_run else "converted"
+                logger.info("%s %s to %s", verb, file_path, outcome['output'], extra=wglog.ITEM)
+            else:
+                self.skipped_count += 1
+                logger.info("%s unchanged since the last run, left in place", file_path, extra=wglog.ITEM)
+            manifest[key] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': outcome['sha256'],
+                'output': self._manifest_key(Path(outcome['output'])),
+            }
+
+        with instrumentation.phase('write'):
+            self.save_manifest(manifest)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        total_files = self.processed_count + self.skipped_count + self.failed_count
+        logger.info(f"conversion complete. processed {self.processed_count} files, "
+                    f"skipped {self.skipped_count} unchanged, {self.failed_count} failed.")
+        logger.info(f"{total_files / elapsed:.1f} files/sec, {self.bytes_read / elapsed / 1e6:.2f} MB/sec "
+                    f"over {elapsed:.2f}s with {self.workers} workers")
+
+    @staticmethod
+    def _collect(call):
+        try:
+            return call()
+        except Exception as e:
+            return e
+
+def _convert_in_worker(root_path: str, dry_run: bool, file_path: str, known_hash: Optional[str]) -> Dict:
+    """Process pool entry point, one converter per worker process"""
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = SafeMarkdownConverter(root_path, workers=1, dry_run=dry_run)
+    return _worker_converter.convert_file(Path(file_path), known_hash)
+
+_worker_converter: Optional[SafeMarkdownConverter] = None
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert markdown files to plain text")
+    parser.add_argument("root", nargs="?", default=".", help="directory to convert (default: current)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without touching files")
+    parser.add_argument("--workers", type=int, default=None, help="conversion processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore the change manifest and convert everything")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
 
 def main():
-    converter = SafeMarkdownConverter()
+    args = parse_arguments()
+    instrumentation.setup('cleanmd', args)
+    converter = SafeMarkdownConverter(args.root, workers=args.workers, dry_run=args.dry_run,
+                                      force=args.force)
     converter.process_files()
 
 if __name__ == '__main__':
+    wglog.configure()
     main()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+eve_analyze   columnar analytics over eve tester results and request journals
+loads result jsonl or journal files into numpy arrays and reports per endpoint percentiles
+throughput over time windows error bursts and coherence distributions
+compare puts two runs side by side with mann whitney and two proportion significance tests
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import math
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import instrumentation
+import wglog
+from eve_journal import JOURNAL_PATTERN
+
+logger = logging.getLogger('WoodenGhost.Analyze')
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+COHERENCE_BINS = 10
+DEFAULT_WINDOW = 1.0
+DEFAULT_ALPHA = 0.05
+TOP_BURSTS = 5
+BLOCK_LINES = 65536
+
+
+@dataclass
+class RunData:
+    """One run as columns, row i of every array is request i in time order
+
+    Records without a timestamp come last with a nan ts. They count towards the
+    per endpoint figures but are left out of everything measured over time.
+    """
+    ts: np.ndarray
+    latency: np.ndarray
+    status: np.ndarray
+    coherence: np.ndarray
+    ttfb: np.ndarray
+    endpoint: np.ndarray
+    endpoints: List[str]
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def errors(self) -> np.ndarray:
+        return (self.status < 200) | (self.status >= 300)
+
+    @property
+    def timed(self) -> int:
+        """Rows with a timestamp, they are the leading ones"""
+        return int(np.count_nonzero(~np.isnan(self.ts)))
+
+
+def run_files(path: str) -> List[Path]:
+    """Result or journal files under path, a directory contributes every journal and jsonl file in it"""
+    target = Path(path)
+    if not target.exists():
+        raise FileNotFoundError(f"no results or journal at {path}")
+    if not target.is_dir():
+        return [target]
+    return sorted(target.glob(JOURNAL_PATTERN)) + sorted(target.glob('*.jsonl'))
+
+
+def _blocks(file_path: Path, size: int = BLOCK_LINES) -> Iterator[List[str]]:
+    opener = gzip.open if file_path.suffix == '.gz' else open
+    block: List[str] = []
+    try:
+        with opener(file_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    block.append(line)
+                    if len(block) >= size:
+                        yield block
+                        block = []
+    except (EOFError, OSError) as e:
+        logger.warning(f"⚠ {file_path} is truncated, using what came before: {e}")
+    if block:
+        yield block
+
+
+def _records(block: List[str]) -> List[Dict]:
+    """Parse a block of lines as one json array, line by line only when something in it is broken"""
+    try:
+        return json.loads('[' + ','.join(block) + ']')
+    except ValueError:
+        records = []
+        for line in block:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+
+def load_run(paths: Iterable[str]) -> RunData:
+    """Read result jsonl (latency, coherence) and journal (elapsed, ttfb) records into one RunData
+
+    Columns are gathered as lists and converted once, numpy turns missing values into nan.
+    A record without a ts keeps its nan, which the stable sort puts after every timed one.
+    """
+    ts: List = []
+    latency: List = []
+    status: List = []
+    coherence: List = []
+    ttfb: List = []
+    endpoint: List[int] = []
+    codes: Dict[str, int] = {}
+    for path in paths:
+        for file_path in run_files(path):
+            for block in _blocks(file_path):
+                records = [record for record in _records(block) if isinstance(record, dict)]
+                ts.extend([record.get('ts') for record in records])
+                latency.extend([record.get('latency', record.get('elapsed')) for record in records])
+                status.extend([record.get('status') for record in records])
+                coherence.extend([record.get('coherence') for record in records])
+                ttfb.extend([record.get('ttfb') for record in records])
+                keys = [f"{record.get('method', 'GET')} {record.get('endpoint', '')}" for record in records]
+                endpoint.extend([codes.setdefault(key, len(codes)) for key in keys])
+    columns = [np.array(ts, dtype=np.float64), np.array(latency, dtype=np.float64),
+               np.nan_to_num(np.array(status, dtype=np.float64)).astype(np.int32),
+               np.array(coherence, dtype=np.float64), np.array(ttfb, dtype=np.float64),
+               np.array(endpoint, dtype=np.int32)]
+    order = np.argsort(columns[0], kind='stable')
+    ts, latency, status, coherence, ttfb, endpoint = (column[order] for column in columns)
+    return RunData(ts, latency, status, coherence, ttfb, endpoint, list(codes))
+
+
+def grouped_percentiles(values: np.ndarray, groups: np.ndarray, group_count: int,
+                        percentiles: Tuple[float, ...] = PERCENTILES) -> np.ndarray:
+    """Linear interpolated percentiles of values for every group at once, shape (groups, percentiles)
+
+    One lexsort orders values within groups, the percentile positions of all groups
+    are then computed together instead of a sort per group.
+    """
+    keep = ~np.isnan(values)
+    values, groups = values[keep], groups[keep]
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((group_count, len(percentiles)), np.nan)
+    present = counts > 0
+    for column, pct in enumerate(percentiles):
+        position = starts[present] + (counts[present] - 1) * (pct / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, starts[present] + counts[present] - 1)
+        fraction = position - lower
+        result[present, column] = ordered[lower] * (1 - fraction) + ordered[upper] * fraction
+    return result
+
+
+def endpoint_table(run: RunData) -> List[Dict]:
+    groups = len(run.endpoints)
+    counts = np.bincount(run.endpoint, minlength=groups)
+    errors = np.bincount(run.endpoint, weights=run.errors, minlength=groups)
+    latency = grouped_percentiles(run.latency, run.endpoint, groups)
+    maximum = np.full(groups, np.nan)
+    valid = ~np.isnan(run.latency)
+    np.fmax.at(maximum, run.endpoint[valid], run.latency[valid])
+    ttfb = grouped_percentiles(run.ttfb, run.endpoint, groups, (50.0, 99.0))
+    rows = []
+    for code, name in enumerate(run.endpoints):
+        row = {'endpoint': name, 'requests': int(counts[code]),
+               'error_rate': float(errors[code] / counts[code]) if counts[code] else 0.0,
+               'max': _number(maximum[code])}
+        row.update({f"p{pct:g}": _number(latency[code, index]) for index, pct in enumerate(PERCENTILES)})
+        if not np.isnan(ttfb[code, 0]):
+            row['ttfb_p50'] = _number(ttfb[code, 0])
+            row['ttfb_p99'] = _number(ttfb[code, 1])
+        rows.append(row)
+    return rows
+
+
+def throughput_windows(run: RunData, window: float) -> Dict:
+    """Requests and errors per window of seconds from the first request, untimed records left out"""
+    timed = run.timed
+    if not timed:
+        return {'window': window, 'requests': [], 'errors': []}
+    index = ((run.ts[:timed] - run.ts[0]) // window).astype(np.int64)
+    requests = np.bincount(index)
+    errors = np.bincount(index, weights=run.errors[:timed], minlength=len(requests)).astype(np.int64)
+    rate = requests / window
+    return {
+        'window': window,
+        'requests': requests.tolist(),
+        'errors': errors.tolist(),
+        'rate_min': float(rate.min()),
+        'rate_mean': float(rate.mean()),
+        'rate_max': float(rate.max()),
+    }
+
+
+def error_bursts(run: RunData, top: int = TOP_BURSTS) -> List[Dict]:
+    """Longest runs of consecutive failed requests in time order, untimed records left out"""
+    failed = run.errors[:run.timed].astype(np.int8)
+    if not failed.any():
+        return []
+    edges = np.diff(np.concatenate(([0], failed, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    longest = np.argsort(lengths, kind='stable')[::-1][:top]
+    origin = run.ts[0]
+    bursts = []
+    for burst in longest:
+        first, last = starts[burst], ends[burst] - 1
+        statuses, hits = np.unique(run.status[first:last + 1], return_counts=True)
+        bursts.append({
+            'requests': int(lengths[burst]),
+            'start': float(run.ts[first] - origin),
+            'duration': float(run.ts[last] - run.ts[first]),
+            'status': {int(code): int(count) for code, count in zip(statuses, hits)},
+        })
+    return bursts
+
+
+def coherence_distribution(run: RunData) -> Optional[Dict]:
+    values = run.coherence[~np.isnan(run.coherence)]
+    if not len(values):
+        return None
+    counts, edges = np.histogram(values, bins=COHERENCE_BINS, range=(0.0, 1.0))
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'p10': float(np.percentile(values, 10)),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'histogram': {f"{edges[i]:.1f}-{edges[i + 1]:.1f}": int(count) for i, count in enumerate(counts)},
+    }
+
+
+def analyse(run: RunData, window: float = DEFAULT_WINDOW) -> Dict:
+    timed = run.timed
+    duration = float(run.ts[timed - 1] - run.ts[0]) if timed else 0.0
+    return {
+        'requests': len(run),
+        'untimed': len(run) - timed,
+        'duration': duration,
+        'errors': int(run.errors.sum()),
+        'endpoints': endpoint_table(run),
+        'throughput': throughput_windows(run, window),
+        'error_bursts': error_bursts(run),
+        'coherence': coherence_distribution(run),
+    }
+
+
+def _rank(values: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Average ranks from 1 and the tie correction term sum(t^3 - t)"""
+    unique, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    upper = np.cumsum(counts)
+    average = upper - (counts - 1) / 2.0
+    return average[inverse], float(np.sum(counts.astype(np.float64) ** 3 - counts))
+
+
+def mann_whitney(baseline: np.ndarray, current: np.ndarray) -> Dict:
+    """Two sided Mann Whitney U test with the normal approximation and tie correction
+
+    Latencies are rarely normal, a rank test does not care. The effect size is
+    the probability that a current request is slower than a baseline one.
+    """
+    baseline = baseline[~np.isnan(baseline)]
+    current = current[~np.isnan(current)]
+    n1, n2 = len(baseline), len(current)
+    if not n1 or not n2:
+        return {'u': None, 'p_value': None, 'prob_slower': None}
+    ranks, ties = _rank(np.concatenate((baseline, current)))
+    u_current = float(ranks[n1:].sum()) - n2 * (n2 + 1) / 2.0
+    mean = n1 * n2 / 2.0
+    total = n1 + n2
+    variance = n1 * n2 / 12.0 * ((total + 1) - ties / (total * (total - 1))) if total > 1 else 0.0
+    if variance <= 0:
+        p_value = 1.0
+    else:
+        z = (u_current - mean - math.copysign(0.5, u_current - mean)) / math.sqrt(variance)
+        p_value = math.erfc(abs(z) / math.sqrt(2))
+    return {'u': u_current, 'p_value': p_value, 'prob_slower': u_current / (n1 * n2)}
+
+
+def two_proportions(errors1: int, total1: int, errors2: int, total2: int) -> Optional[float]:
+    """Two sided p value for a change in error rate"""
+    if not total1 or not total2:
+        return None
+    pooled = (errors1 + errors2) / (total1 + total2)
+    variance = pooled * (1 - pooled) * (1 / total1 + 1 / total2)
+    if variance <= 0:
+        return 1.0
+    z = (errors2 / total2 - errors1 / total1) / math.sqrt(variance)
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def compare_runs(baseline: RunData, current: RunData, alpha: float = DEFAULT_ALPHA) -> List[Dict]:
+    """Per endpoint side by side percentiles with a verdict backed by the significance tests"""
+    rows = []
+    base_codes = {name: code for code, name in enumerate(baseline.endpoints)}
+    base_groups = grouped_percentiles(baseline.latency, baseline.endpoint, len(baseline.endpoints))
+    current_groups = grouped_percentiles(current.latency, current.endpoint, len(current.endpoints))
+    base_errors, current_errors = baseline.errors, current.errors
+    for code, name in enumerate(current.endpoints):
+        base_code = base_codes.get(name)
+        if base_code is None:
+            rows.append({'endpoint': name, 'verdict': 'new'})
+            continue
+        base_mask = baseline.endpoint == base_code
+        current_mask = current.endpoint == code
+        latency_test = mann_whitney(baseline.latency[base_mask], current.latency[current_mask])
+        error_p = two_proportions(int(base_errors[base_mask].sum()), int(base_mask.sum()),
+                                  int(current_errors[current_mask].sum()), int(current_mask.sum()))
+        verdict = 'same'
+        if latency_test['p_value'] is not None and latency_test['p_value'] < alpha:
+            verdict = 'slower' if latency_test['prob_slower'] > 0.5 else 'faster'
+        if error_p is not None and error_p < alpha:
+            more_errors = current_errors[current_mask].mean() > base_errors[base_mask].mean()
+            verdict += ', more errors' if more_errors else ', fewer errors'
+        row = {
+            'endpoint': name,
+            'requests': [int(base_mask.sum()), int(current_mask.sum())],
+            'error_rate': [float(base_errors[base_mask].mean()), float(current_errors[current_mask].mean())],
+            'latency_p_value': latency_test['p_value'],
+            'prob_slower': latency_test['prob_slower'],
+            'error_p_value': error_p,
+            'verdict': verdict,
+        }
+        for index, pct in enumerate(PERCENTILES):
+            row[f"p{pct:g}"] = [_number(base_groups[base_code, index]), _number(current_groups[code, index])]
+        rows.append(row)
+    return rows
+
+
+def _number(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def _ms(value: Optional[float]) -> str:
+    return "    -    " if value is None else f"{value * 1000:9.2f}"
+
+
+def log_analysis(name: str, analysis: Dict):
+    logger.info(f"◇ {name}: {analysis['requests']} requests over {analysis['duration']:.2f}s, "
+                f"{analysis['errors']} errors")
+    if analysis['untimed']:
+        logger.warning(f"⚠ {analysis['untimed']} records have no ts, they are left out of throughput and bursts")
+    for row in analysis['endpoints']:
+        first_byte = f"  first byte p50 {_ms(row['ttfb_p50']).strip()} ms" if 'ttfb_p50' in row else ""
+        logger.info(f"□ {row['endpoint']:<28} {row['requests']:>9} req {row['error_rate']:7.2%} err  "
+                    f"p50 {_ms(row['p50'])} p90 {_ms(row['p90'])} p99 {_ms(row['p99'])} "
+                    f"max {_ms(row['max'])} ms{first_byte}")
+    throughput = analysis['throughput']
+    if throughput['requests']:
+        logger.info(f"○ throughput per {throughput['window']:g}s window: min {throughput['rate_min']:.1f} "
+                    f"mean {throughput['rate_mean']:.1f} max {throughput['rate_max']:.1f} req/s")
+    for burst in analysis['error_bursts']:
+        statuses = ", ".join(f"{code}×{count}" for code, count in burst['status'].items())
+        logger.info(f"✗ {burst['requests']} failures in a row at +{burst['start']:.2f}s "
+                    f"over {burst['duration']:.2f}s: {statuses}")
+    coherence = analysis['coherence']
+    if coherence:
+        logger.info(f"○ coherence mean {coherence['mean']:.3f} ± {coherence['std']:.3f}, "
+                    f"p10 {coherence['p10']:.3f} p50 {coherence['p50']:.3f} p90 {coherence['p90']:.3f}")
+
+
+def log_comparison(rows: List[Dict], alpha: float):
+    logger.info(f"◇ baseline -> current, significant at p < {alpha:g}")
+    for row in rows:
+        if row['verdict'] == 'new':
+            logger.info(f"○ {row['endpoint']:<28} only in the current run")
+            continue
+        marker = '✗' if 'slower' in row['verdict'] or 'more errors' in row['verdict'] else \
+            '✓' if 'faster' in row['verdict'] or 'fewer errors' in row['verdict'] else '○'
+        p_value = row['latency_p_value']
+        logger.info(f"{marker} {row['endpoint']:<28} p50 {_ms(row['p50'][0])} -> {_ms(row['p50'][1])}  "
+                    f"p99 {_ms(row['p99'][0])} -> {_ms(row['p99'][1])} ms  "
+                    f"errors {row['error_rate'][0]:.2%} -> {row['error_rate'][1]:.2%}  "
+                    f"p={'-' if p_value is None else f'{p_value:.3g}'}  {row['verdict']}")
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyse eve tester results and request journals")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="percentiles, throughput, error bursts and coherence of one run")
+    report.add_argument("paths", nargs="+", help="result jsonl, journal files or journal directories")
+    report.add_argument("--window", type=float, default=DEFAULT_WINDOW, help="throughput window in seconds")
+    report.add_argument("--json", default=None, help="also write the analysis to this file")
+
+    compare = commands.add_parser("compare", help="two runs side by side with significance tests")
+    compare.add_argument("baseline", help="result jsonl, journal file or directory of the baseline run")
+    compare.add_argument("current", help="result jsonl, journal file or directory of the current run")
+    compare.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="significance level (default: 0.05)")
+    compare.add_argument("--json", default=None, help="also write the comparison to this file")
+    compare.add_argument("--fail-on-regression", action="store_true",
+                         help="exit non-zero when an endpoint got significantly slower or failed more")
+    for command in (report, compare):
+        instrumentation.add_arguments(command)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    instrumentation.setup('eve_analyze', args)
+    try:
+        return analyse_command(args)
+    except FileNotFoundError as e:
+        logger.error(f"✗ {e}")
+        return 2
+
+
+def analyse_command(args: argparse.Namespace) -> int:
+    started = time.perf_counter()
+    if args.command == "report":
+        with instrumentation.phase('load'):
+            run = load_run(args.paths)
+        loaded = time.perf_counter()
+        with instrumentation.phase('analyse'):
+            analysis = analyse(run, args.window)
+        log_analysis(", ".join(args.paths), analysis)
+        logger.info(f"□ loaded {len(run)} requests in {loaded - started:.2f}s, "
+                    f"analysed in {time.perf_counter() - loaded:.2f}s")
+        result = analysis
+        status = 0
+    else:
+        with instrumentation.phase('load'):
+            baseline, current = load_run([args.baseline]), load_run([args.current])
+        with instrumentation.phase('analyse'):
+            rows = compare_runs(baseline, current, args.alpha)
+        log_comparison(rows, args.alpha)
+        result = {'alpha': args.alpha, 'endpoints': rows}
+        regressed = any('slower' in row['verdict'] or 'more errors' in row['verdict'] for row in rows)
+        status = 1 if regressed and args.fail_on_regression else 0
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2) + '\n', encoding='utf-8')
+    return status
+
+
+if __name__ == '__main__':
+    wglog.configure()
+    sys.exit(main())
@@ -7,15 +7,22 @@ Enhanced REST API testing for Kindroid integration with temporal optimization
 Following Artifact Intelligence Entity Evolving Valuable Emergence (EVE) principles
 """
 
+import argparse
 import asyncio
-import aiohttp
 import json
 import time
 import logging
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-import os
+
+import instrumentation
+import wglog
+from eve_journal import DEFAULT_MAX_BYTES, RequestJournal
+from kindroidadapter.client import KindroidClient, KindroidResponse
+from kindroidadapter.config import KindroidConfig, load_config
+from kindroidadapter.scheduler import RequestScheduler
+from telemetry import JSONLSink, LatencyHistogram, ResultAggregator
 
 # Hebrew indexing for semantic organization (aleph to yod)
 HEBREW_INDEX = ["א", "ב", "ג", "ד", "ה", "ו", "ז", "ח", "ט", "י"]
@@ -33,6 +40,51 @@ class TemporalAPIResponse:
     timestamp: str
     coherence_score: float = 0.0
 
+@dataclass
+class LoadTestReport:
+    """Throughput and latency profile of a sustained load run"""
+    endpoint: str
+    method: str
+    concurrency: int
+    target_rate: Optional[float]
+    duration: float
+    total_requests: int = 0
+    error_count: int = 0
+    status_counts: Dict[int, int] = field(default_factory=dict)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram, repr=False)
+    # Only filled for streamed runs, where the first text arrives long before the whole reply
+    ttfb: Optional[LatencyHistogram] = field(default=None, repr=False)
+    first_chunk: Optional[LatencyHistogram] = field(default=None, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.total_requests / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.error_count / self.total_requests if self.total_requests else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Latency percentile in seconds"""
+        return self.latency.percentile(pct)
+
+    def summary_lines(self) -> List[str]:
+        rate = f"{self.target_rate:.2f} req/s" if self.target_rate else "unpaced"
+        lines = [
+            f"{self.method} {self.endpoint} × {self.total_requests} "
+            f"({self.concurrency} in flight, {rate}, {self.duration:.2f}s)",
+            f"throughput {self.throughput:.2f} req/s, error rate {self.error_rate:.2%}",
+            "latency p50 {:.3f}s p90 {:.3f}s p99 {:.3f}s p99.9 {:.3f}s".format(
+                self.percentile(50), self.percentile(90),
+                self.percentile(99), self.percentile(99.9)),
+            "status " + ", ".join(f"{code}×{count}" for code, count in sorted(self.status_counts.items())),
+        ]
+        if self.first_chunk is not None and self.first_chunk.count:
+            lines.insert(3, "first byte p50 {:.3f}s p99 {:.3f}s, first text p50 {:.3f}s p99 {:.3f}s".format(
+                self.ttfb.percentile(50), self.ttfb.percentile(99),
+                self.first_chunk.percentile(50), self.first_chunk.percentile(99)))
+        return lines
+
 class WoodenGhostLogger:
     """Aesthetic logging with temporal optimization"""
     
@@ -41,69 +93,112 @@ class WoodenGhostLogger:
         self.setup_logging()
     
     def setup_logging(self):
-        """Configure logging with aesthetic output"""
-        format_string = "%(asctime)s | %(levelname)s | %(message)s" if not self.aesthetic_mode else \
-                       "%(asctime)s ◆ %(levelname)s ◆ %(message)s"
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format=format_string,
-            datefmt="%H:%M:%S"
-        )
+        """Configure logging with aesthetic output, written from the shared background queue"""
+        wglog.configure('eve' if self.aesthetic_mode else 'eve-plain')
         self.logger = logging.getLogger("WoodenGhost.EVE")
     
-    def temporal_message(self, message: str, level: str = "info", semantic_marker: str = "○"):
-        """Log with aesthetic temporal markers"""
-        formatted_msg = f"{semantic_marker} {message}"
-        getattr(self.logger, level)(formatted_msg)
+    def temporal_message(self, message: str, *args, level: str = "info", semantic_marker: str = "○",
+                         item: bool = False):
+        """Log with aesthetic temporal markers, args are merged into message only if the record is written"""
+        level_number = wglog.LEVELS.get(level, logging.INFO)
+        if self.logger.isEnabledFor(level_number):
+            self.logger.log(level_number, semantic_marker + " " + message, *args,
+                            extra=wglog.ITEM if item else None)
 
 class EVEAPITester:
     """Main testing framework for EVE API integration"""
     
-    def __init__(self, config_path: str = "environment.config"):
+    def __init__(self,
+                 config_path: str = "environment.config",
+                 results_path: Optional[str] = None,
+                 sample_bodies: int = 0,
+                 pool_size: Optional[int] = None,
+                 use_cache: bool = True,
+                 cache_dir: Optional[str] = None,
+                 journal_dir: Optional[str] = None,
+                 journal_max_bytes: int = DEFAULT_MAX_BYTES):
         self.config = self.load_configuration(config_path)
         self.logger = WoodenGhostLogger(aesthetic_mode=True)
-        self.session = None
-        self.test_results = []
+        # Retries would hide the failures we are here to measure
+        self.client = KindroidClient(config=self.config, pool_size=pool_size, max_retries=0,
+                                     use_cache=use_cache, cache_dir=cache_dir,
+                                     user_agent='WoodenGhost-EVE-Tester/1.0')
+        self.aggregator = ResultAggregator(sample_bodies=sample_bodies)
+        self.sink = JSONLSink(results_path) if results_path else None
+        # Every request with its outcome, for replaying a run later with eve_journal.py
+        self.journal = RequestJournal(journal_dir, max_bytes=journal_max_bytes) if journal_dir else None
         
-    def load_configuration(self, config_path: str) -> Dict[str, str]:
+    def load_configuration(self, config_path: str) -> KindroidConfig:
         """Load environment configuration with fallback to .env.clean"""
-        config = {}
-        
-        # Try multiple config sources
-        config_files = [config_path, ".env.clean", "environment.config"]
-        
-        for file_path in config_files:
-            if Path(file_path).exists():
-                with open(file_path, 'r') as f:
-                    for line in f:
-                        if '=' in line and not line.strip().startswith('#'):
-                            key, value = line.strip().split('=', 1)
-                            config[key] = value
-                break
-        
-        # Environment variable overrides
-        for key in ['KINDROID_API_KEY', 'KINDROID_AI_ID', 'KINDROID_BASE_URL']:
-            if key in os.environ:
-                config[key] = os.environ[key]
-        
-        return config
+        return load_config(config_path)
+
+    def config_number(self, key: str, default: float) -> float:
+        """Read a numeric configuration value, falling back on missing or malformed entries"""
+        return self.config.number(key, default)
     
-    async def create_session(self) -> aiohttp.ClientSession:
-        """Create optimized async HTTP session"""
-        timeout = aiohttp.ClientTimeout(total=30)
-        headers = {
-            'Authorization': f'Bearer {self.config.get("KINDROID_API_KEY", "")}',
-            'Content-Type': 'application/json',
-            'User-Agent': 'WoodenGhost-EVE-Tester/1.0',
-            'Accept': 'application/json'
-        }
-        
-        return aiohttp.ClientSession(
-            timeout=timeout,
-            headers=headers,
-            raise_for_status=False
-        )
+    def record_result(self, method: str, endpoint: str, status_code: int, response_time: float,
+                      coherence_score: float, content: Any = None, semantic_index: str = "○"):
+        """Fold one result into the aggregates and stream it to the results sink"""
+        self.aggregator.record(method, endpoint, status_code, response_time, coherence_score, content)
+        if self.sink is not None:
+            self.sink.write({
+                "ts": time.time(),
+                "method": method.upper(),
+                "endpoint": endpoint,
+                "status": status_code,
+                "latency": response_time,
+                "coherence": coherence_score,
+                "index": semantic_index,
+            })
+    
+    async def close(self):
+        """Release the shared connection pool and flush the results sink"""
+        await self.client.close()
+        if self.sink is not None:
+            self.sink.close()
+        if self.journal is not None:
+            self.journal.close()
+    
+    async def send_request(self, endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> KindroidResponse:
+        """Issue one request through the pooled client and scheduler
+        
+        The response's `elapsed` covers the network round trip only, not time spent waiting for a rate token.
+        """
+        if method.upper() not in ("GET", "POST"):
+            raise ValueError(f"Unsupported method: {method}")
+        
+        started = time.monotonic()
+        try:
+            response = await self.client.request(method, endpoint, data)
+        except Exception as e:
+            if self.journal is not None:
+                self.journal.record(method, endpoint, data, 0, time.monotonic() - started, error=repr(e),
+                                    started=started)
+            raise
+        # Round trips overlap under load, so only their wall time is recorded
+        instrumentation.record('network', response.elapsed)
+        if self.journal is not None:
+            self.journal.record(method, endpoint, data, response.status, response.elapsed, ttfb=response.ttfb,
+                                started=started)
+        return response
+    
+    async def send_streaming(self, endpoint: str, method: str = "POST", data: Optional[Dict] = None):
+        """Issue one request asking for a streamed reply and read it to the end, returns the finished stream"""
+        payload = dict(data or {}, stream=True)
+        stream = self.client.stream(method, endpoint, payload)
+        started = time.monotonic()
+        try:
+            text = await stream.text()
+        except Exception as e:
+            if self.journal is not None:
+                self.journal.record(method, endpoint, payload, stream.status or 0, time.monotonic() - started,
+                                    stream=True, error=repr(e), started=started)
+            raise
+        instrumentation.record('network', stream.timing.total)
+        if self.journal is not None:
+            self.journal.record(method, endpoint, payload, stream.status, stream.timing.total,
+                                ttfb=stream.timing.ttfb, stream=True, started=started)
+        return stream, text
     
     async def test_api_endpoint(self, 
                                endpoint: str, 
@@ -115,48 +210,36 @@ class EVEAPITester:
         start_time = time.time()
         
         try:
-            base_url = self.config.get('KINDROID_BASE_URL', 'https://api.kindroid.ai/v1')
-            url = f"{base_url}/{endpoint.lstrip('/')}"
-            
-            self.logger.temporal_message(
-                f"Testing {method} {endpoint} with index {semantic_index}", 
-                semantic_marker="◆"
-            )
+            self.logger.temporal_message("Testing %s %s with index %s", method, endpoint, semantic_index,
+                                         semantic_marker="◆", item=True)
             
-            if method.upper() == "GET":
-                async with self.session.get(url) as response:
-                    content = await response.json() if response.content_type == 'application/json' else await response.text()
-            elif method.upper() == "POST":
-                async with self.session.post(url, json=data) as response:
-                    content = await response.json() if response.content_type == 'application/json' else await response.text()
-            else:
-                raise ValueError(f"Unsupported method: {method}")
-            
-            response_time = time.time() - start_time
+            response = await self.send_request(endpoint, method, data)
+            status, content, response_time = response.status, response.content, response.elapsed
             
             # Calculate coherence score based on response characteristics
-            coherence_score = self.calculate_coherence(response.status, response_time, content)
+            coherence_score = self.calculate_coherence(status, response_time, content)
             
             result = TemporalAPIResponse(
-                status_code=response.status,
+                status_code=status,
                 response_time=response_time,
                 semantic_index=semantic_index,
                 content=content,
                 timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
                 coherence_score=coherence_score
             )
+            self.record_result(method, endpoint, status, response_time, coherence_score, content, semantic_index)
             
-            status_marker = "✓" if 200 <= response.status < 300 else "✗"
-            self.logger.temporal_message(
-                f"Response {response.status} in {response_time:.3f}s", 
-                semantic_marker=status_marker
-            )
+            status_marker = "✓" if 200 <= status < 300 else "✗"
+            self.logger.temporal_message("Response %d in %.3fs%s", status, response_time,
+                                         " from cache" if response.cached else "",
+                                         semantic_marker=status_marker, item=True)
             
             return result
             
         except Exception as e:
             response_time = time.time() - start_time
-            self.logger.temporal_message(f"API test failed: {str(e)}", "error", "✗")
+            self.logger.temporal_message("API test failed: %s", e, level="error", semantic_marker="✗")
+            self.record_result(method, endpoint, 500, response_time, 0.0, None, semantic_index)
             
             return TemporalAPIResponse(
                 status_code=500,
@@ -200,53 +283,219 @@ class EVEAPITester:
             }
             test_cases.append(("messages", "POST", test_message, HEBREW_INDEX[4]))  # ה - Send message
         
-        self.session = await self.create_session()
-        results = []
+        # The client's scheduler paces these to KINDROIDRATELIMIT, no fixed delay needed
+        results = [
+            await self.test_api_endpoint(endpoint, method, data, semantic_index)
+            for endpoint, method, data, semantic_index in test_cases
+        ]
         
-        try:
-            for endpoint, method, data, semantic_index in test_cases:
-                result = await self.test_api_endpoint(endpoint, method, data, semantic_index)
-                results.append(result)
-                self.test_results.append(result)
-                
-                # Temporal delay for rate limiting
-                await asyncio.sleep(1)
-                
-        finally:
-            await self.session.close()
+        if self.client.cache is not None:
+            stats = self.client.cache.stats()
+            self.logger.temporal_message(
+                f"Cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['revalidations']} revalidated, {stats['evictions']} evicted",
+                semantic_marker="□"
+            )
         
         self.generate_test_report(results)
         return results
     
+    async def run_load_test(self,
+                            endpoint: str = "health",
+                            method: str = "GET",
+                            data: Optional[Dict] = None,
+                            concurrency: Optional[int] = None,
+                            rate: Optional[float] = None,
+                            duration: Optional[float] = None,
+                            total_requests: Optional[int] = None,
+                            stream: bool = False) -> LoadTestReport:
+        """Keep `concurrency` requests in flight, paced at `rate` req/s, until the duration or request budget is spent
+        
+        Concurrency defaults to MAXCONCURRENTREQUESTS and rate to KINDROIDRATELIMIT (requests per minute).
+        A rate of 0 disables pacing so the workers run closed-loop. Pacing is done by a
+        dedicated scheduler so the run measures the endpoint, not the configured quota.
+        With stream the replies are requested as event streams and read to the end,
+        the report then also holds time to first byte and to first reply text.
+        """
+        if concurrency is None:
+            concurrency = int(self.config_number('MAXCONCURRENTREQUESTS', 5))
+        if rate is None:
+            rate = self.config_number('KINDROIDRATELIMIT', 60) / 60.0
+        if duration is None and total_requests is None:
+            duration = 10.0
+        concurrency = max(1, concurrency)
+        rate = rate if rate and rate > 0 else None
+        
+        # Load runs must reach the endpoint every time, the client gets its pacing and cache back afterwards
+        scheduler, cache = self.client.scheduler, self.client.cache
+        self.client.scheduler = RequestScheduler(rate=rate, burst=concurrency, max_concurrency=concurrency,
+                                                 max_retries=0, adaptive=False)
+        self.client.cache = None
+        try:
+            return await self._run_load(endpoint, method, data, concurrency, rate, duration, total_requests, stream)
+        finally:
+            self.client.scheduler, self.client.cache = scheduler, cache
+    
+    async def _run_load(self, endpoint: str, method: str, data: Optional[Dict], concurrency: int,
+                        rate: Optional[float], duration: Optional[float], total_requests: Optional[int],
+                        stream: bool) -> LoadTestReport:
+        """The load run itself, on the client as run_load_test set it up"""
+        report = LoadTestReport(endpoint=endpoint, method=method.upper(), concurrency=concurrency,
+                                target_rate=rate, duration=0.0)
+        if stream:
+            report.ttfb = LatencyHistogram()
+            report.first_chunk = LatencyHistogram()
+        
+        self.logger.temporal_message(
+            f"Load protocol: {report.method} {endpoint} with {concurrency} in flight", semantic_marker="◇"
+        )
+        
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + duration if duration is not None else None
+        issued = 0
+        
+        def claim_request() -> bool:
+            """Reserve one request from the budget, False once the run is over"""
+            nonlocal issued
+            if total_requests is not None and issued >= total_requests:
+                return False
+            if deadline is not None and loop.time() >= deadline:
+                return False
+            issued += 1
+            return True
+        
+        async def worker():
+            while claim_request():
+                start_time = time.perf_counter()
+                try:
+                    if stream:
+                        finished, content = await self.send_streaming(endpoint, method, data)
+                        status, response_time = finished.status, finished.timing.total
+                        if not finished.ok:
+                            content = finished.error
+                        report.ttfb.record(finished.timing.ttfb)
+                        report.first_chunk.record(finished.timing.first_chunk)
+                    else:
+                        response = await self.send_request(endpoint, method, data)
+                        status, content, response_time = response.status, response.content, response.elapsed
+                except Exception:
+                    status, content, response_time = 500, None, time.perf_counter() - start_time
+                report.latency.record(response_time)
+                self.record_result(method, endpoint, status, response_time,
+                                   self.calculate_coherence(status, response_time, content), content)
+                
+                report.total_requests += 1
+                report.status_counts[status] = report.status_counts.get(status, 0) + 1
+                if not 200 <= status < 300:
+                    report.error_count += 1
+        
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        
+        report.duration = loop.time() - started
+        
+        for line in report.summary_lines():
+            self.logger.temporal_message(line, semantic_marker="□")
+        
+        return report
+    
     def generate_test_report(self, results: List[TemporalAPIResponse]):
         """Generate aesthetic test report with temporal analysis"""
         
-        report_content = "# Wooden.Ghost EVE API Test Report\n"
-        report_content += "## Temporal Optimization Analysis\n\n"
-        
-        total_coherence = sum(r.coherence_score for r in results)
-        avg_coherence = total_coherence / len(results) if results else 0
+        avg_coherence = self.aggregator.avg_coherence
         
-        report_content += f"### Aesthetic Coherence Score: {avg_coherence:.3f}\n\n"
+        lines = [
+            "# Wooden.Ghost EVE API Test Report",
+            "## Temporal Optimization Analysis",
+            "",
+            f"### Aesthetic Coherence Score: {avg_coherence:.3f}",
+            "",
+        ]
         
         # Hebrew indexed results
-        for i, result in enumerate(results):
-            report_content += f"#### {result.semantic_index} Test Result\n"
-            report_content += f"- Status: {result.status_code}\n"
-            report_content += f"- Response Time: {result.response_time:.3f}s\n"
-            report_content += f"- Coherence: {result.coherence_score:.3f}\n"
-            report_content += f"- Timestamp: {result.timestamp}\n\n"
+        for result in results:
+            lines += [
+                f"#### {result.semantic_index} Test Result",
+                f"- Status: {result.status_code}",
+                f"- Response Time: {result.response_time:.3f}s",
+                f"- Coherence: {result.coherence_score:.3f}",
+                f"- Timestamp: {result.timestamp}",
+                "",
+            ]
+        
+        # Endpoint aggregates cover every request seen, not just the returned results
+        lines += ["## Endpoint Latency Distribution", ""]
+        for (method, endpoint), stats in sorted(self.aggregator.endpoints.items()):
+            latency = stats.latency
+            status = ", ".join(f"{code}×{count}" for code, count in sorted(stats.status_counts.items()))
+            lines += [
+                f"#### {method} {endpoint}",
+                f"- Requests: {stats.count} ({stats.error_rate:.1%} errors)",
+                f"- Latency: p50 {latency.percentile(50):.3f}s, p90 {latency.percentile(90):.3f}s, "
+                f"p99 {latency.percentile(99):.3f}s, max {latency.max:.3f}s",
+                f"- Status: {status}",
+                "",
+            ]
         
         # Save report
         report_path = Path("eve_test_report.md")
         with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(report_content)
+            f.write("\n".join(lines))
         
         self.logger.temporal_message(f"Test report generated: {report_path}", semantic_marker="□")
 
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Wooden.Ghost EVE API testing framework")
+    parser.add_argument("--load", action="store_true", help="run a sustained load test instead of the functional suite")
+    parser.add_argument("--endpoint", default="health", help="endpoint to load (default: health)")
+    parser.add_argument("--method", default="GET", choices=["GET", "POST"])
+    parser.add_argument("--data", type=json.loads, default=None, help="JSON payload for POST requests")
+    parser.add_argument("--concurrency", type=int, default=None, help="requests in flight (default: MAXCONCURRENTREQUESTS)")
+    parser.add_argument("--rate", type=float, default=None, help="requests per second, 0 for unpaced (default: KINDROIDRATELIMIT/60)")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=None, dest="total_requests", help="number of requests to send")
+    parser.add_argument("--journal", default=None,
+                        help="record every request to compressed journals in this directory for eve_journal.py replay")
+    parser.add_argument("--journal-max-mb", type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                        help="rotate journal files at this size (default: 64)")
+    parser.add_argument("--stream", action="store_true",
+                        help="ask for streamed replies and report time to first byte and first text")
+    parser.add_argument("--results", default=None, help="stream per-request records to this JSONL file")
+    parser.add_argument("--sample-bodies", type=int, default=0, help="response bodies to keep per endpoint")
+    parser.add_argument("--no-cache", action="store_true", help="always hit the network for metadata endpoints")
+    parser.add_argument("--cache-dir", default=None, help="persist cached metadata responses here (default: EVECACHEDIR)")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
 async def main():
     """Main execution with aesthetic output"""
-    tester = EVEAPITester()
+    args = parse_arguments()
+    instrumentation.setup('eve_api_tester', args)
+    tester = EVEAPITester(results_path=args.results, sample_bodies=args.sample_bodies,
+                          pool_size=args.concurrency, use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                          journal_dir=args.journal, journal_max_bytes=int(args.journal_max_mb * (1 << 20)))
+    
+    if args.load:
+        try:
+            report = await tester.run_load_test(
+                endpoint=args.endpoint,
+                method=args.method,
+                data=args.data,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                duration=args.duration,
+                total_requests=args.total_requests,
+                stream=args.stream
+            )
+            
+            print(f"\n◇◆◇ EVE Load Protocol Complete ◇◆◇")
+            for line in report.summary_lines():
+                print(f"□ {line}")
+        except Exception as e:
+            print(f"✗ EVE load testing failed: {e}")
+        finally:
+            await tester.close()
+        return
     
     try:
         results = await tester.run_comprehensive_tests()
@@ -260,6 +509,8 @@ async def main():
         
     except Exception as e:
         print(f"✗ EVE testing failed: {e}")
+    finally:
+        await tester.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
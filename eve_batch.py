@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+eve_batch   bulk messages from a jsonl file through the kindroid client
+prompts are read line by line and a bounded pool of workers sends them at the configured rate
+replies are appended to an output jsonl as they complete, in input order or as they finish
+a checkpoint of what was sent lets a crashed run resume without sending anything twice
+failed items go to a separate failures file and are only sent again when a rerun asks for it
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set
+
+import instrumentation
+import wglog
+from kindroidadapter.client import KindroidClient
+from kindroidadapter.config import load_config
+from kindroidadapter.scheduler import RequestScheduler
+from telemetry import LatencyHistogram
+
+logger = logging.getLogger('WoodenGhost.Batch')
+
+# Fields tried in turn when no --field is given
+PROMPT_FIELDS = ('message', 'prompt', 'body', 'text')
+ID_FIELDS = ('id', 'request_id')
+
+# Ordered output may hold this many finished replies per worker while an earlier one is still out
+DEFAULT_WINDOW_FACTOR = 4
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+
+@dataclass
+class BatchItem:
+    """One input line, problem is set when it holds nothing to send"""
+    index: int
+    id: Any
+    message: Optional[str] = None
+    ai_id: Optional[str] = None
+    problem: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    """Counts and latency of one batch run, items answered by an earlier run are counted in skipped"""
+    sent: int = 0
+    errors: int = 0
+    skipped: int = 0
+    failed_earlier: int = 0
+    interrupted: int = 0
+    invalid: int = 0
+    duration: float = 0.0
+    status_counts: Dict[Any, int] = field(default_factory=dict)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram, repr=False)
+    ttfb: LatencyHistogram = field(default_factory=LatencyHistogram, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.duration if self.duration > 0 else 0.0
+
+    def progress_line(self) -> str:
+        return (f"{self.sent} sent, {self.errors} errors, {self.throughput:.2f} msg/s, "
+                f"latency p50 {self.latency.percentile(50):.3f}s p99 {self.latency.percentile(99):.3f}s")
+
+    def summary_lines(self) -> List[str]:
+        lines = [
+            f"sent {self.sent} messages in {self.duration:.2f}s, {self.throughput:.2f} msg/s",
+            f"errors {self.errors}, already answered {self.skipped}, without a prompt {self.invalid}",
+            f"left for later: failed earlier {self.failed_earlier} (--retry-failed), "
+            f"interrupted earlier {self.interrupted} (--resend-interrupted)",
+            "latency p50 {:.3f}s p90 {:.3f}s p99 {:.3f}s max {:.3f}s".format(
+                self.latency.percentile(50), self.latency.percentile(90), self.latency.percentile(99),
+                self.latency.max),
+        ]
+        if self.ttfb.count:
+            lines.append(f"first byte p50 {self.ttfb.percentile(50):.3f}s p99 {self.ttfb.percentile(99):.3f}s")
+        if self.status_counts:
+            lines.append("status " + ", ".join(f"{code}×{count}" for code, count in
+                                               sorted(self.status_counts.items(), key=lambda item: str(item[0]))))
+        return lines
+
+
+def read_items(path: str, prompt_field: Optional[str] = None) -> Iterator[BatchItem]:
+    """Input lines as items, one at a time so the file never has to fit in memory"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                document = json.loads(line)
+            except ValueError as e:
+                yield BatchItem(index, None, problem=f"invalid json: {e}")
+                continue
+            if isinstance(document, str):
+                yield BatchItem(index, index, message=document)
+                continue
+            if not isinstance(document, dict):
+                yield BatchItem(index, None, problem="line is neither an object nor a string")
+                continue
+            item_id = next((document[key] for key in ID_FIELDS if key in document), index)
+            fields = (prompt_field,) if prompt_field else PROMPT_FIELDS
+            message = next((document[key] for key in fields if isinstance(document.get(key), str)), None)
+            if not message or not message.strip():
+                yield BatchItem(index, item_id, problem=f"no {' or '.join(fields)} to send")
+                continue
+            yield BatchItem(index, item_id, message=message, ai_id=document.get('ai_id'))
+
+
+class BatchOutputError(Exception):
+    """Raised when the output file holds lines that are not batch records, it is left untouched"""
+
+
+def completed_indices(output_path: Path) -> Set[int]:
+    """Input indices the output already answers, a half written last line from a crash is cut off
+
+    Only a final line without its newline is ever removed. A complete line that
+    is not a batch record means the path points at some other file, that stops
+    the run before anything is written to it.
+    """
+    done: Set[int] = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, 'rb+') as f:
+        keep = 0
+        for number, line in enumerate(f, 1):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+                index = record['index']
+                if not isinstance(index, int):
+                    raise TypeError(index)
+            except (ValueError, KeyError, TypeError):
+                raise BatchOutputError(f"{output_path} line {number} is not a batch record, "
+                                       f"refusing to append to it") from None
+            done.add(index)
+            keep += len(line)
+        if keep < f.seek(0, os.SEEK_END):
+            logger.warning(f"⚠ dropping a partial record at the end of {output_path}")
+            f.truncate(keep)
+    return done
+
+
+def failed_indices(failures_path: Path) -> Set[int]:
+    """Input indices with a failure on record, a rerun subtracts those answered since"""
+    failed: Set[int] = set()
+    if not failures_path.exists():
+        return failed
+    with open(failures_path, 'rb') as f:
+        for line in f:
+            try:
+                failed.add(int(json.loads(line)['index']))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return failed
+
+
+class Checkpoint:
+    """Input indices written and flushed just before their request goes out
+
+    Together with the output and the failures this tells a resumed run which
+    items were sent but never answered, those are held back instead of being
+    sent again unless the rerun asks for it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def sent(self) -> Set[int]:
+        if not self.path.exists():
+            return set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return {int(line) for line in f if line.strip().isdigit() and line.endswith('\n')}
+
+    def open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def mark(self, index: int):
+        self._file.write(f"{index}\n")
+        self._file.flush()
+
+    def close(self, remove: bool = False):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+class ResultWriter:
+    """Appends one json record per item, as each completes or held back until its turn in input order
+
+    Replies go to the output, records with an error to the failures file, so
+    the output only ever lists items that are done for good.
+    """
+
+    def __init__(self, path: Path, failures_path: Path, ordered: bool):
+        self.ordered = ordered
+        self._file = open(path, 'a', encoding='utf-8')
+        self._failures = open(failures_path, 'a', encoding='utf-8')
+        self._turns: Deque[int] = deque()
+        self._held: Dict[int, Dict] = {}
+
+    def issued(self, index: int):
+        if self.ordered:
+            self._turns.append(index)
+
+    def complete(self, record: Dict) -> int:
+        """Number of records this completion let through to the file"""
+        if not self.ordered:
+            self._write(record)
+            return 1
+        self._held[record['index']] = record
+        written = 0
+        while self._turns and self._turns[0] in self._held:
+            self._write(self._held.pop(self._turns.popleft()))
+            written += 1
+        return written
+
+    def _write(self, record: Dict):
+        target = self._failures if 'error' in record else self._file
+        target.write(json.dumps(record, ensure_ascii=False) + '\n')
+        target.flush()
+
+    def close(self):
+        # Replies finished out of turn are still saved when a run stops early, resending costs more than order
+        for index in sorted(self._held):
+            self._write(self._held.pop(index))
+        self._file.close()
+        self._failures.close()
+
+
+async def send_item(client: KindroidClient, item: BatchItem, stream: bool) -> Dict:
+    record = {'index': item.index, 'id': item.id}
+    started = time.perf_counter()
+    payload = client.message_payload(item.message, item.ai_id, stream=stream)
+    try:
+        # Raw calls, an error status is reported on the result and only transport failures raise
+        if stream:
+            reply = client.stream("POST", client.message_endpoint, payload)
+            text = await reply.text()
+            ok, content = reply.ok, text if reply.ok else reply.error
+            record.update(status=reply.status, latency=round(reply.timing.total, 6), ttfb=round(reply.timing.ttfb, 6))
+        else:
+            response = await client.request("POST", client.message_endpoint, payload)
+            ok, content = response.ok, response.content
+            record.update(status=response.status, latency=round(response.elapsed, 6), ttfb=round(response.ttfb, 6))
+        record['reply' if ok else 'error'] = client.reply_text(content)
+    except Exception as e:
+        record.update(status=None, latency=round(time.perf_counter() - started, 6),
+                      error=f"{type(e).__name__}: {e}")
+    return record
+
+
+async def run_batch(input_path: str, output_path: str, client: KindroidClient, concurrency: int,
+                    ordered: bool = True, stream: bool = False, prompt_field: Optional[str] = None,
+                    checkpoint_path: Optional[str] = None, failures_path: Optional[str] = None,
+                    retry_failed: bool = False, resend_interrupted: bool = False,
+                    progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> BatchReport:
+    """Send every input item not yet answered in output_path and append the replies there
+
+    concurrency workers take items from a queue the reader keeps topped up. A
+    window of finished but unwritten records bounds memory in ordered mode, so
+    a slow reply holds the reader back rather than piling up later ones.
+    Items that failed or were interrupted in an earlier run are left alone
+    unless retry_failed or resend_interrupted say otherwise.
+    """
+    output = Path(output_path)
+    checkpoint = Checkpoint(Path(checkpoint_path) if checkpoint_path else output.with_name(output.name + '.checkpoint'))
+    failures = Path(failures_path) if failures_path else output.with_name(output.stem + '.failures.jsonl')
+    done = completed_indices(output)
+    failed = failed_indices(failures) - done
+    interrupted = checkpoint.sent() - done - failed
+    if done or failed or interrupted:
+        logger.info(f"◇ resuming: {len(done)} already answered, {len(failed)} failed, "
+                    f"{len(interrupted)} sent without a saved reply")
+
+    report = BatchReport()
+    writer = ResultWriter(output, failures, ordered)
+    window = asyncio.Semaphore(concurrency * DEFAULT_WINDOW_FACTOR if ordered else concurrency)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    finished = False
+
+    def complete(record: Dict):
+        status = record.get('status')
+        report.status_counts[status] = report.status_counts.get(status, 0) + 1
+        for _ in range(writer.complete(record)):
+            window.release()
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            checkpoint.mark(item.index)
+            record = await send_item(client, item, stream)
+            report.sent += 1
+            report.latency.record(record['latency'])
+            if stream and 'ttfb' in record:
+                report.ttfb.record(record['ttfb'])
+            if 'error' in record:
+                report.errors += 1
+            logger.debug("□ %s %s in %.3fs", record['id'], record['status'], record['latency'], extra=wglog.ITEM)
+            complete(record)
+
+    async def progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            report.duration = loop.time() - started
+            logger.info(f"○ {report.progress_line()}")
+
+    checkpoint.open()
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    reporter = asyncio.ensure_future(progress()) if progress_interval > 0 else None
+    try:
+        for item in read_items(input_path, prompt_field):
+            if item.index in done:
+                report.skipped += 1
+                continue
+            if item.problem is not None:
+                report.invalid += 1
+                if item.index in failed:
+                    continue
+            elif item.index in failed and not retry_failed:
+                report.failed_earlier += 1
+                continue
+            elif item.index in interrupted and not resend_interrupted:
+                report.interrupted += 1
+                continue
+            await window.acquire()
+            writer.issued(item.index)
+            if item.problem is not None:
+                complete({'index': item.index, 'id': item.id, 'status': None, 'error': item.problem})
+            else:
+                await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        finished = True
+    finally:
+        for task in workers + ([reporter] if reporter else []):
+            task.cancel()
+        writer.close()
+        # Once nothing is held back as interrupted, the output and failures say all a rerun needs
+        checkpoint.close(remove=finished and not report.interrupted)
+        report.duration = loop.time() - started
+    return report
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Send every prompt of a JSONL file to eve and save the replies")
+    parser.add_argument("input", help="JSONL of prompts, objects with a message, prompt, body or text field")
+    parser.add_argument("output", help="JSONL the replies are appended to, also what a rerun resumes from")
+    parser.add_argument("--field", default=None, help="take the prompt from this field only")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="messages in flight (default: MAXCONCURRENTREQUESTS)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="messages per second, 0 for unpaced (default: KINDROIDRATELIMIT/60)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="write replies as they complete instead of in input order")
+    parser.add_argument("--stream", action="store_true", help="ask for streamed replies and record time to first byte")
+    parser.add_argument("--checkpoint", default=None, help="sent item log (default: OUTPUT.checkpoint)")
+    parser.add_argument("--failures", default=None,
+                        help="JSONL failed items are appended to (default: OUTPUT stem + .failures.jsonl)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="send again what an earlier run got an error or no answer for")
+    parser.add_argument("--resend-interrupted", action="store_true",
+                        help="send again what an earlier run sent but never saved a reply for")
+    parser.add_argument("--progress", type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="seconds between progress lines, 0 for none (default: 10)")
+    parser.add_argument("--config", default=None, help="configuration file (default: environment.config)")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    instrumentation.setup('eve_batch', args)
+    config = load_config(args.config)
+    concurrency = max(1, args.concurrency or int(config.number('MAXCONCURRENTREQUESTS', 5)))
+    rate = args.rate if args.rate is not None else config.number('KINDROIDRATELIMIT', 60) / 60.0
+    # Bulk jobs run right at the quota, retries still cover throttling and transient failures
+    scheduler = RequestScheduler(rate=rate if rate > 0 else None, burst=concurrency, max_concurrency=concurrency,
+                                 max_retries=int(config.number('KINDROIDMAXRETRIES', 3)),
+                                 backoff_multiplier=config.number('RETRYBACKOFFMULTIPLIER', 2))
+    client = KindroidClient(config=config, scheduler=scheduler, pool_size=concurrency, use_cache=False,
+                            user_agent='WoodenGhost-EVE-Batch/1.0')
+    paced = f"{rate:.2f} msg/s" if rate > 0 else "unpaced"
+    logger.info(f"◇ {args.input} -> {args.output} with {concurrency} in flight, {paced}, "
+                f"{'unordered' if args.unordered else 'in input order'}")
+    try:
+        with instrumentation.phase('batch'):
+            report = await run_batch(args.input, args.output, client, concurrency, ordered=not args.unordered,
+                                     stream=args.stream, prompt_field=args.field, checkpoint_path=args.checkpoint,
+                                     failures_path=args.failures, retry_failed=args.retry_failed,
+                                     resend_interrupted=args.resend_interrupted, progress_interval=args.progress)
+    except (FileNotFoundError, BatchOutputError) as e:
+        logger.error(f"✗ {e}")
+        return 2
+    finally:
+        await client.close()
+    for line in report.summary_lines():
+        logger.info(f"□ {line}")
+    return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+    wglog.configure()
+    try:
+        raise SystemExit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        logger.warning("⚠ stopped, run the same command again to resume")
+        raise SystemExit(130)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+eve_journal   durable request journal and traffic replay for the eve tester
+every request and its outcome is appended to gzip compressed json lines by a background thread
+a recorded journal can be re-issued against any base url at its original pacing or sped up
+"""
+
+import argparse
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import wglog
+from telemetry import LatencyHistogram
+
+logger = logging.getLogger('WoodenGhost.Journal')
+
+JOURNAL_PATTERN = 'journal-*.jsonl.gz'
+DEFAULT_MAX_BYTES = 64 << 20
+DEFAULT_BATCH = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Entries are written as requests finish, so a slow request lands after later ones,
+# replay puts them back in send order within this many entries
+REORDER_WINDOW = 10000
+
+_CLOSE = object()
+_RUN_NUMBERS = itertools.count(1)
+
+
+class RequestJournal:
+    """Append only, size rotated journal of requests written off the caller's thread
+
+    Records are queued by record() and a writer thread encodes them in batches.
+    Each batch is written as its own gzip member, so the files stay valid gzip
+    and a crash loses at most the batch being written.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, batch_size: int = DEFAULT_BATCH,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, compresslevel: int = 6):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.compresslevel = compresslevel
+        self.started = time.monotonic()
+        # Names every file of this run, offsets are relative to its start
+        self.stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_RUN_NUMBERS)}"
+        self.sequence = 0
+        self.records_written = 0
+        self.bytes_written = 0
+        self.path: Optional[Path] = None
+        self._handle = None
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='wg-journal', daemon=True)
+        self._thread.start()
+
+    def record(self, method: str, endpoint: str, payload: Optional[Dict], status: int, elapsed: float,
+               ttfb: Optional[float] = None, stream: bool = False, error: Optional[str] = None,
+               started: Optional[float] = None):
+        """Queue one request, started is its time.monotonic() send time and defaults to now minus elapsed"""
+        if self._closed:
+            return
+        if started is None:
+            started = time.monotonic() - elapsed
+        self._queue.put({
+            'ts': time.time(),
+            'offset': round(started - self.started, 6),
+            'method': method.upper(),
+            'endpoint': endpoint,
+            'payload': payload,
+            'stream': stream,
+            'status': status,
+            'elapsed': round(elapsed, 6),
+            'ttfb': None if ttfb is None else round(ttfb, 6),
+            'error': error,
+        })
+
+    def _open(self):
+        self.sequence += 1
+        self.path = self.directory / f"journal-{self.stamp}-{self.sequence:04d}.jsonl.gz"
+        self._handle = open(self.path, 'ab')
+
+    def _write(self, batch: List[Dict]):
+        if self._handle is None:
+            self._open()
+        encoded = ''.join(json.dumps(entry, ensure_ascii=False, default=str) + '\n' for entry in batch)
+        member = gzip.compress(encoded.encode('utf-8'), compresslevel=self.compresslevel)
+        self._handle.write(member)
+        self._handle.flush()
+        self.records_written += len(batch)
+        self.bytes_written += len(member)
+        if self._handle.tell() >= self.max_bytes:
+            self._handle.close()
+            self._handle = None
+
+    def _run(self):
+        batch: List[Dict] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                break
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or item is None):
+                self._flush_batch(batch)
+                batch = []
+                deadline = None
+        # Drain whatever was queued before close
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _CLOSE:
+                batch.append(item)
+        if batch:
+            self._flush_batch(batch)
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _flush_batch(self, batch: List[Dict]):
+        try:
+            self._write(batch)
+        except OSError as e:
+            logger.error(f"✗ journal write to {self.path} failed, {len(batch)} records lost: {e}")
+
+    def close(self):
+        """Write everything queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        logger.info(f"□ journal {self.directory}: {self.records_written} requests, "
+                    f"{self.bytes_written / 1024:.1f} KiB compressed over {self.sequence} files")
+
+    def __enter__(self) -> "RequestJournal":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def journal_files(path: str) -> List[Path]:
+    """The journal file itself, or every journal file in a directory in recording order"""
+    target = Path(path)
+    if target.is_dir():
+        return sorted(target.glob(JOURNAL_PATTERN))
+    return [target]
+
+
+def journal_runs(path: str) -> List[List[Path]]:
+    """Journal files grouped by the run that wrote them, files of one run share the journal-<stamp>- prefix"""
+    runs: Dict[str, List[Path]] = {}
+    for file_path in journal_files(path):
+        runs.setdefault(file_path.name.rsplit('-', 1)[0], []).append(file_path)
+    return list(runs.values())
+
+
+def read_journal(path: str) -> Iterator[Dict]:
+    """Every entry of a journal file or directory, a truncated last batch is skipped with a warning
+
+    Offsets count from the start of the run that recorded them, so runs sharing a
+    directory are laid end to end, each one starting where the previous one finished.
+    """
+    shift = 0.0
+    for files in journal_runs(path):
+        end = 0.0
+        for file_path in files:
+            for entry in _file_entries(file_path):
+                offset = float(entry.get('offset', 0.0))
+                end = max(end, offset + float(entry.get('elapsed') or 0.0))
+                entry['offset'] = offset + shift
+                yield entry
+        shift += end
+
+
+def _file_entries(file_path: Path) -> Iterator[Dict]:
+    try:
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        logger.warning(f"⚠ {file_path} ends in an incomplete batch, replaying what came before: {e}")
+
+
+def in_send_order(entries: Iterable[Dict], window: int = REORDER_WINDOW) -> Iterator[Dict]:
+    """Entries sorted by offset, holding no more than window of them at a time"""
+    heap: List = []
+    counter = itertools.count()
+    for entry in entries:
+        heapq.heappush(heap, (float(entry.get('offset', 0.0)), next(counter), entry))
+        if len(heap) > window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of a replay next to what the journal recorded"""
+    requests: int = 0
+    errors: int = 0
+    status_changed: int = 0
+    duration: float = 0.0
+    recorded_duration: float = 0.0
+    lag: float = 0.0
+    status_counts: Dict[int, int] = field(default_factory=dict)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram, repr=False)
+    recorded_latency: LatencyHistogram = field(default_factory=LatencyHistogram, repr=False)
+
+    def summary_lines(self) -> List[str]:
+        throughput = self.requests / self.duration if self.duration > 0 else 0.0
+        return [
+            f"replayed {self.requests} requests in {self.duration:.2f}s "
+            f"(recorded over {self.recorded_duration:.2f}s), {throughput:.2f} req/s",
+            f"errors {self.errors}, status differs from the recording for {self.status_changed}",
+            "latency p50 {:.3f}s p99 {:.3f}s, recorded p50 {:.3f}s p99 {:.3f}s".format(
+                self.latency.percentile(50), self.latency.percentile(99),
+                self.recorded_latency.percentile(50), self.recorded_latency.percentile(99)),
+            f"worst dispatch lag behind schedule {self.lag * 1000:.1f} ms",
+            "status " + ", ".join(f"{code}×{count}" for code, count in sorted(self.status_counts.items())),
+        ]
+
+
+async def replay(entries: Iterable[Dict], base_url: Optional[str] = None, speed: float = 1.0,
+                 concurrency: int = 64, config: Optional[Dict[str, str]] = None) -> ReplayReport:
+    """Re-issue journal entries at their recorded offsets divided by speed, 0 sends them back to back
+
+    At most concurrency requests are in flight. A slot is taken before each
+    request is dispatched, so time spent waiting for one behind schedule shows
+    up as dispatch lag in the report and never more than concurrency tasks exist.
+    """
+    import asyncio
+
+    from kindroidadapter.client import KindroidClient
+    from kindroidadapter.scheduler import RequestScheduler
+
+    # Replays reproduce the recorded traffic, so nothing is retried, paced or cached
+    client = KindroidClient(config=config, base_url=base_url, max_retries=0, use_cache=False,
+                            pool_size=concurrency, user_agent='WoodenGhost-EVE-Replay/1.0')
+    client.scheduler = RequestScheduler(rate=None, burst=concurrency, max_concurrency=concurrency,
+                                        max_retries=0, adaptive=False)
+    report = ReplayReport()
+    slots = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_offset = None
+
+    async def issue(entry: Dict):
+        try:
+            sent = time.perf_counter()
+            try:
+                if entry.get('stream'):
+                    stream = client.stream(entry['method'], entry['endpoint'], entry.get('payload'))
+                    await stream.text()
+                    status = stream.status
+                else:
+                    status = (await client.request(entry['method'], entry['endpoint'], entry.get('payload'))).status
+            except Exception:
+                status = 0
+            report.latency.record(time.perf_counter() - sent)
+        finally:
+            slots.release()
+        report.requests += 1
+        report.status_counts[status] = report.status_counts.get(status, 0) + 1
+        if not 200 <= status < 300:
+            report.errors += 1
+        if status != entry.get('status'):
+            report.status_changed += 1
+
+    tasks = set()
+    try:
+        for entry in in_send_order(entries):
+            offset = float(entry.get('offset', 0.0))
+            if first_offset is None:
+                first_offset = offset
+            offset -= first_offset
+            report.recorded_duration = max(report.recorded_duration, offset + float(entry.get('elapsed') or 0.0))
+            report.recorded_latency.record(float(entry.get('elapsed') or 0.0))
+            due = None
+            if speed > 0:
+                due = started + offset / speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await slots.acquire()
+            if due is not None:
+                report.lag = max(report.lag, loop.time() - due)
+            task = asyncio.ensure_future(issue(entry))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+    report.duration = loop.time() - started
+    return report
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or replay request journals recorded by eve_api_tester")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="summarise a journal")
+    show.add_argument("journal", help="journal file or directory")
+
+    run = commands.add_parser("replay", help="re-issue a journal against a base url")
+    run.add_argument("journal", help="journal file or directory")
+    run.add_argument("--base-url", default=None, help="target api (default: KINDROID_BASE_URL from the config)")
+    run.add_argument("--speed", type=float, default=1.0,
+                     help="speed-up over the recorded pacing, 0 sends as fast as possible (default: 1)")
+    run.add_argument("--concurrency", type=int, default=64, help="requests in flight at most (default: 64)")
+    return parser.parse_args(argv)
+
+
+def show_journal(path: str) -> int:
+    count = 0
+    errors = 0
+    first = last = None
+    latency = LatencyHistogram()
+    endpoints: Dict[str, int] = {}
+    for entry in read_journal(path):
+        count += 1
+        if not 200 <= (entry.get('status') or 0) < 300:
+            errors += 1
+        latency.record(float(entry.get('elapsed') or 0.0))
+        key = f"{entry['method']} {entry['endpoint']}"
+        endpoints[key] = endpoints.get(key, 0) + 1
+        first = entry['offset'] if first is None else min(first, entry['offset'])
+        last = entry['offset'] if last is None else max(last, entry['offset'])
+    if not count:
+        logger.warning(f"⚠ no requests in {path}")
+        return 1
+    logger.info(f"◇ {count} requests over {last - first:.2f}s, {errors} errors")
+    logger.info(f"□ latency p50 {latency.percentile(50):.3f}s p99 {latency.percentile(99):.3f}s")
+    for key, hits in sorted(endpoints.items(), key=lambda item: -item[1]):
+        logger.info(f"○ {key} × {hits}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    if args.command == "show":
+        return show_journal(args.journal)
+    import asyncio
+    report = asyncio.run(replay(read_journal(args.journal), base_url=args.base_url, speed=args.speed,
+                                concurrency=args.concurrency))
+    for line in report.summary_lines():
+        logger.info(f"□ {line}")
+    return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+    wglog.configure()
+    raise SystemExit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+gistsync   asynchronous gist synchronizer for wooden ghost
+mirrors a user's gists into hebrew and greek indexed folders like sync_gists_temporal.ps1
+listing pages are revalidated with etags, only gists whose updated_at moved are fetched
+and only their changed files are streamed to disk through a bounded request pool
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
+
+import wglog
+from kindroidadapter.scheduler import RequestScheduler
+
+if TYPE_CHECKING:
+    # Imported with the first session so --help and config errors come back straight away
+    import aiohttp
+
+logger = logging.getLogger('WoodenGhost.GistSync')
+
+DEFAULT_API_URL = 'https://api.github.com'
+USER_AGENT = 'WoodenGhost-TemporalOptimizer'
+STATE_NAME = '.gistsync_state.json'
+METADATA_NAME = 'temporal_metadata.json'
+INDEX_NAME = 'SEMANTIC_INDEX.txt'
+PAGE_SIZE = 100
+CHUNK_SIZE = 1 << 16
+
+# Hebrew alphabet for semantic indexing (aleph to yod as specified)
+HEBREW_INDEX = ['א', 'ב', 'ג', 'ד', 'ה', 'ו', 'ז', 'ח', 'ט', 'י']
+# Greek alphabet for complex semantic knowledge transfer
+GREEK_INDEX = ['α', 'β', 'γ', 'δ', 'ε', 'ζ', 'η', 'θ', 'ι', 'κ']
+
+LINK_NEXT = re.compile(r'<([^>]+)>\s*;\s*rel="next"')
+
+
+def semantic_index(position: int) -> str:
+    """Hebrew letters for the first ten gists, then a greek letter and a decade number"""
+    if position < 10:
+        return HEBREW_INDEX[position]
+    return f"{GREEK_INDEX[position % 10]}{position // 10}"
+
+
+def next_link(header: Optional[str]) -> Optional[str]:
+    match = LINK_NEXT.search(header or '')
+    return match.group(1) if match else None
+
+
+def compact_gist(gist: Dict) -> Dict:
+    """The fields of a gist listing entry the sync needs"""
+    return {
+        'id': gist['id'],
+        'description': gist.get('description') or '',
+        'created_at': gist.get('created_at'),
+        'updated_at': gist.get('updated_at'),
+        'files': {
+            name: {key: data.get(key) for key in ('raw_url', 'type', 'size', 'language')}
+            for name, data in (gist.get('files') or {}).items()
+        },
+    }
+
+
+@dataclass
+class FetchResult:
+    """Status, headers and whatever the request produced, shaped for RequestScheduler.execute"""
+    status: int
+    headers: Mapping[str, str] = field(default_factory=dict)
+    body: Any = None
+
+
+class GistSynchronizer:
+    def __init__(self, username: str, target: str = 'mygists', api_url: Optional[str] = None,
+                 token: Optional[str] = None, concurrency: int = 5, rate: Optional[float] = None,
+                 max_retries: int = 3):
+        self.username = username
+        self.target = Path(target)
+        self.api_url = (api_url or os.getenv('GITHUB_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.token = token if token is not None else os.getenv('GITHUB_TOKEN')
+        self.concurrency = max(1, concurrency)
+        self.scheduler = RequestScheduler(rate=rate, burst=self.concurrency, max_concurrency=self.concurrency,
+                                          max_retries=max_retries)
+        self.state_path = self.target / STATE_NAME
+        self.state = self.load_state()
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.counts = {'unchanged': 0, 'renamed': 0, 'updated': 0, 'created': 0, 'failed': 0}
+        self.files_downloaded = 0
+        self.bytes_downloaded = 0
+        self.requests = 0
+        self.not_modified = 0
+
+    def load_state(self) -> Dict:
+        """Validators and contents of the listing pages seen on the last run"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'pages': {}}
+
+    def save_state(self):
+        temp_path = self.state_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    async def session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+                headers={'User-Agent': USER_AGENT},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _headers(self, url: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if self.token and url.startswith(self.api_url):
+            headers['Authorization'] = f'Bearer {self.token}'
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def _quota_exhausted(self, response: "aiohttp.ClientResponse") -> Optional[float]:
+        """Seconds until the rate limit resets when a 403 or 429 means the quota is spent"""
+        if response.status not in (403, 429) or response.headers.get('X-RateLimit-Remaining') != '0':
+            return None
+        try:
+            return max(1.0, float(response.headers.get('X-RateLimit-Reset', 0)) - time.time())
+        except ValueError:
+            return 60.0
+
+    async def _request(self, url: str, handle, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """GET url under the scheduler, handle(response) reads the body while the connection is open"""
+        import aiohttp
+        session = await self.session()
+
+        async def send() -> FetchResult:
+            self.requests += 1
+            async with session.get(url, headers=self._headers(url, headers)) as response:
+                wait = self._quota_exhausted(response)
+                if wait is not None:
+                    # Spent quota is retried like a 429 once the reset time has passed
+                    logger.warning(f"⚠ rate limit reached, waiting {wait:.0f}s for the reset")
+                    return FetchResult(429, {'Retry-After': f'{wait:.0f}'})
+                body = await handle(response) if response.status == 200 else None
+                return FetchResult(response.status, response.headers, body)
+
+        return await self.scheduler.execute('gists', send,
+                                            retry_exceptions=(asyncio.TimeoutError, aiohttp.ClientError))
+
+    async def list_gists(self) -> List[Dict]:
+        """Every gist of the user, following Link pagination and reusing pages that answer 304"""
+        pages = self.state.setdefault('pages', {})
+        url = f"{self.api_url}/users/{self.username}/gists?per_page={PAGE_SIZE}"
+        gists: List[Dict] = []
+        seen = set()
+        while url and url not in seen:
+            seen.add(url)
+            cached = pages.get(url)
+            validators = {}
+            if cached and cached.get('etag'):
+                validators['If-None-Match'] = cached['etag']
+            if cached and cached.get('last_modified'):
+                validators['If-Modified-Since'] = cached['last_modified']
+
+            async def read_page(response):
+                return [compact_gist(gist) for gist in await response.json(content_type=None)]
+
+            result = await self._request(url, read_page, validators)
+            if result.status == 304 and cached:
+                self.not_modified += 1
+                page = cached
+            elif result.status == 200:
+                page = {
+                    'etag': result.headers.get('ETag'),
+                    'last_modified': result.headers.get('Last-Modified'),
+                    'next': next_link(result.headers.get('Link')),
+                    'gists': result.body,
+                }
+                pages[url] = page
+            else:
+                raise RuntimeError(f"listing {url} failed with status {result.status}")
+            gists.extend(page['gists'])
+            url = page.get('next')
+        # Forget pages that are no longer part of the listing
+        for stale in set(pages) - seen:
+            del pages[stale]
+        return gists
+
+    def load_local(self) -> Dict[str, Tuple[Path, Dict]]:
+        """Existing gist folders by gist id with their metadata"""
+        local = {}
+        if not self.target.is_dir():
+            return local
+        for entry in os.scandir(self.target):
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, METADATA_NAME), 'r', encoding='utf-8-sig') as f:
+                    metadata = json.load(f)
+                local[metadata['id']] = (Path(entry.path), metadata)
+            except (OSError, ValueError, KeyError):
+                continue
+        return local
+
+    async def _download(self, url: str, destination: Path) -> int:
+        """Stream url straight to destination, returning the bytes written"""
+        temp_path = destination.with_name(destination.name + '.partial')
+
+        async def stream(response):
+            written = 0
+            with open(temp_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+            return written
+
+        try:
+            result = await self._request(url, stream)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        if result.status != 200:
+            temp_path.unlink(missing_ok=True)
+            raise RuntimeError(f"status {result.status}")
+        os.replace(temp_path, destination)
+        self.files_downloaded += 1
+        self.bytes_downloaded += result.body
+        return result.body
+
+    async def sync_gist(self, gist: Dict, index: str, local: Optional[Tuple[Path, Dict]]) -> str:
+        """Bring one gist folder up to date, downloading only files whose revision changed"""
+        gist_dir = self.target / f"{index}-{gist['id']}"
+        previous_files: Dict[str, Dict] = {}
+        status = 'created'
+        if local is not None:
+            current_dir, metadata = local
+            if current_dir != gist_dir:
+                os.replace(current_dir, gist_dir)
+            previous_files = {item['name']: item for item in metadata.get('files', [])}
+            files_present = all((gist_dir / name).exists() for name in gist['files'])
+            if metadata.get('updated') == gist['updated_at'] and files_present:
+                if metadata.get('semantic_index') == index:
+                    return 'unchanged'
+                metadata['semantic_index'] = index
+                self._write_metadata(gist_dir, metadata)
+                return 'renamed'
+            status = 'updated'
+        gist_dir.mkdir(parents=True, exist_ok=True)
+
+        files = []
+        failed = False
+        for name, data in gist['files'].items():
+            destination = gist_dir / name
+            previous = previous_files.get(name)
+            # Gist raw urls carry the file revision, an unchanged url means unchanged content
+            unchanged = previous is not None and previous.get('raw_url') == data['raw_url'] and destination.exists()
+            if data.get('raw_url') and not unchanged:
+                try:
+                    await self._download(data['raw_url'], destination)
+                except Exception as e:
+                    failed = True
+                    logger.warning(f"⚠ failed to download file {name} from gist {gist['id']}: {e}")
+                    continue
+            files.append({'name': name, 'type': data.get('type'), 'size': data.get('size'),
+                          'language': data.get('language'), 'raw_url': data.get('raw_url')})
+
+        for name in set(previous_files) - set(gist['files']):
+            (gist_dir / name).unlink(missing_ok=True)
+
+        self._write_metadata(gist_dir, {
+            'id': gist['id'],
+            'description': gist['description'],
+            'created': gist['created_at'],
+            # A partial download keeps the old timestamp so the next run tries again
+            'updated': (local[1].get('updated') if local else None) if failed else gist['updated_at'],
+            'semantic_index': index,
+            'temporal_hash': datetime.now().strftime('%Y%m%d%H%M%S'),
+            'files': files,
+        })
+        if failed:
+            return 'failed'
+        logger.info("✓ processed gist %s with index %s", gist['id'], index, extra=wglog.ITEM)
+        return status
+
+    def _write_metadata(self, gist_dir: Path, metadata: Dict):
+        temp_path = gist_dir / (METADATA_NAME + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, gist_dir / METADATA_NAME)
+
+    def write_index(self, gists: List[Dict]):
+        """Semantic index of every gist description"""
+        lines = ['Wooden.Ghost Gist Archive', 'Temporal Optimization Index', 'Hebrew Semantic Categories (א-י)']
+        lines += [f"{semantic_index(i)}. {gist['description']}" for i, gist in enumerate(gists[:10])]
+        if len(gists) > 10:
+            lines += ['', 'Greek Semantic Extensions (α-κ)']
+            lines += [f"{semantic_index(i)}. {gist['description']}" for i, gist in enumerate(gists[10:], 10)]
+        (self.target / INDEX_NAME).write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    async def run(self) -> Dict[str, int]:
+        logger.info(f"◆ synchronising gists of {self.username} into {self.target}")
+        started = time.perf_counter()
+        self.target.mkdir(parents=True, exist_ok=True)
+        try:
+            gists = await self.list_gists()
+            logger.info(f"✓ listed {len(gists)} gists, {self.not_modified} pages unchanged since the last run")
+            local = self.load_local()
+
+            # Folder names carry the gist id, so moving one to a shifted index never collides
+            outcomes = await asyncio.gather(*(
+                self.sync_gist(gist, semantic_index(i), local.pop(gist['id'], None))
+                for i, gist in enumerate(gists)
+            ), return_exceptions=True)
+            for gist, outcome in zip(gists, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"✗ gist {gist['id']} failed: {outcome}")
+                    outcome = 'failed'
+                self.counts[outcome] += 1
+            if local:
+                logger.info(f"○ kept {len(local)} local gists that no longer exist upstream")
+
+            self.write_index(gists)
+            self.save_state()
+        finally:
+            await self.close()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"◇◆◇ synchronised {len(gists)} gists in {elapsed:.2f}s: " +
+                    ", ".join(f"{count} {name}" for name, count in self.counts.items()) + " ◇◆◇")
+        logger.info(f"□ {self.files_downloaded} files, {self.bytes_downloaded / 1024:.1f} KiB downloaded "
+                    f"with {self.requests} requests")
+        return self.counts
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Synchronise a user's gists into semantically indexed folders")
+    parser.add_argument("--user", default="shmil111", help="github user whose gists are mirrored")
+    parser.add_argument("--target", default="mygists", help="directory holding the gist folders")
+    parser.add_argument("--concurrency", type=int, default=5, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=None, help="requests per second ceiling (default: none)")
+    parser.add_argument("--api-url", default=None,
+                        help="api base url, e.g. a local stand-in (default: GITHUB_API_URL or api.github.com)")
+    return parser.parse_args(argv)
+
+
+def main():
+    wglog.configure()
+    args = parse_arguments()
+    synchronizer = GistSynchronizer(args.user, args.target, api_url=args.api_url,
+                                    concurrency=args.concurrency, rate=args.rate)
+    counts = asyncio.run(synchronizer.run())
+    raise SystemExit(1 if counts['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+instrumentation   opt in profiling and phase timing for wooden ghost command line tools
+every main() calls setup, which reads flags and the environment and stays out of the way when nothing is asked for
+phase timers, a cProfile or sampling profiler and tracemalloc peaks end up in one summary written at exit
+
+environment, each also available as a flag added by add_arguments
+    WG_PROFILE              cprofile or sample
+    WG_PROFILE_OUTPUT       profile file (default: <tool>.prof for cprofile, <tool>.folded for sample)
+    WG_PROFILE_INTERVAL     seconds between samples (default: 0.005)
+    WG_TRACEMALLOC          1 to track peak memory and the top allocation sites
+    WG_INSTRUMENT_OUTPUT    write the summary to this json file instead of the log
+    WG_INSTRUMENT           1 enables the phase timers and the summary, also read from environment.config
+    VERBOSE_LOGGING         true logs each phase as it ends and lowers the log level to debug
+"""
+
+import argparse
+import atexit
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+logger = logging.getLogger('WoodenGhost.Instrumentation')
+
+CONFIG_FILES = ('environment.config', '.env.clean')
+PROFILERS = ('cprofile', 'sample')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATIONS = 10
+TOP_FUNCTIONS = 15
+
+
+def config_flag(name: str, default: bool = False) -> bool:
+    """Boolean setting from the environment, then environment.config in the working directory"""
+    value = os.environ.get(name)
+    if value is None:
+        for config_file in CONFIG_FILES:
+            try:
+                with open(config_file, 'r', encoding='utf-8', errors='ignore') as f:
+                    for line in f:
+                        key, sep, setting = line.strip().partition('=')
+                        if sep and key in (name, name.replace('_', '')):
+                            value = setting
+                break
+            except OSError:
+                continue
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class _NullPhase:
+    """What phase hands out while instrumentation is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('owner', 'name', 'wall', 'cpu')
+
+    def __init__(self, owner: 'Instrumentation', name: str):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.owner.record(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class SamplingProfiler:
+    """Wall clock stack sampler over every thread, cheap enough to leave on for a whole run
+
+    Stacks are kept collapsed, one line per distinct stack, the format flame graph tools read.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='wg-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, count: int = TOP_FUNCTIONS) -> List[Dict]:
+        """Functions most often on top of a stack, where the run was spending its time"""
+        leaves: Counter = Counter()
+        for stack, hits in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += hits
+        total = sum(leaves.values()) or 1
+        return [{'function': name, 'samples': hits, 'share': round(hits / total, 4)}
+                for name, hits in leaves.most_common(count)]
+
+
+class Instrumentation:
+    """Phase timers, an optional profiler and tracemalloc for one process, reported once at exit"""
+
+    def __init__(self):
+        self.tool = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else 'python'
+        self.enabled = False
+        self.verbose = False
+        self.profiler_name: Optional[str] = None
+        self.profile_path: Optional[str] = None
+        self.summary_path: Optional[str] = None
+        self.trace_memory = False
+        self.phases: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[SamplingProfiler] = None
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._finished = False
+
+    def phase(self, name: str):
+        """Context manager timing one phase, walk read parse write or network, calls with one name add up"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, wall: float, cpu: float = 0.0):
+        """Add a measurement taken elsewhere, like the elapsed time a response already carries"""
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = self.phases.get(name)
+            if totals is None:
+                totals = self.phases[name] = [0, 0.0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+            if wall > totals[3]:
+                totals[3] = wall
+        if self.verbose:
+            logger.debug(f"○ {name} {wall * 1000:.2f} ms wall {cpu * 1000:.2f} ms cpu")
+
+    def start(self, tool: str, profiler: Optional[str] = None, profile_path: Optional[str] = None,
+              interval: float = DEFAULT_SAMPLE_INTERVAL, trace_memory: bool = False,
+              summary_path: Optional[str] = None, monitoring: bool = False, verbose: bool = False):
+        self.tool = tool
+        self.verbose = verbose
+        self.trace_memory = trace_memory
+        self.summary_path = summary_path
+        self.enabled = bool(monitoring or profiler or trace_memory or summary_path)
+        if verbose:
+            logging.getLogger().setLevel(logging.DEBUG)
+        if not self.enabled:
+            return self
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profiler == 'cprofile':
+            self.profile_path = profile_path or f"{tool}.prof"
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif profiler == 'sample':
+            self.profile_path = profile_path or f"{tool}.folded"
+            self._sampler = SamplingProfiler(interval)
+            self._sampler.start()
+        self.profiler_name = profiler
+        atexit.register(self.finish)
+        return self
+
+    def summary(self) -> Dict:
+        wall = time.perf_counter() - self._started_wall
+        summary = {
+            'tool': self.tool,
+            'pid': os.getpid(),
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(time.process_time() - self._started_cpu, 6),
+            'phases': {
+                name: {'count': count, 'wall_seconds': round(total, 6), 'cpu_seconds': round(cpu, 6),
+                       'max_seconds': round(longest, 6), 'share': round(total / wall, 4) if wall > 0 else 0.0}
+                for name, (count, total, cpu, longest) in sorted(self.phases.items(),
+                                                                 key=lambda item: -item[1][1])
+            },
+        }
+        if resource is not None:
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            own = resource.getrusage(resource.RUSAGE_SELF)
+            # Work done in process pool workers never shows in the phase timers
+            summary['children_cpu_seconds'] = round(children.ru_utime + children.ru_stime, 6)
+            summary['max_rss_kb'] = own.ru_maxrss if sys.platform != 'darwin' else own.ru_maxrss // 1024
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            summary['memory'] = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [{'site': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+                        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]],
+            }
+        if self.profiler_name:
+            summary['profile'] = {'kind': self.profiler_name, 'path': self.profile_path}
+            if self._sampler is not None:
+                summary['profile']['samples'] = self._sampler.samples
+                summary['profile']['top'] = self._sampler.top()
+        return summary
+
+    def finish(self):
+        """Stop the profilers and write the summary, runs once from atexit or when called early"""
+        if self._finished or not self.enabled:
+            return
+        self._finished = True
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.profile_path)
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write(self.profile_path)
+        summary = self.summary()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if not logger.hasHandlers():
+            # Called from a script that never configured logging, the summary still has to show
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        if self.summary_path:
+            Path(self.summary_path).write_text(json.dumps(summary, indent=2) + '\n', encoding='utf-8')
+            logger.info(f"□ instrumentation summary written to {self.summary_path}")
+            return
+        logger.info(f"◇ {self.tool} {summary['wall_seconds']:.3f}s wall {summary['cpu_seconds']:.3f}s cpu")
+        for name, phase in summary['phases'].items():
+            logger.info(f"□ {name:<10} {phase['count']:>7}x {phase['wall_seconds']:9.3f}s wall "
+                        f"{phase['cpu_seconds']:9.3f}s cpu {phase['share']:6.1%}")
+        if 'memory' in summary:
+            logger.info(f"□ peak traced memory {summary['memory']['peak_bytes'] / 1e6:.2f} MB")
+        if 'profile' in summary:
+            logger.info(f"□ {summary['profile']['kind']} profile written to {summary['profile']['path']}")
+
+
+instrumentation = Instrumentation()
+
+
+def phase(name: str):
+    """Time a phase on the process wide instrumentation"""
+    return instrumentation.phase(name)
+
+
+def record(name: str, wall: float, cpu: float = 0.0):
+    instrumentation.record(name, wall, cpu)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The instrumentation flags every tool accepts, defaults come from the environment"""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--profile", choices=PROFILERS, default=os.environ.get('WG_PROFILE') or None,
+                       help="capture a cProfile or sampling profile of the run")
+    group.add_argument("--profile-output", default=os.environ.get('WG_PROFILE_OUTPUT') or None,
+                       help="profile file (default: <tool>.prof or <tool>.folded)")
+    group.add_argument("--trace-memory", action="store_true",
+                       default=config_flag('WG_TRACEMALLOC'), help="track peak memory with tracemalloc")
+    group.add_argument("--instrument", action="store_true", default=config_flag('WG_INSTRUMENT'),
+                       help="time phases and log a summary at exit")
+    group.add_argument("--instrument-output", default=os.environ.get('WG_INSTRUMENT_OUTPUT') or None,
+                       help="write the exit summary to this json file")
+
+
+def setup(tool: str, args: Optional[argparse.Namespace] = None) -> Instrumentation:
+    """Start whatever the flags or the environment ask for, a no-op otherwise"""
+    profiler = getattr(args, 'profile', None) if args is not None else os.environ.get('WG_PROFILE') or None
+    if profiler not in PROFILERS:
+        profiler = None
+    try:
+        interval = float(os.environ.get('WG_PROFILE_INTERVAL', DEFAULT_SAMPLE_INTERVAL))
+    except ValueError:
+        interval = DEFAULT_SAMPLE_INTERVAL
+    if args is not None:
+        profile_path = args.profile_output
+        trace_memory = args.trace_memory
+        summary_path = args.instrument_output
+        monitoring = args.instrument
+    else:
+        profile_path = os.environ.get('WG_PROFILE_OUTPUT') or None
+        trace_memory = config_flag('WG_TRACEMALLOC')
+        summary_path = os.environ.get('WG_INSTRUMENT_OUTPUT') or None
+        monitoring = config_flag('WG_INSTRUMENT')
+    return instrumentation.start(tool, profiler=profiler, profile_path=profile_path, interval=interval,
+                                 trace_memory=trace_memory, summary_path=summary_path,
+                                 monitoring=monitoring,
+                                 verbose=config_flag('VERBOSE_LOGGING'))
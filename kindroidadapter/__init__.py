@@ -0,0 +1,19 @@
+"""
+kindroidadapter   async client for the kindroid api used by wooden ghost
+"""
+
+from kindroidadapter.cache import ResponseCache
+from kindroidadapter.client import (KindroidClient, KindroidError, KindroidResponse, MessageStream,
+                                    MessageTiming)
+from kindroidadapter.config import KindroidConfig, load_config
+
+__all__ = [
+    "KindroidClient",
+    "KindroidConfig",
+    "KindroidError",
+    "KindroidResponse",
+    "MessageStream",
+    "MessageTiming",
+    "ResponseCache",
+    "load_config",
+]
@@ -0,0 +1,138 @@
+"""
+ttl and lru response cache for idempotent kindroid get endpoints
+an in memory tier with an optional on disk tier that survives restarts
+stale entries keep their etag so they can be revalidated with if none match
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass
+class CacheEntry:
+    """Cached response body with its validator and expiry"""
+    status: int
+    content: Any
+    etag: Optional[str]
+    stored_at: float
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+class ResponseCache:
+    """LRU cache with TTL expiry and hit, miss and eviction counters"""
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1024, disk_path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.disk_path = Path(disk_path) if disk_path else None
+        if self.disk_path is not None:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.disk_hits = 0
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_path / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def _load_from_disk(self, key: str) -> Optional[CacheEntry]:
+        if self.disk_path is None:
+            return None
+        try:
+            with open(self._disk_file(key), 'r', encoding='utf-8') as f:
+                return CacheEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _store_on_disk(self, key: str, entry: CacheEntry):
+        if self.disk_path is None:
+            return
+        target = self._disk_file(key)
+        temp = target.with_suffix(".tmp")
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(asdict(entry), f, ensure_ascii=False)
+            os.replace(temp, target)
+        except (OSError, TypeError, ValueError):
+            # Unserialisable bodies simply stay memory only
+            temp.unlink(missing_ok=True)
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key: str) -> Tuple[Optional[CacheEntry], bool]:
+        """Return (entry, fresh); stale entries are only returned when they carry an etag"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load_from_disk(key)
+            if entry is not None:
+                self.disk_hits += 1
+                self._remember(key, entry)
+        else:
+            self._entries.move_to_end(key)
+
+        if entry is None:
+            self.misses += 1
+            return None, False
+        if entry.fresh:
+            self.hits += 1
+            return entry, True
+
+        self.misses += 1
+        if entry.etag:
+            return entry, False
+        self._entries.pop(key, None)
+        self.evictions += 1
+        return None, False
+
+    def store(self, key: str, status: int, content: Any, etag: Optional[str] = None) -> CacheEntry:
+        now = time.time()
+        entry = CacheEntry(status=status, content=content, etag=etag, stored_at=now, expires_at=now + self.ttl)
+        self._remember(key, entry)
+        self._store_on_disk(key, entry)
+        return entry
+
+    def refresh(self, key: str, entry: CacheEntry) -> CacheEntry:
+        """Extend a stale entry after a 304 Not Modified"""
+        self.revalidations += 1
+        entry.expires_at = time.time() + self.ttl
+        self._remember(key, entry)
+        self._store_on_disk(key, entry)
+        return entry
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self.disk_path is not None:
+            self._disk_file(key).unlink(missing_ok=True)
+
+    def clear(self):
+        self._entries.clear()
+        if self.disk_path is not None:
+            for path in self.disk_path.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+            "disk_hits": self.disk_hits,
+        }
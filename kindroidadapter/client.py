@@ -0,0 +1,446 @@
+"""
+pooled keep alive client for the kindroid api
+one shared connector per client so every request after the first reuses warm connections
+replies can also be streamed as server sent events or chunked text with time to first byte recorded
+"""
+
+import asyncio
+import codecs
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, Iterable, List, Mapping, Optional
+
+from kindroidadapter.cache import ResponseCache
+from kindroidadapter.config import KindroidConfig, load_config
+from kindroidadapter.scheduler import RequestScheduler
+
+if TYPE_CHECKING:
+    # aiohttp takes longer to import than everything else a command line run needs
+    import aiohttp
+
+DEFAULT_BASE_URL = "https://api.kindroid.ai/v1"
+
+# Message timings kept per client for callers that report on them
+TIMING_HISTORY = 1000
+
+SSE_DONE = "[DONE]"
+
+
+def _retry_exceptions() -> tuple:
+    """Transient failures the scheduler retries, aiohttp is first imported when a request is made"""
+    import aiohttp
+    return aiohttp.ClientError, asyncio.TimeoutError
+
+
+class KindroidError(Exception):
+    """Raised by the message helpers when the api answers with a non success status"""
+
+    def __init__(self, status: int, content: Any):
+        super().__init__(f"kindroid api returned {status}: {content}")
+        self.status = status
+        self.content = content
+
+
+@dataclass
+class KindroidResponse:
+    """Decoded api response with its round trip time"""
+    status: int
+    content: Any
+    elapsed: float
+    headers: Mapping[str, str] = field(default_factory=dict, repr=False)
+    cached: bool = False
+    ttfb: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+@dataclass
+class MessageTiming:
+    """Where the time of one message went, in seconds from the moment it was sent
+
+    ttfb is when the response headers arrived, first_chunk when the first reply
+    text did. Without streaming the reply arrives whole, so first_chunk equals total.
+    """
+    ttfb: float
+    first_chunk: float
+    total: float
+    chunks: int = 0
+    streamed: bool = False
+
+
+@dataclass
+class _OpenedStream:
+    """A response whose headers have arrived, what the scheduler inspects for retries"""
+    response: "aiohttp.ClientResponse"
+    started: float
+    ttfb: float
+
+    @property
+    def status(self) -> int:
+        return self.response.status
+
+    @property
+    def headers(self) -> Mapping[str, str]:
+        return self.response.headers
+
+
+class MessageStream:
+    """Reply text as it arrives, iterate it with async for
+
+    Server sent events and chunked bodies are yielded piece by piece, a plain JSON
+    reply from an endpoint that does not stream is yielded whole. status and
+    timing are filled in while iterating. A non success status yields no text and
+    leaves the error body in error, or raises KindroidError with raise_for_status.
+    """
+
+    def __init__(self, client: "KindroidClient", method: str, endpoint: str, payload: Optional[Dict],
+                 priority: int = 0, raise_for_status: bool = False):
+        self.client = client
+        self.method = method.upper()
+        self.endpoint = endpoint
+        self.payload = payload
+        self.priority = priority
+        self.raise_for_status = raise_for_status
+        self.status: Optional[int] = None
+        self.error: Any = None
+        self.timing: Optional[MessageTiming] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._chunks()
+
+    async def text(self) -> str:
+        """The whole reply, for callers that only want the timing of a streamed message"""
+        return "".join([chunk async for chunk in self])
+
+    async def _open(self) -> "_OpenedStream":
+        session = await self.client.session()
+        started = time.perf_counter()
+        response = await session.request(self.method, self.client.url(self.endpoint), json=self.payload,
+                                         headers={"Accept": "text/event-stream, application/json"})
+        opened = _OpenedStream(response, started, time.perf_counter() - started)
+        if response.status >= 300:
+            # Read error bodies right away so a retry does not hold the connection
+            await response.read()
+        return opened
+
+    async def _chunks(self) -> AsyncIterator[str]:
+        opened = await self.client.scheduler.execute(
+            self.endpoint, self._open, priority=self.priority,
+            retry_exceptions=_retry_exceptions(),
+        )
+        response = opened.response
+        self.status = response.status
+        first_chunk = None
+        chunks = 0
+        try:
+            if response.status >= 300:
+                self.error = await self._body(response)
+                if self.raise_for_status:
+                    raise KindroidError(response.status, self.error)
+                return
+            if response.content_type == "text/event-stream":
+                pieces = self._events(response)
+            elif response.content_type == "application/json":
+                pieces = self._whole(response)
+            else:
+                pieces = self._text(response)
+            async for piece in pieces:
+                if not piece:
+                    continue
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - opened.started
+                chunks += 1
+                yield piece
+        finally:
+            response.release()
+            total = time.perf_counter() - opened.started
+            self.timing = MessageTiming(
+                ttfb=opened.ttfb,
+                first_chunk=total if first_chunk is None else first_chunk,
+                total=total,
+                chunks=chunks,
+                streamed=response.content_type != "application/json",
+            )
+            self.client.timings.append(self.timing)
+
+    @staticmethod
+    async def _body(response: "aiohttp.ClientResponse") -> Any:
+        if response.content_type == "application/json":
+            try:
+                return await response.json()
+            except ValueError:
+                pass
+        return await response.text()
+
+    @staticmethod
+    async def _whole(response: "aiohttp.ClientResponse") -> AsyncIterator[str]:
+        yield KindroidClient.reply_text(await response.json())
+
+    @staticmethod
+    async def _text(response: "aiohttp.ClientResponse") -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        async for block in response.content.iter_any():
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+    @staticmethod
+    async def _events(response: "aiohttp.ClientResponse") -> AsyncIterator[str]:
+        """Text of each server sent event, data lines of one event are joined with newlines
+
+        Whatever the network delivered is split into lines in one go rather than
+        awaiting every line, events arrive in small bursts.
+        """
+        data: List[str] = []
+        pending = b""
+        async for block in response.content.iter_any():
+            pending += block
+            cut = pending.rfind(b"\n")
+            if cut < 0:
+                continue
+            lines, pending = pending[:cut].split(b"\n"), pending[cut + 1:]
+            for raw in lines:
+                line = raw.decode("utf-8", errors="replace").rstrip("\r")
+                if line.startswith("data:"):
+                    data.append(line[6:] if line.startswith("data: ") else line[5:])
+                    continue
+                if line or not data:
+                    # Comments, event names and ids carry no reply text
+                    continue
+                event, data = "\n".join(data), []
+                if event == SSE_DONE:
+                    return
+                yield MessageStream._event_text(event)
+        # The stream may end without the blank line that closes its last event
+        line = pending.decode("utf-8", errors="replace").rstrip("\r")
+        if line.startswith("data:"):
+            data.append(line[6:] if line.startswith("data: ") else line[5:])
+        if data:
+            event = "\n".join(data)
+            if event != SSE_DONE:
+                yield MessageStream._event_text(event)
+
+    @staticmethod
+    def _event_text(event: str) -> str:
+        try:
+            return KindroidClient.chunk_text(json.loads(event))
+        except ValueError:
+            return event
+
+
+class KindroidClient:
+    """High throughput async client sharing one tuned connection pool
+
+    Timeouts follow KINDROID_TIMEOUT and the pool is sized from MAXCONCURRENTREQUESTS.
+    Every request goes through a RequestScheduler for pacing and retries; pass one
+    in to share a quota between clients. GETs on the idempotent metadata endpoints
+    are served from a ResponseCache while EVECACHETTL is positive.
+
+    request and stream are the raw calls: whatever status the api answers with is
+    reported on the result, check its ok. send_message, send_many and stream_message
+    are for reply text and raise KindroidError on a non success status instead.
+    Connection failures and timeouts raise from every call once retries are spent.
+    """
+
+    message_endpoint = "messages"
+    cacheable_endpoints = ("health", "ai")
+
+    def __init__(self,
+                 config: Optional[Mapping[str, str]] = None,
+                 api_key: Optional[str] = None,
+                 ai_id: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 pool_size: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 scheduler: Optional[RequestScheduler] = None,
+                 cache: Optional[ResponseCache] = None,
+                 use_cache: bool = True,
+                 cache_dir: Optional[str] = None,
+                 user_agent: str = "WoodenGhost-Kindroid/1.0"):
+        self.config = config if isinstance(config, KindroidConfig) else \
+            KindroidConfig(config) if config is not None else load_config()
+        self.api_key = api_key if api_key is not None else self.config.get("KINDROID_API_KEY", "")
+        self.ai_id = ai_id if ai_id is not None else self.config.get("KINDROID_AI_ID", "")
+        self.base_url = (base_url or self.config.get("KINDROID_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = self.config.number("KINDROID_TIMEOUT", 30)
+        self.scheduler = scheduler or RequestScheduler.from_config(self.config, max_retries=max_retries)
+        self.pool_size = pool_size or max(1, int(self.config.number("MAXCONCURRENTREQUESTS", 5)))
+        cache_ttl = self.config.number("EVECACHETTL", 0)
+        if cache is None and use_cache and cache_ttl > 0:
+            cache = ResponseCache(ttl=cache_ttl, disk_path=cache_dir or self.config.get("EVECACHEDIR"))
+        self.cache = cache if use_cache else None
+        self.user_agent = user_agent
+        self.timings: Deque[MessageTiming] = deque(maxlen=TIMING_HISTORY)
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def session(self) -> "aiohttp.ClientSession":
+        """Shared session, created on first use inside the running loop"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json',
+                    'User-Agent': self.user_agent,
+                    'Accept': 'application/json',
+                },
+                raise_for_status=False,
+            )
+        return self._session
+
+    def url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        endpoint = endpoint.strip("/")
+        return any(endpoint == prefix or endpoint.startswith(prefix + "/") for prefix in self.cacheable_endpoints)
+
+    async def _send(self, method: str, endpoint: str, payload: Optional[Dict],
+                    headers: Optional[Dict[str, str]] = None) -> KindroidResponse:
+        session = await self.session()
+        start_time = time.perf_counter()
+        async with session.request(method, self.url(endpoint), json=payload, headers=headers) as response:
+            ttfb = time.perf_counter() - start_time
+            if response.content_type == 'application/json':
+                content = await response.json()
+            else:
+                content = await response.text()
+            return KindroidResponse(
+                status=response.status,
+                content=content,
+                elapsed=time.perf_counter() - start_time,
+                headers=response.headers,
+                ttfb=ttfb,
+            )
+
+    async def request(self, method: str, endpoint: str, payload: Optional[Dict] = None,
+                      priority: int = 0) -> KindroidResponse:
+        """Issue one request through the scheduler, which paces it and retries transient failures
+
+        Error statuses come back as the response rather than raising. Cacheable
+        GETs are answered from the cache while fresh and revalidated with
+        If-None-Match once stale.
+        """
+        method = method.upper()
+        cache_key = self.url(endpoint) if method == "GET" and self.cache is not None \
+            and self.is_cacheable(endpoint) else None
+        entry = None
+        headers = None
+        if cache_key is not None:
+            entry, fresh = self.cache.lookup(cache_key)
+            if fresh:
+                return KindroidResponse(status=entry.status, content=entry.content, elapsed=0.0, cached=True)
+            if entry is not None:
+                headers = {"If-None-Match": entry.etag}
+
+        response = await self.scheduler.execute(
+            endpoint,
+            lambda: self._send(method, endpoint, payload, headers),
+            priority=priority,
+            retry_exceptions=_retry_exceptions(),
+        )
+
+        if cache_key is not None:
+            if response.status == 304 and entry is not None:
+                self.cache.refresh(cache_key, entry)
+                return KindroidResponse(status=entry.status, content=entry.content, elapsed=response.elapsed,
+                                        headers=response.headers, cached=True)
+            if response.status == 200:
+                self.cache.store(cache_key, response.status, response.content, response.headers.get("ETag"))
+        return response
+
+    def message_payload(self, message: str, ai_id: Optional[str] = None, stream: bool = False) -> Dict:
+        """Body of a message request, for the default ai unless ai_id names another"""
+        payload = {"message": message, "ai_id": ai_id or self.ai_id}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def send_message(self, message: str, ai_id: Optional[str] = None, priority: int = 0) -> str:
+        """Send one message and return the reply text, KindroidError on a non success status"""
+        response = await self.request("POST", self.message_endpoint, self.message_payload(message, ai_id),
+                                      priority=priority)
+        self.timings.append(MessageTiming(ttfb=response.ttfb, first_chunk=response.elapsed,
+                                          total=response.elapsed, chunks=1))
+        if not response.ok:
+            raise KindroidError(response.status, response.content)
+        return self.reply_text(response.content)
+
+    def stream(self, method: str, endpoint: str, payload: Optional[Dict] = None,
+               priority: int = 0) -> MessageStream:
+        """Issue one request and iterate its reply text as it arrives
+
+        The scheduler paces and retries opening the stream. Once reply text has
+        started arriving nothing is retried, so no piece is ever delivered twice.
+        An error status yields no text, the stream's status and error tell what happened.
+        """
+        return MessageStream(self, method, endpoint, payload, priority)
+
+    def stream_message(self, message: str, ai_id: Optional[str] = None, priority: int = 0) -> MessageStream:
+        """Send one message asking for a streamed reply, async for over the result yields the text
+
+        Iterating raises KindroidError when the api answers with a non success status.
+        """
+        payload = self.message_payload(message, ai_id, stream=True)
+        return MessageStream(self, "POST", self.message_endpoint, payload, priority, raise_for_status=True)
+
+    async def send_many(self,
+                        messages: Iterable[str],
+                        ai_id: Optional[str] = None,
+                        return_exceptions: bool = False,
+                        priority: int = 0) -> List[Any]:
+        """Send messages concurrently across the pool, replies come back in input order
+
+        The scheduler bounds how many are in flight at once.
+        """
+        return await asyncio.gather(*(self.send_message(message, ai_id, priority) for message in messages),
+                                    return_exceptions=return_exceptions)
+
+    @staticmethod
+    def reply_text(content: Any) -> str:
+        if isinstance(content, dict):
+            for key in ("reply", "message", "response", "text"):
+                if isinstance(content.get(key), str):
+                    return content[key]
+        return content if isinstance(content, str) else str(content)
+
+    @classmethod
+    def chunk_text(cls, content: Any) -> str:
+        """Text of one streamed event, a delta or token field or the usual reply fields"""
+        if isinstance(content, dict):
+            for key in ("delta", "token", "content"):
+                if isinstance(content.get(key), str):
+                    return content[key]
+            choices = content.get("choices")
+            if isinstance(choices, list) and choices and isinstance(choices[0], dict):
+                delta = choices[0].get("delta")
+                if isinstance(delta, dict) and isinstance(delta.get("content"), str):
+                    return delta["content"]
+        return cls.reply_text(content)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "KindroidClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,68 @@
+"""
+configuration loading for the kindroid adapter
+reads environment.config style key=value files with environment variable overrides
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+DEFAULT_CONFIG_FILES = ["environment.config", ".env.clean"]
+
+# Keys callers may override from the process environment
+ENVIRONMENT_OVERRIDES = [
+    "KINDROID_API_KEY",
+    "KINDROID_AI_ID",
+    "KINDROID_BASE_URL",
+    "KINDROID_TIMEOUT",
+    "KINDROIDMAXRETRIES",
+    "KINDROIDRATELIMIT",
+    "MAXCONCURRENTREQUESTS",
+    "RETRYBACKOFFMULTIPLIER",
+]
+
+
+class KindroidConfig(dict):
+    """Configuration mapping that tolerates both KINDROID_API_KEY and KINDROIDAPIKEY spellings
+
+    environment.config drops most underscores from its keys while the code and the
+    environment use the underscored names, so lookups try both forms.
+    """
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        compact = key.replace("_", "")
+        if compact in self:
+            return self[compact]
+        return default
+
+    def number(self, key: str, default: float) -> float:
+        """Numeric value for key, falling back on missing or malformed entries"""
+        try:
+            return float(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+
+def load_config(config_path: Optional[str] = None) -> KindroidConfig:
+    """Load the first config file found, then apply environment variable overrides"""
+    config = KindroidConfig()
+
+    config_files = ([config_path] if config_path else []) + DEFAULT_CONFIG_FILES
+
+    for file_path in config_files:
+        if Path(file_path).exists():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if '=' in line and not line.strip().startswith('#'):
+                        key, value = line.strip().split('=', 1)
+                        config[key] = value
+            break
+
+    for key in ENVIRONMENT_OVERRIDES:
+        for name in (key, key.replace("_", "")):
+            if name in os.environ:
+                config[key] = os.environ[name]
+
+    return config
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+kindroid adapter example
+sends a single message and a small pipelined batch through one pooled client
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kindroidadapter.client import KindroidClient
+from kindroidadapter.utils.logger import log
+
+
+async def main():
+    async with KindroidClient() as client:
+        log.info("◆ sending a single message")
+        log.info(await client.send_message("◆ hello from the wooden ghost kindroid adapter ◆"))
+
+        log.info("◆ pipelining a batch across the connection pool")
+        replies = await client.send_many(
+            [f"temporal batch message {index}" for index in range(3)],
+            return_exceptions=True,
+        )
+        for reply in replies:
+            log.info(f"○ {reply}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
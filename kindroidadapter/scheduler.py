@@ -0,0 +1,229 @@
+"""
+token bucket scheduler shared by every kindroid request
+paces requests to the configured quota honours retry after and 429 responses
+and hands out slots from per endpoint priority queues
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from kindroidadapter.config import KindroidConfig
+from kindroidadapter.utils.logger import log
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given as seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket, a rate of None means unlimited"""
+
+    def __init__(self, rate: Optional[float], capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token can be taken"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate:
+            self._refill(time.monotonic())
+            self.tokens -= 1.0
+
+    def pause(self, seconds: float):
+        """Hold every request back for `seconds`, as asked by a Retry-After header"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class RequestScheduler:
+    """Token bucket pacing, bounded concurrency and retry policy for api requests
+
+    Waiters queue per endpoint; the dispatcher always serves the lowest priority
+    value first and rotates between endpoints on ties so a busy endpoint cannot
+    starve the rest. 429 responses halve the working rate, which then climbs back
+    towards the configured quota on every success. With `adaptive` off the rate
+    stays fixed and Retry-After is ignored, which is what a load generator wants.
+    """
+
+    def __init__(self,
+                 rate: Optional[float] = 1.0,
+                 burst: float = 1.0,
+                 max_concurrency: int = 5,
+                 max_retries: int = 3,
+                 backoff_multiplier: float = 2.0,
+                 base_delay: float = 0.5,
+                 max_delay: float = 60.0,
+                 retry_statuses=RETRYABLE_STATUSES,
+                 adaptive: bool = True):
+        self.max_rate = rate
+        self.adaptive = adaptive
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_multiplier = backoff_multiplier
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+        self.in_flight = 0
+        self.throttled = 0
+        self._queues: Dict[str, List[Tuple[int, int, asyncio.Future]]] = {}
+        self._last_served: Dict[str, int] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, config: KindroidConfig, max_retries: Optional[int] = None) -> "RequestScheduler":
+        """Scheduler sized from KINDROIDRATELIMIT (per minute), MAXCONCURRENTREQUESTS and the retry settings"""
+        concurrency = max(1, int(config.number("MAXCONCURRENTREQUESTS", 5)))
+        per_minute = config.number("KINDROIDRATELIMIT", 60)
+        return cls(
+            rate=per_minute / 60.0 if per_minute > 0 else None,
+            burst=concurrency,
+            max_concurrency=concurrency,
+            max_retries=max_retries if max_retries is not None else int(config.number("KINDROIDMAXRETRIES", 3)),
+            backoff_multiplier=config.number("RETRYBACKOFFMULTIPLIER", 2),
+        )
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter exponential backoff"""
+        ceiling = min(self.max_delay, self.base_delay * self.backoff_multiplier ** attempt)
+        return random.uniform(0.0, ceiling)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        best_key = None
+        best_endpoint = None
+        for endpoint, queue in self._queues.items():
+            while queue and queue[0][2].done():
+                heapq.heappop(queue)
+            if not queue:
+                continue
+            key = (queue[0][0], self._last_served.get(endpoint, -1))
+            if best_key is None or key < best_key:
+                best_key, best_endpoint = key, endpoint
+        if best_endpoint is None:
+            return None
+        self._last_served[best_endpoint] = next(self._sequence)
+        return heapq.heappop(self._queues[best_endpoint])[2]
+
+    def _has_waiters(self) -> bool:
+        return any(not future.done() for queue in self._queues.values() for _, _, future in queue)
+
+    async def _dispatch(self):
+        while self._has_waiters():
+            if self.in_flight >= self.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.bucket.wait_time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.bucket.take()
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._dispatcher = None
+
+    async def acquire(self, endpoint: str, priority: int = 0):
+        """Wait for a rate token and a concurrency slot; lower priority values go first"""
+        loop = asyncio.get_running_loop()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        waiter = loop.create_future()
+        heapq.heappush(self._queues.setdefault(endpoint, []), (priority, next(self._sequence), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _record_throttle(self, retry_after: Optional[float], attempt: int):
+        self.throttled += 1
+        self.bucket.pause(retry_after if retry_after is not None else self.backoff_delay(attempt))
+        if self.bucket.rate:
+            self.bucket.rate = max(self.max_rate / 16.0, self.bucket.rate / 2.0)
+
+    def _record_success(self):
+        if self.bucket.rate and self.bucket.rate < self.max_rate:
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 20.0)
+
+    async def execute(self, endpoint: str, send: Callable[[], Awaitable[Any]], priority: int = 0,
+                      retry_exceptions: Tuple[type, ...] = (asyncio.TimeoutError,)) -> Any:
+        """Run `send` under the schedule, retrying throttled or failed attempts
+
+        `send` returns an object with `status` and `headers`; the last response is
+        returned once it succeeds or the retry budget is spent.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(endpoint, priority)
+            try:
+                response = await send()
+            except retry_exceptions as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                log.debug(f"{endpoint} failed with {e!r}, retrying in {delay:.2f}s")
+            else:
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get("Retry-After")) \
+                    if status in (429, 503) else None
+                if self.adaptive:
+                    if status == 429:
+                        self._record_throttle(retry_after, attempt)
+                    elif status < 500:
+                        self._record_success()
+                if status not in self.retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = max(retry_after or 0.0, self.backoff_delay(attempt))
+                log.debug(f"{endpoint} returned {status}, retrying in {delay:.2f}s")
+            finally:
+                self.release()
+            await asyncio.sleep(delay)
+            attempt += 1
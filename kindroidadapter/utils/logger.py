@@ -0,0 +1,14 @@
+"""
+shared logger for the kindroid adapter and the chat interface
+"""
+
+import logging
+
+log = logging.getLogger("WoodenGhost.Kindroid")
+
+if not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s ◇ %(message)s", datefmt="%H:%M:%S"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
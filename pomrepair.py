@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+pomrepair   maven pom.xml repair engine for wooden ghost
+rebuilds tags in poms whose angle brackets were stripped, like groupIdghidra/groupId
+one tolerant left to right pass guided by the pom element vocabulary, existing tags pass through
+so repairing a repaired file changes nothing, every result is checked for well-formedness
+"""
+
+import argparse
+import logging
+import re
+import sys
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import wglog
+from repairxml import check_well_formed
+from workspace import WorkspaceScanner
+
+logger = logging.getLogger('WoodenGhost.PomRepair')
+
+POM_NAME = 'pom.xml'
+
+# Elements that hold other elements in the maven 4.0.0 model and common plugin configuration
+CONTAINERS = frozenset({
+    'project', 'parent', 'modules', 'properties', 'dependencyManagement', 'dependencies', 'dependency',
+    'exclusions', 'exclusion', 'build', 'pluginManagement', 'plugins', 'plugin', 'executions', 'execution',
+    'goals', 'configuration', 'resources', 'resource', 'testResources', 'testResource', 'includes',
+    'excludes', 'extensions', 'extension', 'filters', 'reporting', 'reportSets', 'reportSet', 'reports',
+    'profiles', 'profile', 'activation', 'property', 'repositories', 'repository', 'pluginRepositories',
+    'pluginRepository', 'releases', 'snapshots', 'distributionManagement', 'site', 'snapshotRepository',
+    'relocation', 'licenses', 'license', 'developers', 'developer', 'contributors', 'contributor', 'roles',
+    'organization', 'issueManagement', 'ciManagement', 'notifiers', 'notifier', 'mailingLists',
+    'mailingList', 'otherArchives', 'scm', 'prerequisites', 'archive', 'manifest', 'manifestEntries',
+    'descriptorRefs', 'compilerArgs', 'annotationProcessorPaths', 'systemPropertyVariables',
+})
+
+# Elements that only hold text
+LEAVES = frozenset({
+    'modelVersion', 'groupId', 'artifactId', 'version', 'packaging', 'name', 'description', 'url',
+    'inceptionYear', 'type', 'classifier', 'scope', 'systemPath', 'optional', 'sourceDirectory',
+    'scriptSourceDirectory', 'testSourceDirectory', 'outputDirectory', 'testOutputDirectory', 'directory',
+    'finalName', 'defaultGoal', 'filter', 'targetPath', 'filtering', 'include', 'exclude', 'module',
+    'phase', 'goal', 'id', 'inherited', 'source', 'target', 'release', 'encoding', 'relativePath',
+    'layout', 'enabled', 'updatePolicy', 'checksumPolicy', 'uniqueVersion', 'downloadUrl', 'status',
+    'message', 'email', 'organizationUrl', 'timezone', 'role', 'distribution', 'comments', 'connection',
+    'developerConnection', 'tag', 'system', 'subscribe', 'unsubscribe', 'post', 'otherArchive',
+    'activeByDefault', 'jdk', 'family', 'arch', 'exists', 'missing', 'value', 'mainClass',
+    'descriptorRef', 'addClasspath', 'classpathPrefix', 'arg', 'skip', 'skipTests', 'argLine', 'maven',
+})
+
+def _alternation(names) -> 're.Pattern':
+    # Longest first so dependencies wins over dependency
+    return re.compile('|'.join(sorted(map(re.escape, names), key=len, reverse=True)))
+
+CONTAINER_NAME = _alternation(CONTAINERS)
+LEAF_NAME = _alternation(LEAVES)
+KNOWN_NAME = _alternation(CONTAINERS | LEAVES)
+IDENTIFIER = re.compile(r'[A-Za-z_][\w.\-]*')
+ATTRIBUTES = re.compile(r'(?:\s+[\w:.\-]+\s*=\s*"[^"<\n]*")+')
+WHITESPACE = re.compile(r'\s+')
+WORD = re.compile(r'[^\s<]+')
+CORRUPTED_CLOSE = re.compile(r'/([A-Za-z_][\w.\-]*)')
+
+# Longest text searched for the close of a leaf, keeps the pass linear on files squashed onto one line
+MAX_LEAF_SPAN = 4096
+
+def _ends_token(text: str, index: int) -> bool:
+    """Whether a name ending at index is complete, followed by a break or by another pom token"""
+    if index >= len(text):
+        return True
+    char = text[index]
+    if char.isspace() or char == '<':
+        return True
+    if char == '/':
+        index += 1
+    return KNOWN_NAME.match(text, index) is not None
+
+class PomRepairer:
+    """Single pass tokenizer turning bracketless pom text back into xml"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.out: List[str] = []
+        self.stack: List[str] = []
+        self.inserted = 0
+        # Words kept as they are because nothing told what they were, as (position, word)
+        self.unrecognised: List[Tuple[int, str]] = []
+        self._closes: Optional[Dict[str, List[int]]] = None
+
+    def _closed_later(self, name: str, pos: int) -> bool:
+        """Whether a corrupted /name follows pos, the index of every /name is built once on first use"""
+        if self._closes is None:
+            self._closes = {}
+            for match in CORRUPTED_CLOSE.finditer(self.text):
+                if _ends_token(self.text, match.end()):
+                    self._closes.setdefault(match.group(1), []).append(match.start())
+        positions = self._closes.get(name, ())
+        return bisect_right(positions, pos) < len(positions)
+
+    def _line_end(self, pos: int) -> int:
+        limit = min(len(self.text), pos + MAX_LEAF_SPAN)
+        end = self.text.find('\n', pos, limit)
+        return limit if end < 0 else end
+
+    def _find_close(self, name: str, start: int, limit: int) -> int:
+        """First corrupted /name between start and limit that really ends the element, -1 if none"""
+        close = '/' + name
+        index = self.text.find(close, start, limit)
+        while index >= 0:
+            if _ends_token(self.text, index + len(close)):
+                return index
+            index = self.text.find(close, index + 1, limit)
+        return -1
+
+    def _emit_tag(self, tag: str):
+        self.out.append(tag)
+        self.inserted += 1
+
+    def _open(self, name: str):
+        self.stack.append(name)
+
+    def _close(self, name: str) -> bool:
+        """Pop up to name, closing anything left open inside it, False when it is not open"""
+        if name not in self.stack:
+            return False
+        while self.stack:
+            top = self.stack.pop()
+            if top == name:
+                return True
+            self._emit_tag(f'</{top}>')
+        return True
+
+    def _existing_tag(self, pos: int) -> int:
+        """Copy a tag that still has its brackets, tracking the element stack"""
+        text = self.text
+        if text.startswith('<!--', pos):
+            end = text.find('-->', pos)
+            end = len(text) if end < 0 else end + 3
+        elif text.startswith('<![CDATA[', pos):
+            end = text.find(']]>', pos)
+            end = len(text) if end < 0 else end + 3
+        else:
+            end = text.find('>', pos)
+            end = len(text) if end < 0 else end + 1
+        tag = text[pos:end]
+        self.out.append(tag)
+        if tag.startswith(('<?', '<!')) or tag.endswith('/>'):
+            return end
+        name = IDENTIFIER.match(tag, 2 if tag.startswith('</') else 1)
+        if name is None:
+            return end
+        if tag.startswith('</'):
+            self._close(name.group())
+        else:
+            self._open(name.group())
+            if name.group() not in CONTAINERS:
+                return self._leaf_content(name.group(), end)
+        return end
+
+    def _leaf_content(self, name: str, pos: int) -> int:
+        """Copy the text of a leaf opened with a real tag, repairing a corrupted /name close"""
+        text = self.text
+        limit = self._line_end(pos)
+        bracket = text.find('<', pos, limit)
+        if bracket >= 0:
+            self.out.append(text[pos:bracket])
+            return bracket
+        close = self._find_close(name, pos, limit)
+        if close < 0:
+            # Text running over several lines, keep all of it up to the next tag
+            bracket = text.find('<', pos)
+            bracket = len(text) if bracket < 0 else bracket
+            self.out.append(text[pos:bracket])
+            return bracket
+        self.out.append(text[pos:close])
+        self._emit_tag(f'</{name}>')
+        self.stack.pop()
+        return close + len(name) + 1
+
+    def _corrupted_leaf(self, pos: int) -> int:
+        """nameVALUE/name on one line, returns the position after it or -1"""
+        text = self.text
+        limit = self._line_end(pos)
+        bracket = text.find('<', pos, limit)
+        if bracket >= 0:
+            limit = bracket
+        known = LEAF_NAME.match(text, pos)
+        if known is not None:
+            close = self._find_close(known.group(), known.end(), limit)
+            if close >= 0:
+                return self._write_leaf(known.group(), pos, close)
+        # Any element name is fine as long as the line closes it, as in property keys
+        slash = text.find('/', pos, limit)
+        while slash >= 0:
+            name = IDENTIFIER.match(text, slash + 1)
+            if name is not None and text.startswith(name.group(), pos) \
+                    and slash >= pos + len(name.group()) and _ends_token(text, name.end()):
+                return self._write_leaf(name.group(), pos, slash)
+            slash = text.find('/', slash + 1, limit)
+        return -1
+
+    def _write_leaf(self, name: str, pos: int, close: int) -> int:
+        self._emit_tag(f'<{name}>')
+        self.out.append(self.text[pos + len(name):close])
+        self._emit_tag(f'</{name}>')
+        return close + len(name) + 1
+
+    def _corrupted_tag(self, pos: int) -> int:
+        """Declaration, comment, container open or close without brackets, -1 if none starts here"""
+        text = self.text
+        if text.startswith('?xml', pos):
+            end = text.find('?', pos + 4, self._line_end(pos))
+            if end >= 0:
+                self._emit_tag('<' + text[pos:end + 1] + '>')
+                return end + 1
+        if text.startswith('!--', pos):
+            end = text.find('--', pos + 3)
+            if end >= 0:
+                self._emit_tag('<' + text[pos:end + 2] + '>')
+                return end + 2
+        if text.startswith('/', pos):
+            for name in reversed(self.stack):
+                if text.startswith(name, pos + 1) and _ends_token(text, pos + 1 + len(name)):
+                    self._close(name)
+                    self._emit_tag(f'</{name}>')
+                    return pos + 1 + len(name)
+            return -1
+        container = CONTAINER_NAME.match(text, pos)
+        if container is None:
+            # A name outside the vocabulary holds elements when its /name turns up further on
+            container = IDENTIFIER.match(text, pos)
+            if container is None or KNOWN_NAME.fullmatch(container.group()) \
+                    or not self._closed_later(container.group(), container.end()):
+                return -1
+        end = container.end()
+        attributes = ATTRIBUTES.match(text, end)
+        if attributes is not None:
+            end = attributes.end()
+        if attributes is not None or _ends_token(text, end):
+            self._emit_tag('<' + text[pos:end] + '>')
+            self._open(container.group())
+            return end
+        return -1
+
+    def repair(self) -> str:
+        text = self.text
+        pos = 0
+        length = len(text)
+        while pos < length:
+            space = WHITESPACE.match(text, pos)
+            if space is not None:
+                self.out.append(space.group())
+                pos = space.end()
+                continue
+            if text[pos] == '<':
+                pos = self._existing_tag(pos)
+                continue
+            end = self._corrupted_leaf(pos)
+            if end < 0:
+                end = self._corrupted_tag(pos)
+            if end < 0:
+                # Unrecognised text is kept as it is
+                word = WORD.match(text, pos)
+                end = word.end()
+                self.out.append(word.group())
+                self.unrecognised.append((pos, word.group()))
+            pos = end
+        if self.stack:
+            if not ''.join(self.out[-1:]).endswith('\n'):
+                self.out.append('\n')
+            for name in reversed(self.stack):
+                self._emit_tag(f'</{name}>\n')
+            self.stack.clear()
+        return ''.join(self.out)
+
+def repair_pom_text(text: str) -> str:
+    """Repaired pom text, unchanged when it is already well tagged"""
+    return PomRepairer(text).repair()
+
+def repair_pom_file(path: Path, dry_run: bool = False) -> Dict:
+    """Repair one pom in place, the file is only rewritten when the result is well-formed
+    and no word was left without a place in it"""
+    result = {'path': str(path), 'changed': False, 'well_formed': False, 'inserted': 0, 'error': None}
+    try:
+        original = path.read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError) as e:
+        result['error'] = str(e)
+        return result
+    repairer = PomRepairer(original)
+    repaired = repairer.repair()
+    result['inserted'] = repairer.inserted
+    result['changed'] = repaired != original
+    if result['changed'] and repairer.unrecognised:
+        # Well-formed is not enough, bare words mean part of the structure was not rebuilt
+        lines = [(original.count('\n', 0, pos) + 1, word) for pos, word in repairer.unrecognised[:5]]
+        shown = ', '.join(f"{word!r} on line {line}" for line, word in lines)
+        result['error'] = f"{len(repairer.unrecognised)} words left unrecognised, {shown}"
+        return result
+    try:
+        check_well_formed([repaired])
+        result['well_formed'] = True
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    if result['changed'] and not dry_run:
+        path.write_text(repaired, encoding='utf-8')
+    return result
+
+def find_poms(root: str) -> List[Path]:
+    """Every pom.xml below root, skipping build output and ignored directories"""
+    scanner = WorkspaceScanner(root)
+    scanner.register('xml', ('.xml',), lambda files: files)
+    return [path for path in scanner.collect()['xml'] if path.name == POM_NAME]
+
+def repair_poms(paths: List[Path], dry_run: bool = False) -> List[Dict]:
+    results = []
+    for path in paths:
+        result = repair_pom_file(path, dry_run)
+        results.append(result)
+        if result['error']:
+            logger.error(f"✗ {path}: {result['error']}")
+        elif result['changed']:
+            verb = "would repair" if dry_run else "repaired"
+            logger.info("✓ %s %s, %d tags rebuilt", verb, path, result['inserted'], extra=wglog.ITEM)
+    return results
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild tags in pom.xml files that lost their angle brackets")
+    parser.add_argument("paths", nargs="*", default=["repositories"],
+                        help="pom files or directories to search for pom.xml (default: repositories)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    paths: List[Path] = []
+    for target in map(Path, args.paths):
+        paths.extend(find_poms(str(target)) if target.is_dir() else [target])
+    results = repair_poms(paths, args.dry_run)
+    failed = sum(1 for result in results if result['error'])
+    changed = sum(1 for result in results if result['changed'] and not result['error'])
+    logger.info(f"checked {len(results)} poms, {changed} repaired, {failed} still malformed")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    wglog.configure()
+    sys.exit(main())
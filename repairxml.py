@@ -2,68 +2,222 @@
 """
 repairxml   xml file repair utility for wooden ghost
 scans for malformed xml files and attempts to fix them by removing leading invalid characters
+files are checked with a streaming parser across a process pool and files known to be valid are skipped
 """
 
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
 import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import instrumentation
+import wglog
+from workspace import collect_files
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s ○ %(message)s', datefmt='%H:%M:%S')
 logger = logging.getLogger('WoodenGhost.RepairXML')
 
+XML_SUFFIXES = ('.xml',)
+CACHE_NAME = '.repairxml_cache.json'
+READ_SIZE = 1 << 16
+
+# Below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+class _NoTree:
+    """Parser target without callbacks, the parser checks well-formedness and builds nothing"""
+
+def read_blocks(file_path: Path) -> Iterator[bytes]:
+    with open(file_path, 'rb') as f:
+        yield from iter(lambda: f.read(READ_SIZE), b'')
+
+def file_digest(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    for block in read_blocks(file_path):
+        digest.update(block)
+    return digest.hexdigest()
+
+def check_well_formed(chunks: Iterable[Union[bytes, str]]) -> None:
+    """Feed chunks to an incremental parser, raising ET.ParseError at the first error"""
+    parser = ET.XMLParser(target=_NoTree())
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
 class XMLRepairer:
-    def __init__(self, root_path: str = "."):
+    def __init__(self, root_path: str = ".", workers: Optional[int] = None, force: bool = False):
         self.root_path = Path(root_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.force = force
+        self.cache_path = self.root_path / CACHE_NAME
         self.repaired_count = 0
         self.error_count = 0
+        self.valid_count = 0
+        self.skipped_count = 0
 
-    def repair_xml_file(self, file_path: Path):
+    def load_cache(self) -> Dict[str, Dict]:
+        """Size, mtime and content hash of every file found valid on earlier runs"""
         try:
-            # Try to parse the file as is first
-            ET.parse(file_path)
-        except ET.ParseError:
-            try:
-                # If parsing fails, read the content and attempt to fix it
-                content = file_path.read_text(encoding='utf-8', errors='ignore')
-                
-                # Find the first '<' which should be the start of the XML content
-                first_bracket = content.find('<')
-                
-                if first_bracket != -1:
-                    # Strip everything before the first '<'
-                    cleaned_content = content[first_bracket:]
-                    
-                    # Try to parse the cleaned content to see if it's valid now
-                    ET.fromstring(cleaned_content)
-                    
-                    # If parsing the cleaned content succeeds, write it back to the file
-                    file_path.write_text(cleaned_content, encoding='utf-8')
-                    self.repaired_count += 1
-                    logger.info(f"repaired {file_path}")
-                else:
-                    self.error_count += 1
-                    logger.warning(f"could not find start of xml content in {file_path}")
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self, cache: Dict[str, Dict]):
+        temp_path = self.cache_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.cache_path)
+
+    def check_file(self, file_path: Path, known_hash: Optional[str] = None) -> Dict:
+        """Validate one file in a single streaming read and repair it when it is malformed"""
+        result = {'path': str(file_path), 'status': 'valid', 'sha256': known_hash, 'error': None}
+        digest = hashlib.sha256()
+
+        def hashed_blocks():
+            for block in read_blocks(file_path):
+                digest.update(block)
+                yield block
+
+        try:
+            if known_hash is not None and file_digest(file_path) == known_hash:
+                # Touched but identical to content already found valid
+                return result
+            check_well_formed(hashed_blocks())
+            result['sha256'] = digest.hexdigest()
+            return result
+        except ET.ParseError as e:
+            parse_error = e
+        except OSError as e:
+            # Deleted or renamed since the walk, one file must not end the whole run
+            result.update(status='error', sha256=None, error=str(e))
+            return result
+
+        try:
+            # If parsing fails, read the content and attempt to fix it
+            content = file_path.read_text(encoding='utf-8', errors='ignore')
 
-            except Exception as e:
-                self.error_count += 1
-                logger.error(f"failed to repair {file_path}: {e}")
+            # Find the first '<' which should be the start of the XML content
+            first_bracket = content.find('<')
 
-    def scan_and_repair(self):
+            if first_bracket == -1:
+                result.update(status='error', sha256=None,
+                              error=f"could not find start of xml content ({parse_error})")
+                return result
+
+            # Strip everything before the first '<'
+            cleaned_content = content[first_bracket:]
+
+            # Try to parse the cleaned content to see if it's valid now
+            check_well_formed([cleaned_content])
+
+            # If parsing the cleaned content succeeds, write it back to the file
+            file_path.write_text(cleaned_content, encoding='utf-8')
+            result.update(status='repaired', sha256=file_digest(file_path))
+        except Exception as e:
+            result.update(status='error', sha256=None, error=str(e))
+        return result
+
+    def repair_xml_file(self, file_path: Path):
+        self._record(file_path, self.check_file(file_path))
+
+    def _record(self, file_path: Path, result: Dict):
+        if result['status'] == 'valid':
+            self.valid_count += 1
+        elif result['status'] == 'repaired':
+            self.repaired_count += 1
+            logger.info("repaired %s", file_path, extra=wglog.ITEM)
+        else:
+            self.error_count += 1
+            logger.error(f"failed to repair {file_path}: {result['error']}")
+
+    def scan_and_repair(self, xml_files: Optional[List[Path]] = None):
+        """Check the given xml files, or every one found by a workspace walk of root"""
         logger.info("starting xml repair process")
-        xml_files = list(self.root_path.rglob('*.xml'))
+        started = time.perf_counter()
+        if xml_files is None:
+            xml_files = collect_files(self.root_path, XML_SUFFIXES)
         logger.info(f"found {len(xml_files)} xml files to check")
+        with instrumentation.phase('read'):
+            cache = {} if self.force else self.load_cache()
+
+        pending = []
+        with instrumentation.phase('stat'):
+            for file_path in xml_files:
+                key = str(file_path.relative_to(self.root_path))
+                try:
+                    stat = file_path.stat()
+                except OSError as e:
+                    self.error_count += 1
+                    logger.error(f"failed to repair {file_path}: {e}")
+                    continue
+                entry = cache.get(key)
+                if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    # Known valid and untouched since
+                    self.skipped_count += 1
+                    continue
+                pending.append((file_path, key, entry.get('sha256') if entry else None))
+
+        with instrumentation.phase('parse'):
+            if len(pending) >= POOL_THRESHOLD and self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    results = list(pool.map(_check_in_worker, [str(path) for path, _, _ in pending],
+                                            [known for _, _, known in pending],
+                                            chunksize=max(1, len(pending) // (self.workers * 8))))
+            else:
+                results = [self.check_file(path, known) for path, _, known in pending]
+
+        for (file_path, key, _), result in zip(pending, results):
+            self._record(file_path, result)
+            if result['status'] == 'error':
+                cache.pop(key, None)
+                continue
+            try:
+                stat = file_path.stat()
+            except OSError:
+                # Gone since it was checked, next run checks it again
+                cache.pop(key, None)
+                continue
+            cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': result['sha256']}
 
-        for file_path in xml_files:
-            self.repair_xml_file(file_path)
-            
+        with instrumentation.phase('write'):
+            self.save_cache(cache)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
         logger.info(f"repair process complete. repaired {self.repaired_count} files.")
+        logger.info(f"checked {len(pending)} files, {self.skipped_count} known valid, "
+                    f"{len(xml_files) / elapsed:.1f} files/sec with {self.workers} workers")
         if self.error_count > 0:
             logger.warning(f"failed to repair {self.error_count} files.")
 
+_worker_repairer: Optional[XMLRepairer] = None
+
+def _check_in_worker(file_path: str, known_hash: Optional[str]) -> Dict:
+    """Process pool entry point, one repairer per worker process"""
+    global _worker_repairer
+    if _worker_repairer is None:
+        _worker_repairer = XMLRepairer(workers=1)
+    return _worker_repairer.check_file(Path(file_path), known_hash)
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check xml files and repair leading garbage")
+    parser.add_argument("root", nargs="?", default=".", help="directory to scan (default: current)")
+    parser.add_argument("--workers", type=int, default=None, help="checking processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and check every file")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
-    repairer = XMLRepairer()
+    args = parse_arguments()
+    instrumentation.setup('repairxml', args)
+    repairer = XMLRepairer(args.root, workers=args.workers, force=args.force)
     repairer.scan_and_repair()
 
 if __name__ == '__main__':
+    wglog.configure()
     main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+serve   production entry point for the woodenghost flask app
+runs pre forked gunicorn workers with a thread pool each so the service scales across cores
+settings come from environment variables next to PORT and ENV
+"""
+
+import multiprocessing
+import os
+
+from app import app
+from app_metrics import env_int, web_threads
+
+
+def server_settings() -> dict:
+    """Gunicorn settings derived from the environment
+
+    WEB_CONCURRENCY    worker processes (default 2 x cores + 1)
+    WEB_THREADS        threads per worker (default 4)
+    GRACEFUL_TIMEOUT   seconds workers get to finish in flight requests on shutdown (default 30)
+    WORKER_TIMEOUT     seconds before a silent worker is restarted (default 30)
+    KEEPALIVE          seconds to hold idle keep alive connections (default 5)
+    MAX_REQUESTS       recycle a worker after this many requests, 0 disables (default 0)
+    """
+    threads = web_threads()
+    return {
+        'bind': f"0.0.0.0:{env_int('PORT', 8000)}",
+        'workers': max(1, env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'graceful_timeout': env_int('GRACEFUL_TIMEOUT', 30),
+        'timeout': env_int('WORKER_TIMEOUT', 30),
+        'keepalive': env_int('KEEPALIVE', 5),
+        'max_requests': env_int('MAX_REQUESTS', 0),
+        'max_requests_jitter': env_int('MAX_REQUESTS', 0) // 10,
+        'preload_app': True,
+        'accesslog': '-' if os.getenv('ENV') == 'development' else None,
+        'errorlog': '-',
+    }
+
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # gunicorn does not run on Windows, fall back to the development server there
+        port = env_int('PORT', 8000)
+        print("⚠ gunicorn unavailable, serving with the single process development server")
+        app.run(host='0.0.0.0', port=port, debug=os.getenv('ENV') == 'development', threaded=True)
+        return
+
+    class WoodenGhostServer(BaseApplication):
+        """Gunicorn application wrapping the flask app with settings from the environment"""
+
+        def __init__(self, application, options: dict):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None and key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    # SIGTERM from docker stop drains in flight requests for up to GRACEFUL_TIMEOUT seconds
+    WoodenGhostServer(app, server_settings()).run()
+
+
+if __name__ == '__main__':
+    main()
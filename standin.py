@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+standin   local kindroid stand in server for offline benchmarking
+serves the endpoints the eve tester uses with configurable latency
+error injection and payload sizes so client numbers are reproducible without network
+also serves a paginated github gist listing with raw files for gistsync
+messages sent with stream true are answered word by word as server sent events
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+LATENCY_MODELS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+def parse_latency(spec: str, rng: random.Random = random) -> Callable[[], float]:
+    """Build a sampler returning seconds from specs like fixed:20, uniform:5,50,
+    normal:40,10, lognormal:30,0.5 or exponential:25 (values in milliseconds)
+    drawing from rng, the module level generator unless one is given"""
+    model, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value] if params else []
+    if model not in LATENCY_MODELS:
+        raise ValueError(f"unknown latency model {model!r}, expected one of {', '.join(LATENCY_MODELS)}")
+    if model == "fixed":
+        delay = values[0] if values else 0.0
+        return lambda: delay / 1000.0
+    if model == "uniform":
+        low, high = values
+        return lambda: rng.uniform(low, high) / 1000.0
+    if model == "normal":
+        mean, deviation = values
+        return lambda: max(0.0, rng.gauss(mean, deviation)) / 1000.0
+    if model == "lognormal":
+        median, sigma = values
+        mu = math.log(median) if median > 0 else 0.0
+        return lambda: rng.lognormvariate(mu, sigma) / 1000.0
+    mean = values[0]
+    return lambda: rng.expovariate(1.0 / mean) / 1000.0 if mean > 0 else 0.0
+
+
+def parse_error_mix(spec: str) -> Dict[int, float]:
+    """Weights per injected status, e.g. 429:0.5,500:0.3,503:0.2"""
+    mix = {}
+    for item in spec.split(","):
+        if item:
+            status, _, weight = item.partition(":")
+            mix[int(status)] = float(weight or 1)
+    return mix
+
+
+@dataclass
+class StandinConfig:
+    """Behaviour of the stand in server"""
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_mix: Dict[int, float] = field(default_factory=lambda: {429: 0.5, 500: 0.25, 503: 0.25})
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 60.0
+    retry_after: float = 1.0
+    payload_bytes: int = 0
+    ai_id: str = "standin"
+    seed: Optional[int] = None
+    gists: int = 25
+    gist_files: int = 2
+    gist_file_bytes: int = 2048
+    reply_words: int = 0
+    token_ms: float = 0.0
+
+
+class KindroidStandin:
+    """aiohttp application mimicking the kindroid endpoints exercised by run_comprehensive_tests"""
+
+    def __init__(self, config: StandinConfig):
+        self.config = config
+        # Own generator, seeding must not touch the random state of the process hosting the standin
+        self.random = random.Random(config.seed)
+        self.sample_latency = parse_latency(config.latency, self.random)
+        self.padding = "x" * config.payload_bytes if config.payload_bytes else ""
+        self.messages = []
+        self.request_count = 0
+        statuses = list(config.error_mix)
+        weights = [config.error_mix[status] for status in statuses]
+        self._error_statuses = statuses
+        self._error_weights = weights
+        self.gists: List[Dict] = [self._make_gist(index) for index in range(config.gists)]
+        self.gist_ids = {gist["id"]: gist for gist in self.gists}
+
+    @staticmethod
+    def _timestamp(seconds: Optional[float] = None) -> str:
+        moment = datetime.fromtimestamp(time.time() if seconds is None else seconds, timezone.utc)
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _make_gist(self, index: int) -> Dict:
+        created = self._timestamp()
+        files = {}
+        for number in range(self.config.gist_files):
+            line = f"○ gist {index} file {number} ◇\n"
+            repeat = max(1, self.config.gist_file_bytes // len(line.encode("utf-8")))
+            files[f"note{index}_{number}.md"] = line * repeat
+        return {
+            "id": hashlib.sha1(f"gist-{index}".encode("utf-8")).hexdigest()[:20],
+            "description": f"standin gist {index}",
+            "created_at": created,
+            "updated_at": created,
+            "contents": files,
+        }
+
+    def application(self) -> web.Application:
+        app = web.Application(middlewares=[self.behaviour])
+        app.router.add_get("/v1/health", self.health)
+        app.router.add_get("/v1/ai", self.list_ai)
+        app.router.add_get("/v1/ai/{ai_id}", self.get_ai)
+        app.router.add_get("/v1/messages", self.list_messages)
+        app.router.add_post("/v1/messages", self.send_message)
+        app.router.add_get("/users/{user}/gists", self.list_gists)
+        app.router.add_patch("/gists/{gist_id}", self.update_gist)
+        app.router.add_get("/raw/{gist_id}/{revision}/{filename}", self.raw_gist_file)
+        return app
+
+    @web.middleware
+    async def behaviour(self, request: web.Request, handler):
+        """Apply simulated latency, timeouts and injected errors before the real handler"""
+        self.request_count += 1
+        config = self.config
+        if config.timeout_rate and self.random.random() < config.timeout_rate:
+            await asyncio.sleep(config.timeout_seconds)
+        delay = self.sample_latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if config.error_rate and self.random.random() < config.error_rate:
+            status = self.random.choices(self._error_statuses, self._error_weights)[0]
+            headers = {"Retry-After": f"{config.retry_after:g}"} if status in (429, 503) else None
+            return web.json_response({"error": "injected", "status": status}, status=status, headers=headers)
+        return await handler(request)
+
+    def payload(self, body: Dict) -> Dict:
+        if self.padding:
+            body["padding"] = self.padding
+        return body
+
+    def cacheable(self, request: web.Request, body: Dict) -> web.Response:
+        """JSON response with a content ETag, answering If-None-Match with 304"""
+        encoded = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(encoded).hexdigest()[:16] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=encoded, content_type="application/json", headers={"ETag": etag})
+
+    async def health(self, request: web.Request) -> web.Response:
+        return self.cacheable(request, self.payload({"status": "healthy"}))
+
+    async def list_ai(self, request: web.Request) -> web.Response:
+        return self.cacheable(request, self.payload({"ais": [{"id": self.config.ai_id, "name": "eve"}]}))
+
+    async def get_ai(self, request: web.Request) -> web.Response:
+        ai_id = request.match_info["ai_id"]
+        if ai_id != self.config.ai_id:
+            return web.json_response({"error": "unknown ai"}, status=404)
+        return self.cacheable(request, self.payload({"id": ai_id, "name": "eve"}))
+
+    async def list_messages(self, request: web.Request) -> web.Response:
+        return web.json_response(self.payload({"messages": self.messages[-20:]}))
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({"error": "invalid json"}, status=400)
+        message = str(data.get("message", ""))
+        self.messages.append({"message": message, "ts": time.time()})
+        del self.messages[:-100]
+        reply = f"◆ {message}" + " ○" * self.config.reply_words
+        words = reply.split(" ")
+        tokens = [word + " " for word in words[:-1]] + [words[-1]]
+        delay = self.config.token_ms / 1000.0
+        if not data.get("stream"):
+            # The whole reply takes as long to generate as its streamed form
+            if delay > 0:
+                await asyncio.sleep(delay * len(tokens))
+            return web.json_response(self.payload({"reply": reply}))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        for token in tokens:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await response.write(b"data: " + json.dumps({"delta": token}, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def _gist_listing(self, request: web.Request, gist: Dict) -> Dict:
+        base = f"{request.scheme}://{request.host}"
+        files = {}
+        for name, content in gist["contents"].items():
+            revision = hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+            files[name] = {
+                "filename": name,
+                "type": "text/markdown",
+                "language": "Markdown",
+                "raw_url": f"{base}/raw/{gist['id']}/{revision}/{name}",
+                "size": len(content.encode("utf-8")),
+            }
+        return {key: gist[key] for key in ("id", "description", "created_at", "updated_at")} | {"files": files}
+
+    async def list_gists(self, request: web.Request) -> web.Response:
+        """Newest first like github, with per_page and page and a Link header"""
+        try:
+            per_page = min(100, max(1, int(request.query.get("per_page", 30))))
+            page = max(1, int(request.query.get("page", 1)))
+        except ValueError:
+            return web.json_response({"message": "invalid paging"}, status=400)
+        ordered = sorted(self.gists, key=lambda gist: gist["updated_at"], reverse=True)
+        chunk = ordered[(page - 1) * per_page:page * per_page]
+        response = self.cacheable(request, [self._gist_listing(request, gist) for gist in chunk])
+        last = max(1, math.ceil(len(ordered) / per_page))
+        if page < last:
+            next_url = request.url.with_query({"per_page": per_page, "page": page + 1})
+            last_url = request.url.with_query({"per_page": per_page, "page": last})
+            response.headers["Link"] = f'<{next_url}>; rel="next", <{last_url}>; rel="last"'
+        return response
+
+    async def update_gist(self, request: web.Request) -> web.Response:
+        """PATCH a gist like github, replacing file contents and moving updated_at"""
+        gist = self.gist_ids.get(request.match_info["gist_id"])
+        if gist is None:
+            return web.json_response({"message": "Not Found"}, status=404)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({"message": "invalid json"}, status=400)
+        if "description" in data:
+            gist["description"] = str(data["description"])
+        for name, change in (data.get("files") or {}).items():
+            if change is None:
+                gist["contents"].pop(name, None)
+            else:
+                gist["contents"][name] = str(change.get("content", ""))
+        # Github timestamps have second resolution, move at least one second so every update is visible
+        previous = datetime.strptime(gist["updated_at"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        gist["updated_at"] = self._timestamp(max(time.time(), previous.timestamp() + 1))
+        return web.json_response(self._gist_listing(request, gist))
+
+    async def raw_gist_file(self, request: web.Request) -> web.Response:
+        gist = self.gist_ids.get(request.match_info["gist_id"])
+        content = gist["contents"].get(request.match_info["filename"]) if gist else None
+        if content is None:
+            return web.Response(status=404, text="Not Found")
+        return web.Response(text=content, content_type="text/plain")
+
+
+@asynccontextmanager
+async def running_standin(config: Optional[StandinConfig] = None,
+                          host: str = "127.0.0.1", port: int = 0) -> AsyncIterator[str]:
+    """Serve a stand in inside the current loop and yield its base url, port 0 picks a free one"""
+    standin = KindroidStandin(config or StandinConfig())
+    runner = web.AppRunner(standin.application(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/v1"
+    finally:
+        await runner.cleanup()
+
+
+def parse_arguments(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local Kindroid stand-in server for offline benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="latency model in ms: fixed:20, uniform:5,50, normal:40,10, lognormal:30,0.5, exponential:25")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an injected error")
+    parser.add_argument("--error-mix", type=parse_error_mix, default="429:0.5,500:0.25,503:0.25",
+                        help="weights per injected status")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that stall")
+    parser.add_argument("--timeout-seconds", type=float, default=60.0, help="how long a stalled request hangs")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 and 503")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="bytes of ascii padding added to every body")
+    parser.add_argument("--ai-id", default="standin", help="ai id accepted by ai/{id}")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible latency and errors")
+    parser.add_argument("--gists", type=int, default=25, help="gists served under /users/{user}/gists")
+    parser.add_argument("--gist-files", type=int, default=2, help="files per gist")
+    parser.add_argument("--gist-file-bytes", type=int, default=2048, help="approximate size of every gist file")
+    parser.add_argument("--reply-words", type=int, default=0, help="filler words added to every message reply")
+    parser.add_argument("--token-ms", type=float, default=0.0,
+                        help="generation time per reply word, streamed replies send a word at a time")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_arguments()
+    config = StandinConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_mix=args.error_mix,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        retry_after=args.retry_after,
+        payload_bytes=args.payload_bytes,
+        ai_id=args.ai_id,
+        seed=args.seed,
+        gists=args.gists,
+        gist_files=args.gist_files,
+        gist_file_bytes=args.gist_file_bytes,
+        reply_words=args.reply_words,
+        token_ms=args.token_ms,
+    )
+    standin = KindroidStandin(config)
+    print(f"◇ Kindroid stand-in listening, point the tester at it with:")
+    print(f"  KINDROID_BASE_URL=http://{args.host}:{args.port}/v1 KINDROID_AI_ID={args.ai_id}")
+    print(f"  GITHUB_API_URL=http://{args.host}:{args.port} python gistsync.py")
+    web.run_app(standin.application(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,29 +2,59 @@
 """
 syntaxguru   comprehensive syntax auditor for wooden ghost workspace
 scans python and xml files detects syntax or parse errors and fixes them
+python results are cached by size mtime and content hash so only changed files are parsed again
 """
 
+import argparse
 import ast
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import xml.etree.ElementTree as ET
 import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+import instrumentation
+import wglog
+from workspace import GITIGNORE_NAME, WorkspaceScanner
 
-logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger('syntaxguru')
 
 workspace = Path('.')
 
+PYTHON_SUFFIXES = ('.py',)
+XML_SUFFIXES = ('.xml',)
+CACHE_NAME = '.syntaxguru_cache.json'
+
+# Below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
 py_errors = []
 xml_errors = []
 xml_fixed = []
 
+# Set by --json, results then go to stdout as one JSON object per line
+json_lines = False
+
+def emit(record: Dict):
+    if json_lines:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
 def scan_and_fix_xml(file_path: Path):
     try:
         # First try to parse as is
         ET.parse(file_path)
     except ET.ParseError as e:
         xml_errors.append((file_path, str(e)))
+        emit({'check': 'xml', 'path': str(file_path), 'ok': False, 'error': str(e)})
         try:
             # Attempt to fix by stripping leading/trailing whitespace
             content = file_path.read_text(encoding='utf-8', errors='ignore')
@@ -34,45 +64,353 @@ def scan_and_fix_xml(file_path: Path):
             # If successful, write the cleaned content back
             file_path.write_text(content, encoding='utf-8')
             xml_fixed.append(file_path)
+            emit({'check': 'xml', 'path': str(file_path), 'ok': True, 'fixed': True})
         except Exception as fix_e:
             # If fixing fails, log the failure
             logger.error(f"Failed to fix {file_path}: {fix_e}")
     except Exception as e:
         xml_errors.append((file_path, str(e)))
+        emit({'check': 'xml', 'path': str(file_path), 'ok': False, 'error': str(e)})
 
-def scan_python(file_path: Path):
+def check_python(file_path: str, known_hash: Optional[str] = None,
+                 known_error: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(content hash, error or None) for one file, the parse is skipped when the hash is known"""
+    try:
+        raw = Path(file_path).read_bytes()
+    except OSError as e:
+        return None, str(e)
+    digest = hashlib.sha256(raw).hexdigest()
+    if digest == known_hash:
+        return digest, known_error
+    # Same text read_text would give, universal newlines included
+    source = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
     try:
-        source = file_path.read_text(encoding='utf-8', errors='ignore')
-        ast.parse(source, filename=str(file_path))
+        ast.parse(source, filename=file_path)
     except SyntaxError as e:
-        py_errors.append((file_path, f"line {e.lineno}: {e.msg}"))
+        return digest, f"line {e.lineno}: {e.msg}"
     except Exception as e:
-        py_errors.append((file_path, str(e)))
+        return digest, str(e)
+    return digest, None
 
-def main():
-    for path in workspace.rglob('*'):
-        if not path.is_file():
-            continue
-        suffix = path.suffix.lower()
-        if suffix == '.py':
-            scan_python(path)
-        elif suffix == '.xml':
-            scan_and_fix_xml(path)
+def scan_python(file_path: Path):
+    _, error = check_python(str(file_path))
+    if error is not None:
+        py_errors.append((file_path, error))
+
+class PythonAuditor:
+    """Python syntax checks with a persistent per file result cache and a process pool"""
+
+    def __init__(self, root: Path = workspace, workers: Optional[int] = None, use_cache: bool = True):
+        self.root = Path(root)
+        self.workers = workers or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self.cache_path = self.root / CACHE_NAME
+        with instrumentation.phase('read'):
+            self.cache: Dict[str, Dict] = self.load_cache() if use_cache else {}
+        self.parsed_count = 0
+        self.cached_count = 0
+        self.dirty = False
+
+    def load_cache(self) -> Dict[str, Dict]:
+        """Size, mtime, content hash and result of every file checked on earlier runs"""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        if not self.use_cache or not self.dirty:
+            return
+        temp_path = self.cache_path.with_suffix('.tmp')
+        try:
+            # dumps encodes in C, dump would stream the dict through the pure python encoder
+            temp_path.write_text(json.dumps(self.cache, separators=(',', ':')), encoding='utf-8')
+            os.replace(temp_path, self.cache_path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"could not save {self.cache_path}: {e}")
+
+    def _key(self, path: Path) -> str:
+        try:
+            return str(path.relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def audit(self, files: List[Path]) -> List[Tuple[Path, str]]:
+        """Check files, parsing only those whose size, mtime or content changed since the last run"""
+        errors = []
+        pending = []
+        with instrumentation.phase('stat'):
+            for path in files:
+                key = self._key(path)
+                entry = self.cache.get(key)
+                try:
+                    stat = path.stat()
+                except OSError as e:
+                    self.forget(path)
+                    errors.append((path, str(e)))
+                    emit({'check': 'python', 'path': str(path), 'ok': False, 'error': str(e), 'cached': False})
+                    continue
+                if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    self.cached_count += 1
+                    self._report(path, entry['error'], cached=True, errors=errors)
+                    continue
+                pending.append((path, key, stat, entry))
+
+        with instrumentation.phase('parse'):
+            if len(pending) >= POOL_THRESHOLD and self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    outcomes = pool.map(check_python,
+                                        [str(path) for path, _, _, _ in pending],
+                                        [entry and entry['sha256'] for _, _, _, entry in pending],
+                                        [entry and entry['error'] for _, _, _, entry in pending],
+                                        chunksize=max(1, len(pending) // (self.workers * 8)))
+                    self._store(pending, outcomes, errors)
+            else:
+                outcomes = (check_python(str(path), entry and entry['sha256'], entry and entry['error'])
+                            for path, _, _, entry in pending)
+                self._store(pending, outcomes, errors)
+
+        with instrumentation.phase('write'):
+            self.save_cache()
+        return errors
+
+    def _store(self, pending, outcomes, errors: List[Tuple[Path, str]]):
+        # Outcomes arrive in order as workers finish, each is reported as soon as it is known
+        for (path, key, stat, _), (digest, error) in zip(pending, outcomes):
+            self.parsed_count += 1
+            self.dirty = True
+            if digest is None:
+                self.cache.pop(key, None)
+            else:
+                self.cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                   'sha256': digest, 'error': error}
+            self._report(path, error, cached=False, errors=errors)
+
+    def _report(self, path: Path, error: Optional[str], cached: bool, errors: List[Tuple[Path, str]]):
+        if error is not None:
+            errors.append((path, error))
+        emit({'check': 'python', 'path': str(path), 'ok': error is None, 'error': error, 'cached': cached})
+
+    def forget(self, path: Path):
+        if self.cache.pop(self._key(path), None) is not None:
+            self.dirty = True
+
+auditor: Optional[PythonAuditor] = None
+
+def audit_python(files: List[Path]) -> list:
+    global auditor
+    if auditor is None:
+        auditor = PythonAuditor(workspace)
+    started = time.perf_counter()
+    py_errors.extend(auditor.audit(files))
 
     logger.info('python files checked')
     logger.info(f'python syntax issues found {len(py_errors)}')
     for fp, err in py_errors:
-        logger.info(f'{fp}:{err}')
+        logger.info('%s:%s', fp, err, extra=wglog.ITEM)
+    logger.info(f'parsed {auditor.parsed_count} changed files, {auditor.cached_count} unchanged from cache '
+                f'in {time.perf_counter() - started:.2f}s')
+    return py_errors
+
+def audit_xml(files: List[Path]) -> list:
+    for path in files:
+        scan_and_fix_xml(path)
 
     logger.info('xml files checked')
     logger.info(f'xml parse issues found {len(xml_errors)}')
     for fp, err in xml_errors:
-        logger.info(f'{fp}:{err}')
-        
+        logger.info('%s:%s', fp, err, extra=wglog.ITEM)
+
     logger.info('xml files fixed')
     logger.info(f'xml files successfully fixed {len(xml_fixed)}')
     for fp in xml_fixed:
-        logger.info(f'fixed {fp}')
+        logger.info('fixed %s', fp, extra=wglog.ITEM)
+    return xml_errors
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+# Events closer together than this are handled as one batch
+SETTLE_SECONDS = 0.1
+
+class InotifyWatcher:
+    """Directory watches through inotify, reporting the paths touched in each burst of events"""
+
+    def __init__(self, scanner: WorkspaceScanner):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.scanner = scanner
+        self.directories: Dict[int, str] = {}
+        for directory in scanner.directories:
+            self.add(directory)
+
+    def add(self, directory: str):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.directories[wd] = directory
+
+    def _read_events(self, changed: Set[str]) -> bool:
+        """Drain pending events into changed, False when the kernel queue overflowed"""
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return True
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return False
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.scanner.is_path_ignored(path, True):
+                    # A new directory may already hold files by the time its watch exists
+                    nested = WorkspaceScanner(self.scanner.root, self.scanner.ignore_names, self.scanner.use_gitignore)
+                    changed.update(entry.path for entry in nested.walk(path))
+                    for subdirectory in nested.directories:
+                        self.add(subdirectory)
+                continue
+            changed.add(path)
+        return True
+
+    def changes(self) -> Optional[Set[str]]:
+        """Block until files change, None means events were lost and everything should be rechecked"""
+        changed: Set[str] = set()
+        select.select([self.fd], [], [])
+        while select.select([self.fd], [], [], SETTLE_SECONDS)[0]:
+            if not self._read_events(changed):
+                return None
+        return changed
+
+class PollingWatcher:
+    """Fallback without inotify, compares size and mtime of every watched file on an interval"""
+
+    def __init__(self, scanner: WorkspaceScanner, interval: float = 1.0):
+        self.scanner = scanner
+        self.interval = interval
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        scanner = WorkspaceScanner(self.scanner.root, self.scanner.ignore_names, self.scanner.use_gitignore)
+        snapshot = {}
+        for entry in scanner.walk():
+            if os.path.splitext(entry.name)[1].lower() in PYTHON_SUFFIXES:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def changes(self) -> Optional[Set[str]]:
+        while True:
+            time.sleep(self.interval)
+            current = self._snapshot()
+            changed = {path for path in current.keys() | self.snapshot.keys()
+                       if current.get(path) != self.snapshot.get(path)}
+            self.snapshot = current
+            if changed:
+                return changed
+
+def filter_changes(scanner: WorkspaceScanner, changed: Set[str]) -> Set[str]:
+    """Changed paths the initial walk would have audited, events also name files in ignored trees"""
+    if any(os.path.basename(path) == GITIGNORE_NAME for path in changed):
+        scanner.forget_ignore_rules()
+    return {path for path in changed if not scanner.is_path_ignored(path)}
+
+def open_watcher(scanner: WorkspaceScanner, interval: float):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(scanner)
+        except (OSError, AttributeError) as e:
+            logger.warning(f'inotify unavailable ({e}), polling every {interval:g}s')
+    return PollingWatcher(scanner, interval)
+
+def watch(scanner: WorkspaceScanner, interval: float = 1.0):
+    """Recheck only the python files touched after the initial audit, until interrupted"""
+    watcher = open_watcher(scanner, interval)
+    known_errors = {str(path): error for path, error in py_errors}
+    logger.info(f'watching {len(scanner.directories)} directories for python changes')
+    while True:
+        changed = watcher.changes()
+        if changed is not None:
+            changed = filter_changes(scanner, changed)
+        if changed is None:
+            # Lost events, a full pass is still cheap thanks to the cache
+            rescan = WorkspaceScanner(scanner.root, scanner.ignore_names, scanner.use_gitignore)
+            rescan.register('python', PYTHON_SUFFIXES, lambda files: files)
+            changed = {str(path) for path in rescan.collect()['python']} | set(known_errors)
+        touched = [Path(path) for path in sorted(changed)
+                   if os.path.splitext(path)[1].lower() in PYTHON_SUFFIXES]
+        present = [path for path in touched if path.exists()]
+        for path in touched:
+            if not path.exists():
+                auditor.forget(path)
+                known_errors.pop(str(path), None)
+        results = {str(path): error for path, error in auditor.audit(present)}
+        for path in present:
+            error = results.get(str(path))
+            previous = known_errors.pop(str(path), None)
+            if error is not None:
+                known_errors[str(path)] = error
+                logger.info('✗ %s:%s', path, error, extra=wglog.ITEM)
+            elif previous is not None:
+                logger.info('✓ %s fixed', path, extra=wglog.ITEM)
+        if json_lines:
+            sys.stdout.flush()
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Audit python and xml syntax across the workspace")
+    parser.add_argument("root", nargs="?", default=".", help="directory to audit (default: current)")
+    parser.add_argument("--json", action="store_true", help="write results to stdout as JSON lines")
+    parser.add_argument("--workers", type=int, default=None, help="parsing processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="parse every file and leave the cache alone")
+    parser.add_argument("--watch", action="store_true", help="keep running and recheck python files as they change")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="seconds between scans when inotify is unavailable")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main():
+    global workspace, auditor, json_lines
+    args = parse_arguments()
+    instrumentation.setup('syntaxguru', args)
+    workspace = Path(args.root)
+    json_lines = args.json
+    auditor = PythonAuditor(workspace, workers=args.workers, use_cache=not args.no_cache)
+
+    # One walk of the workspace feeds both audits, vendored and ignored directories are skipped
+    scanner = WorkspaceScanner(workspace)
+    scanner.register('python', PYTHON_SUFFIXES, audit_python)
+    scanner.register('xml', XML_SUFFIXES, audit_xml)
+    scanner.run()
+
+    emit({'check': 'summary', 'python_errors': len(py_errors), 'xml_errors': len(xml_errors),
+          'xml_fixed': len(xml_fixed), 'parsed': auditor.parsed_count, 'cached': auditor.cached_count})
+    if args.watch:
+        try:
+            watch(scanner, args.poll_interval)
+        except KeyboardInterrupt:
+            return
 
     if py_errors or (xml_errors and not all(f in xml_fixed for f, _ in xml_errors)):
         sys.exit(1)
@@ -80,4 +418,5 @@ def main():
         logger.info('syntax audit complete. issues fixed or not detected.')
 
 if __name__ == '__main__':
+    wglog.configure('plain')
     main()
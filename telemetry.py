@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+telemetry   fixed memory aggregation for wooden ghost request measurements
+log bucketed latency histograms status counters sampled bodies
+and a streaming jsonl sink so long soak runs never hold per request records
+"""
+
+import json
+import math
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple
+
+
+class LatencyHistogram:
+    """HDR style histogram with logarithmic buckets over a fixed value range
+
+    Values are seconds. Each bucket is `precision` wider than the previous one,
+    so any reported percentile is within that relative error of the true value
+    while memory stays constant no matter how many samples are recorded.
+    """
+
+    def __init__(self, lowest: float = 1e-6, highest: float = 3600.0, precision: float = 0.01):
+        self.lowest = lowest
+        self.highest = highest
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self._bucket_count = int(math.log(highest / lowest) / self._log_base) + 2
+        self.counts = [0] * self._bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        if value >= self.highest:
+            return self._bucket_count - 1
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _upper_bound(self, index: int) -> float:
+        if index == 0:
+            return self.lowest
+        return min(self.highest, self.lowest * math.exp(index * self._log_base))
+
+    def record(self, value: float, count: int = 1):
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        if (other.lowest, other.highest, other.precision) != (self.lowest, self.highest, self.precision):
+            raise ValueError("cannot merge histograms with different bucket layouts")
+        for index, bucket in enumerate(other.counts):
+            if bucket:
+                self.counts[index] += bucket
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the nearest-rank percentile, clamped to the observed range"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100.0 * self.count))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                return min(max(self._upper_bound(index), self.min), self.max)
+        return self.max
+
+    def buckets(self) -> Iterable[Tuple[float, int]]:
+        """Non-empty (upper bound, count) pairs in ascending order"""
+        for index, bucket in enumerate(self.counts):
+            if bucket:
+                yield self._upper_bound(index), bucket
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p99.9": self.percentile(99.9),
+        }
+
+
+class EndpointStats:
+    """Counters for one method and endpoint pair"""
+
+    def __init__(self, sample_bodies: int = 0):
+        self.latency = LatencyHistogram()
+        self.status_counts: Counter = Counter()
+        self.error_count = 0
+        self.coherence_total = 0.0
+        self.sample_bodies = sample_bodies
+        self.samples: List[Any] = []
+        # Bodies offered to the reservoir, records without one must not weigh on the draw
+        self.bodies_seen = 0
+
+    def record(self, status_code: int, response_time: float, coherence_score: float = 0.0, content: Any = None):
+        self.latency.record(response_time)
+        self.status_counts[status_code] += 1
+        self.coherence_total += coherence_score
+        if not 200 <= status_code < 300:
+            self.error_count += 1
+        if self.sample_bodies and content is not None:
+            # Reservoir sampling keeps a uniform sample without growing
+            self.bodies_seen += 1
+            if len(self.samples) < self.sample_bodies:
+                self.samples.append(content)
+            else:
+                slot = random.randrange(self.bodies_seen)
+                if slot < self.sample_bodies:
+                    self.samples[slot] = content
+
+    @property
+    def count(self) -> int:
+        return self.latency.count
+
+    @property
+    def error_rate(self) -> float:
+        return self.error_count / self.count if self.count else 0.0
+
+    @property
+    def avg_coherence(self) -> float:
+        return self.coherence_total / self.count if self.count else 0.0
+
+
+class ResultAggregator:
+    """Per endpoint statistics with memory bounded by the number of distinct endpoints"""
+
+    def __init__(self, sample_bodies: int = 0):
+        self.sample_bodies = sample_bodies
+        self.endpoints: Dict[Tuple[str, str], EndpointStats] = {}
+        self.started = time.time()
+
+    def stats_for(self, method: str, endpoint: str) -> EndpointStats:
+        key = (method.upper(), endpoint)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats(self.sample_bodies)
+        return stats
+
+    def record(self, method: str, endpoint: str, status_code: int, response_time: float,
+               coherence_score: float = 0.0, content: Any = None):
+        self.stats_for(method, endpoint).record(status_code, response_time, coherence_score, content)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(stats.count for stats in self.endpoints.values())
+
+    @property
+    def avg_coherence(self) -> float:
+        total = self.total_requests
+        return sum(stats.coherence_total for stats in self.endpoints.values()) / total if total else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            f"{method} {endpoint}": {
+                "latency": stats.latency.to_dict(),
+                "status": dict(stats.status_counts),
+                "errors": stats.error_count,
+                "coherence": stats.avg_coherence,
+            }
+            for (method, endpoint), stats in sorted(self.endpoints.items())
+        }
+
+
+class JSONLSink:
+    """Append one JSON record per line as results arrive"""
+
+    def __init__(self, path: str, flush_every: int = 256):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self._pending = 0
+        self._handle: Optional[IO[str]] = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, record: Dict[str, Any]):
+        if self._handle is None:
+            raise ValueError(f"sink {self.path} is closed")
+        self._handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._handle.flush()
+            self._pending = 0
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self) -> "JSONLSink":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
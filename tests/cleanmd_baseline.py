@@ -0,0 +1,31 @@
+"""
+cleanmd_baseline   the regex converter cleanmd shipped before streaming, kept as the reference
+every rule is one whole string pass, the streamed converter has to match it byte for byte
+"""
+
+import io
+import re
+from pathlib import Path
+
+MARKDOWN_PATTERNS = {
+    'headers': [(re.compile(r'^#{1,6}\s+', re.MULTILINE), '')],
+    'lists': [(re.compile(r'^\s*[\*\-]\s+', re.MULTILINE), '○ ')],
+    'links': [(re.compile(r'\[([^\]]+)\]\([^\)]+\)'), r'\1')]
+}
+SEPARATOR_PATTERN = re.compile(r'^\s*[\-\*\_]{3,}\s*$', re.MULTILINE)
+
+
+def convert_content(content: str) -> str:
+    for category, patterns in MARKDOWN_PATTERNS.items():
+        for pattern, replacement in patterns:
+            content = pattern.sub(replacement, content)
+    # Replace remaining horizontal lines or separators
+    content = SEPARATOR_PATTERN.sub('◇◆◇◆◇', content)
+    return content
+
+
+def convert_file(file_path: Path, new_path: Path):
+    """What convert_file wrote, decoded like Path.read_text and written with write_text"""
+    raw = file_path.read_bytes()
+    original_content = io.TextIOWrapper(io.BytesIO(raw), encoding='utf-8', errors='ignore').read()
+    new_path.write_text(convert_content(original_content), encoding='utf-8')
@@ -0,0 +1,8 @@
+"""
+conftest   puts the repository root on sys.path so the tests import the flat tool modules
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+"""
+test_cleanmd_golden   the streamed converter against the baseline regex converter on the golden corpus
+tiny read and segment sizes put read and segment boundaries inside crlf pairs, tables, links and fences
+"""
+
+import io
+import shutil
+from pathlib import Path
+
+import pytest
+
+import cleanmd
+import cleanmd_baseline
+from cleanmd import SafeMarkdownConverter
+
+CORPUS = sorted((Path(__file__).parent / 'data' / 'cleanmd').glob('*.md'))
+READ_SIZES = (1, 2, 3, 7, 64)
+SEGMENT_SIZES = (1, 5, 33, 4096)
+
+
+def read_document(path: Path) -> str:
+    # newline='' keeps crlf and lone cr so the converters see them
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def test_corpus_is_there():
+    assert len(CORPUS) >= 5
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=lambda path: path.name)
+@pytest.mark.parametrize('read_size', READ_SIZES)
+def test_stream_matches_baseline(path, read_size, monkeypatch):
+    monkeypatch.setattr(cleanmd, 'READ_SIZE', read_size)
+    document = read_document(path)
+    expected = cleanmd_baseline.convert_content(document)
+    converter = SafeMarkdownConverter('.')
+    for segment_size in SEGMENT_SIZES:
+        parts = []
+        converter.convert_stream(io.StringIO(document, newline='\n').read, parts.append, segment_size=segment_size)
+        assert ''.join(parts) == expected, f"segment size {segment_size}"
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=lambda path: path.name)
+def test_content_matches_baseline(path, monkeypatch):
+    # Documents above the segment size go through the stream
+    monkeypatch.setattr(cleanmd, 'SEGMENT_SIZE', 16)
+    document = read_document(path)
+    assert SafeMarkdownConverter('.').convert_content(document) == cleanmd_baseline.convert_content(document)
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=lambda path: path.name)
+@pytest.mark.parametrize('read_size', (1, 5, 64))
+def test_file_output_matches_baseline(path, read_size, tmp_path, monkeypatch):
+    monkeypatch.setattr(cleanmd, 'READ_SIZE', read_size)
+    expected_path = tmp_path / 'expected.txt'
+    cleanmd_baseline.convert_file(path, expected_path)
+    source = tmp_path / path.name
+    shutil.copyfile(path, source)
+    result = SafeMarkdownConverter(str(tmp_path), workers=1).convert_file(source)
+    assert result['converted'] and not source.exists()
+    assert Path(result['output']).read_bytes() == expected_path.read_bytes()
@@ -0,0 +1,49 @@
+"""
+test_cleanmd_manifest   the incremental manifest never loses a markdown file
+"""
+
+import os
+
+from cleanmd import SafeMarkdownConverter
+
+
+def convert(root, files=None):
+    converter = SafeMarkdownConverter(str(root), workers=1)
+    converter.process_files(files)
+    return converter
+
+
+def test_edit_keeping_size_and_mtime_is_converted(tmp_path):
+    source = tmp_path / 'notes.md'
+    source.write_text('# one\n', encoding='utf-8')
+    convert(tmp_path)
+    assert (tmp_path / 'notes.txt').read_text(encoding='utf-8') == 'one\n'
+
+    # Same size and mtime as the converted file, as after touch -r
+    source.write_text('# two\n', encoding='utf-8')
+    recorded = SafeMarkdownConverter(str(tmp_path)).load_manifest()['notes.md']
+    os.utime(source, ns=(recorded['mtime_ns'], recorded['mtime_ns']))
+    converter = convert(tmp_path)
+    assert converter.processed_count == 1
+    assert (tmp_path / 'notes.txt').read_text(encoding='utf-8') == 'two\n'
+    assert not source.exists()
+
+
+def test_unchanged_file_is_left_in_place(tmp_path):
+    source = tmp_path / 'notes.md'
+    source.write_text('# same\n', encoding='utf-8')
+    convert(tmp_path)
+    source.write_text('# same\n', encoding='utf-8')
+    converter = convert(tmp_path)
+    assert converter.skipped_count == 1 and converter.processed_count == 0
+    assert source.exists()
+
+
+def test_file_outside_root_is_converted(tmp_path):
+    root = tmp_path / 'root'
+    root.mkdir()
+    outside = tmp_path / 'elsewhere.md'
+    outside.write_text('- item\n', encoding='utf-8')
+    converter = convert(root, [outside])
+    assert converter.failed_count == 0 and converter.processed_count == 1
+    assert (tmp_path / 'elsewhere.txt').read_text(encoding='utf-8') == '○ item\n'
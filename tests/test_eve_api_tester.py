@@ -0,0 +1,37 @@
+"""
+test_eve_api_tester   load runs against the stand in leave the tester as they found it
+"""
+
+import asyncio
+import logging
+
+from eve_api_tester import EVEAPITester, WoodenGhostLogger
+from standin import StandinConfig, running_standin
+
+
+def test_load_test_restores_scheduler_and_cache(tmp_path, monkeypatch):
+    async def run():
+        async with running_standin(StandinConfig()) as base_url:
+            monkeypatch.setenv('KINDROID_BASE_URL', base_url)
+            tester = EVEAPITester(config_path=str(tmp_path / 'missing.config'), cache_dir=str(tmp_path / 'cache'))
+            scheduler, cache = tester.client.scheduler, tester.client.cache
+            try:
+                report = await tester.run_load_test('health', concurrency=2, rate=0, total_requests=5)
+            finally:
+                await tester.close()
+            return report, scheduler, cache, tester.client
+
+    report, scheduler, cache, client = asyncio.run(run())
+    assert report.total_requests == 5
+    assert cache is not None
+    assert client.scheduler is scheduler and client.cache is cache
+
+
+def test_temporal_message_takes_format_arguments_positionally(caplog):
+    logger = WoodenGhostLogger(aesthetic_mode=True)
+    with caplog.at_level(logging.INFO):
+        logger.temporal_message("Response %d in %.3fs", 200, 0.25, semantic_marker="✓")
+        logger.temporal_message("failed: %s", "boom", level="error", semantic_marker="✗")
+    messages = [(record.levelno, record.getMessage()) for record in caplog.records]
+    assert (logging.INFO, "✓ Response 200 in 0.250s") in messages
+    assert (logging.ERROR, "✗ failed: boom") in messages
@@ -0,0 +1,162 @@
+"""
+test_eve_batch   resuming batch runs against the stand in, after crashes, failures and kills
+"""
+
+import asyncio
+import collections
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from eve_batch import BatchOutputError, Checkpoint, completed_indices, run_batch
+from kindroidadapter.client import KindroidClient
+from kindroidadapter.scheduler import RequestScheduler
+from standin import StandinConfig, running_standin
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_prompts(path: Path, count: int, invalid=()):
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(count):
+            f.write('not json\n' if index in invalid else json.dumps({'id': f"p{index}", 'message': f"hi {index}"}) + '\n')
+
+
+def records(path: Path):
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def answered(path: Path):
+    counts = collections.Counter(record['index'] for record in records(path))
+    assert all(count == 1 for count in counts.values()), "an item was answered twice"
+    return set(counts)
+
+
+def batch(tmp_path, config: StandinConfig, concurrency: int = 4, **kwargs):
+    async def run():
+        async with running_standin(config) as base_url:
+            scheduler = RequestScheduler(rate=None, burst=concurrency, max_concurrency=concurrency, max_retries=0)
+            async with KindroidClient(config={}, base_url=base_url, scheduler=scheduler, use_cache=False) as client:
+                return await run_batch(str(tmp_path / 'prompts.jsonl'), str(tmp_path / 'out.jsonl'), client,
+                                       concurrency, progress_interval=0, **kwargs)
+
+    return asyncio.run(run())
+
+
+def test_partial_last_line_is_cut_and_resent(tmp_path):
+    write_prompts(tmp_path / 'prompts.jsonl', 6)
+    output = tmp_path / 'out.jsonl'
+    output.write_text('{"index": 0, "id": "p0", "reply": "a"}\n{"index": 1, "id": "p1", "reply": "b"}\n{"index": 2, "id"',
+                      encoding='utf-8')
+    report = batch(tmp_path, StandinConfig())
+    assert report.skipped == 2 and report.sent == 4
+    assert answered(output) == set(range(6))
+    assert [record['index'] for record in records(output)] == list(range(6))
+
+
+def test_output_that_is_not_a_batch_is_left_alone(tmp_path):
+    output = tmp_path / 'notes.jsonl'
+    output.write_text('{"note": "mine"}\n', encoding='utf-8')
+    with pytest.raises(BatchOutputError):
+        completed_indices(output)
+    assert output.read_text(encoding='utf-8') == '{"note": "mine"}\n'
+
+
+def test_failed_items_wait_for_retry_failed(tmp_path):
+    write_prompts(tmp_path / 'prompts.jsonl', 8)
+    output = tmp_path / 'out.jsonl'
+    failures = tmp_path / 'out.failures.jsonl'
+    report = batch(tmp_path, StandinConfig(error_rate=1.0, error_mix={400: 1}))
+    assert report.errors == 8 and not answered(output)
+    assert {record['index'] for record in records(failures)} == set(range(8))
+
+    report = batch(tmp_path, StandinConfig())
+    assert report.sent == 0 and report.failed_earlier == 8
+
+    report = batch(tmp_path, StandinConfig(), retry_failed=True)
+    assert report.sent == 8 and report.errors == 0
+    assert answered(output) == set(range(8))
+    assert not (tmp_path / 'out.jsonl.checkpoint').exists()
+
+
+def test_ordered_window_releases_in_input_order(tmp_path):
+    # Far more items than the window holds, with replies finishing out of order and invalid lines among them
+    write_prompts(tmp_path / 'prompts.jsonl', 200, invalid={3, 77})
+    report = batch(tmp_path, StandinConfig(latency='uniform:0,15', seed=5), concurrency=3)
+    assert report.sent == 198 and report.invalid == 2
+    assert [record['index'] for record in records(tmp_path / 'out.jsonl')] == [
+        index for index in range(200) if index not in (3, 77)]
+    assert {record['index'] for record in records(tmp_path / 'out.failures.jsonl')} == {3, 77}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def slow_standin():
+    port = free_port()
+    server = subprocess.Popen([sys.executable, 'standin.py', '--port', str(port), '--latency', 'fixed:300'],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='needs SIGKILL')
+def test_killed_run_holds_back_unanswered_items_until_resend_interrupted(tmp_path, slow_standin):
+    write_prompts(tmp_path / 'prompts.jsonl', 40)
+    (tmp_path / 'empty.config').write_text('', encoding='utf-8')
+    output = tmp_path / 'out.jsonl'
+    checkpoint = tmp_path / 'out.jsonl.checkpoint'
+    environment = dict(os.environ, KINDROID_BASE_URL=slow_standin)
+
+    def command(*flags):
+        return [sys.executable, 'eve_batch.py', str(tmp_path / 'prompts.jsonl'), str(output), '--concurrency', '4',
+                '--rate', '0', '--progress', '0', '--config', str(tmp_path / 'empty.config'), *flags]
+
+    run = subprocess.Popen(command(), cwd=ROOT, env=environment, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    # Kill it once some replies are saved, more requests are in flight by then
+    deadline = time.monotonic() + 20
+    while len(records(output)) < 4 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    run.send_signal(signal.SIGKILL)
+    run.wait()
+
+    done = answered(output)
+    interrupted = Checkpoint(checkpoint).sent() - done
+    assert done and interrupted and len(done) < 40
+
+    rerun = subprocess.run(command(), cwd=ROOT, env=environment, capture_output=True, text=True)
+    assert rerun.returncode == 0, rerun.stderr
+    assert answered(output) == set(range(40)) - interrupted
+    assert checkpoint.exists()
+
+    rerun = subprocess.run(command('--resend-interrupted'), cwd=ROOT, env=environment, capture_output=True, text=True)
+    assert rerun.returncode == 0, rerun.stderr
+    assert answered(output) == set(range(40))
+    assert not checkpoint.exists()
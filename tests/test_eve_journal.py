@@ -0,0 +1,31 @@
+"""
+test_eve_journal   journals recorded by several runs into one directory replay one run after another
+"""
+
+from eve_journal import RequestJournal, in_send_order, journal_runs, read_journal
+
+
+def record_run(directory, offsets, elapsed=0.5):
+    with RequestJournal(str(directory), flush_interval=0.01) as journal:
+        for offset in offsets:
+            journal.record('GET', 'health', None, 200, elapsed, started=journal.started + offset)
+    return journal.stamp
+
+
+def test_runs_sharing_a_directory_are_laid_end_to_end(tmp_path):
+    first = record_run(tmp_path, [0.0, 1.0, 2.0])
+    second = record_run(tmp_path, [0.0, 1.0])
+    assert first != second
+    assert len(journal_runs(str(tmp_path))) == 2
+    offsets = [entry['offset'] for entry in in_send_order(read_journal(str(tmp_path)))]
+    # The first run ends with its last request at 2.5s, the second starts there
+    assert offsets == [0.0, 1.0, 2.0, 2.5, 3.5]
+
+
+def test_rotated_files_of_one_run_share_its_timeline(tmp_path):
+    with RequestJournal(str(tmp_path), max_bytes=1, batch_size=1, flush_interval=0.01) as journal:
+        for offset in (0.0, 1.0, 2.0):
+            journal.record('GET', 'health', None, 200, 0.1, started=journal.started + offset)
+    assert len(list(tmp_path.glob('journal-*'))) == 3
+    assert len(journal_runs(str(tmp_path))) == 1
+    assert [entry['offset'] for entry in read_journal(str(tmp_path))] == [0.0, 1.0, 2.0]
@@ -0,0 +1,26 @@
+"""
+test_import_budget   keeps every tool's import time within its budget in bench.IMPORT_BUDGETS
+each module is imported in a fresh interpreter, the fastest of three runs counts
+IMPORT_BUDGET_SCALE loosens the budgets on slow machines
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench  # noqa: E402
+
+RUNS = 3
+SCALE = float(os.getenv('IMPORT_BUDGET_SCALE', '1.0'))
+
+
+@pytest.mark.parametrize('module, budget', sorted(bench.IMPORT_BUDGETS.items()))
+def test_import_within_budget(module, budget):
+    profiles = [bench.import_profile(module) for _ in range(RUNS)]
+    fastest = min(profiles, key=lambda profile: profile['import'])
+    heaviest = ', '.join(f"{name} {ms:.0f} ms" for ms, name in fastest['heaviest'])
+    assert fastest['import'] <= budget * SCALE, \
+        f"importing {module} took {fastest['import']:.0f} ms, budget {budget * SCALE:.0f} ms ({heaviest})"
@@ -0,0 +1,130 @@
+"""
+test_kindroid_cache   ttl expiry, lru eviction and etag revalidation of cached responses
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+from kindroidadapter import cache as cache_module
+from kindroidadapter.cache import ResponseCache
+from kindroidadapter.client import KindroidClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', SimpleNamespace(time=clock))
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(ttl=10)
+    cache.store('health', 200, {'status': 'healthy'})
+    clock.now += 9.9
+    entry, fresh = cache.lookup('health')
+    assert fresh and entry.content == {'status': 'healthy'}
+    clock.now += 0.1
+    assert cache.lookup('health') == (None, False)
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_stale_entries_with_an_etag_are_kept_for_revalidation(clock):
+    cache = ResponseCache(ttl=10)
+    cache.store('ai', 200, {'ais': []}, etag='"v1"')
+    clock.now += 11
+    entry, fresh = cache.lookup('ai')
+    assert not fresh and entry.etag == '"v1"'
+    cache.refresh('ai', entry)
+    assert cache.lookup('ai') == (entry, True)
+    assert cache.revalidations == 1
+
+
+def test_least_recently_used_is_evicted_first(clock):
+    cache = ResponseCache(ttl=60, max_entries=3)
+    for key in 'abc':
+        cache.store(key, 200, key)
+    cache.lookup('a')
+    cache.store('d', 200, 'd')
+    assert cache.lookup('b') == (None, False)
+    assert [cache.lookup(key)[0].content for key in 'acd'] == ['a', 'c', 'd']
+    cache.store('b', 200, 'b')
+    assert cache.lookup('a') == (None, False), "a was used before c and d so goes next"
+    assert cache.evictions == 2
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path, clock):
+    ResponseCache(ttl=60, disk_path=str(tmp_path)).store('ai/eve', 200, {'name': 'eve'}, etag='"e"')
+    cache = ResponseCache(ttl=60, disk_path=str(tmp_path))
+    entry, fresh = cache.lookup('ai/eve')
+    assert fresh and entry.content == {'name': 'eve'} and entry.etag == '"e"'
+    assert cache.disk_hits == 1
+    cache.invalidate('ai/eve')
+    assert ResponseCache(ttl=60, disk_path=str(tmp_path)).lookup('ai/eve') == (None, False)
+
+
+def test_unserialisable_bodies_stay_in_memory(tmp_path, clock):
+    cache = ResponseCache(ttl=60, disk_path=str(tmp_path))
+    cache.store('raw', 200, object())
+    assert cache.lookup('raw')[1]
+    assert not list(tmp_path.iterdir())
+
+
+async def serve_versions(state):
+    """GET /v1/health answering with the current version, 304 when If-None-Match still matches"""
+    async def handler(request):
+        state['validators'].append(request.headers.get('If-None-Match'))
+        etag = f'"{state["version"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response({'version': state['version']}, headers={'ETag': etag})
+
+    application = web.Application()
+    application.router.add_get('/v1/health', handler)
+    runner = web.AppRunner(application, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+
+def test_client_revalidates_stale_entries_with_if_none_match(clock):
+    state = {'version': 1, 'validators': []}
+    cache = ResponseCache(ttl=30)
+
+    async def run():
+        runner, base_url = await serve_versions(state)
+        try:
+            async with KindroidClient(config={}, base_url=base_url, cache=cache, max_retries=0) as client:
+                first = await client.request('GET', 'health')
+                again = await client.request('GET', 'health')
+                clock.now += 31
+                revalidated = await client.request('GET', 'health')
+                clock.now += 31
+                state['version'] = 2
+                changed = await client.request('GET', 'health')
+                latest = await client.request('GET', 'health')
+                return first, again, revalidated, changed, latest
+        finally:
+            await runner.cleanup()
+
+    first, again, revalidated, changed, latest = asyncio.run(run())
+    assert not first.cached and first.content == {'version': 1}
+    assert again.cached and again.content == {'version': 1}
+    assert revalidated.cached and revalidated.status == 200 and revalidated.content == {'version': 1}
+    assert not changed.cached and changed.content == {'version': 2}
+    assert latest.cached and latest.content == {'version': 2}
+    # The fresh hits never reached the server, the stale ones sent the etag they held
+    assert state['validators'] == [None, '"1"', '"1"']
+    assert cache.revalidations == 1
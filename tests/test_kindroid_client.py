@@ -0,0 +1,84 @@
+"""
+test_kindroid_client   reply text read from server sent event streams
+"""
+
+import asyncio
+
+from aiohttp import web
+
+from kindroidadapter.client import KindroidClient
+
+
+async def serve_events(body: bytes):
+    async def handler(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        # Split mid line so events are put back together across network reads
+        for start in range(0, len(body), 7):
+            await response.write(body[start:start + 7])
+        await response.write_eof()
+        return response
+
+    application = web.Application()
+    application.router.add_post("/v1/messages", handler)
+    runner = web.AppRunner(application, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+
+def stream_reply(body: bytes) -> str:
+    async def run():
+        runner, base_url = await serve_events(body)
+        try:
+            async with KindroidClient(config={}, base_url=base_url, use_cache=False) as client:
+                return await client.stream_message("hello").text()
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_events_are_joined():
+    body = b'data: {"delta": "he"}\n\n: comment\ndata: {"delta": "llo"}\r\n\r\ndata: [DONE]\n\n'
+    assert stream_reply(body) == "hello"
+
+
+def test_last_event_without_blank_line_is_kept():
+    assert stream_reply(b'data: {"delta": "he"}\n\ndata: {"delta": "llo"}\n') == "hello"
+    assert stream_reply(b'data: {"delta": "he"}\n\ndata: {"delta": "llo"}') == "hello"
+
+
+def test_multi_line_event_at_end_of_stream():
+    assert stream_reply(b'data: first\ndata: second') == "first\nsecond"
+
+
+def test_done_at_end_of_stream_is_not_text():
+    assert stream_reply(b'data: {"delta": "hi"}\n\ndata: [DONE]') == "hi"
+
+
+def test_raw_calls_report_error_statuses_and_message_helpers_raise():
+    from kindroidadapter.client import KindroidError
+    from standin import StandinConfig, running_standin
+
+    async def run():
+        async with running_standin(StandinConfig(error_rate=1.0, error_mix={400: 1})) as base_url:
+            async with KindroidClient(config={}, base_url=base_url, use_cache=False, max_retries=0) as client:
+                response = await client.request("POST", "messages", client.message_payload("hi"))
+                stream = client.stream("POST", "messages", client.message_payload("hi", stream=True))
+                text = await stream.text()
+                try:
+                    await client.stream_message("hi").text()
+                except KindroidError as e:
+                    streamed_error = e.status
+                try:
+                    await client.send_message("hi")
+                except KindroidError as e:
+                    sent_error = e.status
+        return response, stream, text, streamed_error, sent_error
+
+    response, stream, text, streamed_error, sent_error = asyncio.run(run())
+    assert response.status == 400 and not response.ok
+    assert stream.status == 400 and not stream.ok and text == "" and stream.error
+    assert streamed_error == sent_error == 400
@@ -0,0 +1,174 @@
+"""
+test_kindroid_scheduler   token bucket pacing, 429 halving and retries in the request scheduler
+"""
+
+import asyncio
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+
+from kindroidadapter import scheduler as scheduler_module
+from kindroidadapter.scheduler import RequestScheduler, TokenBucket, parse_retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, 'monotonic', clock)
+    return clock
+
+
+def response(status, **headers):
+    return SimpleNamespace(status=status, headers=headers)
+
+
+def replies(*statuses, retry_after=None):
+    """A send callable answering with each status in turn, counting the calls"""
+    pending = list(statuses)
+
+    async def send():
+        send.calls += 1
+        status = pending.pop(0)
+        return response(status, **({'Retry-After': retry_after} if retry_after is not None else {}))
+
+    send.calls = 0
+    return send
+
+
+def test_bucket_starts_full_and_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        assert bucket.wait_time() == 0.0
+        bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.wait_time() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.wait_time() == 0.0
+
+
+def test_bucket_never_holds_more_than_capacity(clock):
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    clock.now += 60
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.1)
+
+
+def test_unlimited_bucket_only_waits_for_a_pause(clock):
+    bucket = TokenBucket(rate=None)
+    for _ in range(100):
+        bucket.take()
+    assert bucket.wait_time() == 0.0
+    bucket.pause(5)
+    assert bucket.wait_time() == pytest.approx(5)
+    bucket.pause(1)
+    assert bucket.wait_time() == pytest.approx(5), "a shorter pause must not cut a longer one"
+    clock.now += 5
+    assert bucket.wait_time() == 0.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    import time
+    assert parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+
+
+def test_429_halves_the_rate_down_to_a_floor():
+    scheduler = RequestScheduler(rate=16.0, burst=100, max_retries=0, base_delay=0)
+    for expected in (8.0, 4.0, 2.0, 1.0, 1.0):
+        scheduler.bucket.tokens = scheduler.bucket.capacity
+        asyncio.run(scheduler.execute('message', replies(429)))
+        assert scheduler.bucket.rate == expected
+    assert scheduler.throttled == 5
+
+
+def test_successes_climb_back_to_the_quota():
+    scheduler = RequestScheduler(rate=20.0, burst=100, max_retries=0, base_delay=0)
+    asyncio.run(scheduler.execute('message', replies(429)))
+    assert scheduler.bucket.rate == 10.0
+    scheduler.bucket.tokens = scheduler.bucket.capacity
+    asyncio.run(scheduler.execute('message', replies(200)))
+    assert scheduler.bucket.rate == 11.0
+    for _ in range(20):
+        asyncio.run(scheduler.execute('message', replies(404)))
+    assert scheduler.bucket.rate == 20.0
+
+
+def test_429_retry_after_pauses_every_request(clock):
+    scheduler = RequestScheduler(rate=5.0, burst=5, max_retries=0)
+    asyncio.run(scheduler.execute('message', replies(429, retry_after='12')))
+    assert scheduler.bucket.wait_time() == pytest.approx(12)
+
+
+def test_fixed_rate_ignores_throttling():
+    scheduler = RequestScheduler(rate=8.0, burst=100, max_retries=0, adaptive=False)
+    asyncio.run(scheduler.execute('message', replies(429, retry_after='30')))
+    assert scheduler.bucket.rate == 8.0
+    assert scheduler.bucket.blocked_until == 0.0
+    assert scheduler.throttled == 0
+
+
+def test_retryable_statuses_are_retried_until_the_budget_is_spent():
+    scheduler = RequestScheduler(rate=None, max_retries=2, base_delay=0)
+    send = replies(503, 500, 502)
+    assert asyncio.run(scheduler.execute('message', send)).status == 502
+    assert send.calls == 3
+
+    send = replies(500, 200)
+    assert asyncio.run(scheduler.execute('message', send)).status == 200
+    assert send.calls == 2
+
+    send = replies(400)
+    assert asyncio.run(scheduler.execute('message', send)).status == 400
+    assert send.calls == 1
+    assert scheduler.in_flight == 0
+
+
+def test_timeouts_are_retried_then_raised():
+    scheduler = RequestScheduler(rate=None, max_retries=1, base_delay=0)
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise asyncio.TimeoutError
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scheduler.execute('message', send))
+    assert len(calls) == 2
+    assert scheduler.in_flight == 0
+
+
+def test_concurrency_is_bounded_and_lower_priority_goes_first():
+    scheduler = RequestScheduler(rate=None, max_concurrency=1, max_retries=0)
+    order = []
+    peak = [0]
+
+    async def job(name, priority):
+        async def send():
+            peak[0] = max(peak[0], scheduler.in_flight)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            return response(200)
+        await scheduler.execute('message', send, priority=priority)
+
+    async def run():
+        first = asyncio.ensure_future(job('first', 5))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, job('late', 9), job('urgent', 0), job('normal', 5))
+
+    asyncio.run(run())
+    assert peak[0] == 1
+    assert order == ['first', 'urgent', 'normal', 'late']
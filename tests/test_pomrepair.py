@@ -0,0 +1,64 @@
+"""
+test_pomrepair   rebuilding poms that lost their angle brackets
+"""
+
+import re
+
+from pomrepair import repair_pom_file, repair_pom_text
+
+# Shaped after the GhidraMCP pom, descriptors and appendAssemblyId are outside the vocabulary
+GHIDRA_POM = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>com.lauriewired</groupId>
+  <artifactId>GhidraMCP</artifactId>
+  <version>1.0</version>
+  <properties>
+    <ghidra.version>11.3</ghidra.version>
+  </properties>
+  <build>
+    <plugins>
+      <plugin>
+        <artifactId>maven-assembly-plugin</artifactId>
+        <configuration>
+          <descriptors>
+            <descriptor>src/assembly.xml</descriptor>
+          </descriptors>
+          <appendAssemblyId>false</appendAssemblyId>
+        </configuration>
+      </plugin>
+    </plugins>
+  </build>
+</project>
+"""
+
+
+def strip_brackets(text):
+    return re.sub(r'[<>]', '', text)
+
+
+def test_unknown_containers_are_rebuilt():
+    assert repair_pom_text(strip_brackets(GHIDRA_POM)) == GHIDRA_POM
+
+
+def test_repairing_a_repaired_pom_changes_nothing():
+    assert repair_pom_text(GHIDRA_POM) == GHIDRA_POM
+
+
+def test_file_is_repaired_in_place(tmp_path):
+    pom = tmp_path / 'pom.xml'
+    pom.write_text(strip_brackets(GHIDRA_POM), encoding='utf-8')
+    result = repair_pom_file(pom)
+    assert result['error'] is None and result['changed'] and result['well_formed']
+    assert pom.read_text(encoding='utf-8') == GHIDRA_POM
+
+
+def test_bare_words_left_over_keep_the_file_untouched(tmp_path):
+    # Nothing closes stray, so its place in the tree cannot be told
+    broken = strip_brackets(GHIDRA_POM).replace('      descriptors\n', '      stray words\n      descriptors\n')
+    pom = tmp_path / 'pom.xml'
+    pom.write_text(broken, encoding='utf-8')
+    result = repair_pom_file(pom)
+    assert result['error'] and 'stray' in result['error']
+    assert not result['well_formed']
+    assert pom.read_text(encoding='utf-8') == broken
@@ -0,0 +1,43 @@
+"""
+test_repairxml   files vanishing during a scan do not end it
+"""
+
+import json
+
+from repairxml import CACHE_NAME, XMLRepairer
+
+
+def make_files(root, count):
+    paths = []
+    for index in range(count):
+        path = root / f"file{index}.xml"
+        path.write_text(f"<root><item>{index}</item></root>\n", encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def test_file_deleted_after_its_check_is_a_cache_miss(tmp_path, monkeypatch):
+    paths = make_files(tmp_path, 3)
+    check_file = XMLRepairer.check_file
+
+    def check_then_delete(self, file_path, known_hash=None):
+        result = check_file(self, file_path, known_hash)
+        if file_path.name == 'file1.xml':
+            file_path.unlink()
+        return result
+
+    monkeypatch.setattr(XMLRepairer, 'check_file', check_then_delete)
+    repairer = XMLRepairer(str(tmp_path), workers=1)
+    repairer.scan_and_repair(paths)
+    cache = json.loads((tmp_path / CACHE_NAME).read_text(encoding='utf-8'))
+    assert sorted(cache) == ['file0.xml', 'file2.xml']
+
+
+def test_file_deleted_before_its_check_is_reported(tmp_path):
+    paths = make_files(tmp_path, 2)
+    repairer = XMLRepairer(str(tmp_path), workers=1)
+    result = repairer.check_file(tmp_path / 'missing.xml')
+    assert result['status'] == 'error' and result['sha256'] is None
+    repairer.scan_and_repair(paths + [tmp_path / 'missing.xml'])
+    assert repairer.valid_count == 2 and repairer.error_count == 1
+
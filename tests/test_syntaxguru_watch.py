@@ -0,0 +1,63 @@
+"""
+test_syntaxguru_watch   watch mode holds file events to the same ignore rules as the initial walk
+"""
+
+import os
+import sys
+
+import pytest
+
+from syntaxguru import InotifyWatcher, PollingWatcher, filter_changes
+from workspace import WorkspaceScanner
+
+
+def workspace_tree(root):
+    (root / '.gitignore').write_text('build/\n*_pb2.py\n', encoding='utf-8')
+    (root / 'pkg').mkdir()
+    (root / 'pkg' / 'module.py').write_text('x = 1\n', encoding='utf-8')
+    scanner = WorkspaceScanner(str(root))
+    list(scanner.walk())
+    return scanner
+
+
+def touch_everything(root):
+    (root / 'pkg' / 'module.py').write_text('x = 2\n', encoding='utf-8')
+    (root / 'pkg' / 'messages_pb2.py').write_text('y = 1\n', encoding='utf-8')
+    for directory in ('node_modules/lib', '.venv/lib', 'build/gen', 'fresh/inner'):
+        (root / directory).mkdir(parents=True)
+        (root / directory / 'code.py').write_text('z = 1\n', encoding='utf-8')
+
+
+def relative(root, paths):
+    return sorted(os.path.relpath(path, root) for path in paths)
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is linux only')
+def test_inotify_events_follow_the_ignore_rules(tmp_path):
+    scanner = workspace_tree(tmp_path)
+    watcher = InotifyWatcher(scanner)
+    touch_everything(tmp_path)
+    changed = filter_changes(scanner, watcher.changes())
+    assert relative(tmp_path, changed) == ['fresh/inner/code.py', 'pkg/module.py']
+    watched = set(watcher.directories.values())
+    assert str(tmp_path / 'fresh' / 'inner') in watched
+    assert not any(part in path for path in watched for part in ('node_modules', '.venv', 'build'))
+
+
+def test_polling_changes_follow_the_ignore_rules(tmp_path):
+    scanner = workspace_tree(tmp_path)
+    watcher = PollingWatcher(scanner, interval=0.01)
+    touch_everything(tmp_path)
+    # Polling compares size and mtime, make sure the same sized edit shows
+    os.utime(tmp_path / 'pkg' / 'module.py', ns=(0, 0))
+    changed = filter_changes(scanner, watcher.changes())
+    assert relative(tmp_path, changed) == ['fresh/inner/code.py', 'pkg/module.py']
+
+
+def test_gitignore_edits_take_effect(tmp_path):
+    scanner = workspace_tree(tmp_path)
+    generated = str(tmp_path / 'pkg' / 'messages_pb2.py')
+    assert filter_changes(scanner, {generated}) == set()
+    (tmp_path / '.gitignore').write_text('build/\n', encoding='utf-8')
+    gitignore = str(tmp_path / '.gitignore')
+    assert filter_changes(scanner, {generated, gitignore}) == {generated, gitignore}
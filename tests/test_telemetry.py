@@ -0,0 +1,23 @@
+"""
+test_telemetry   the body reservoir stays uniform over the bodies it is offered
+"""
+
+import random
+
+from telemetry import EndpointStats
+
+
+def test_reservoir_ignores_records_without_a_body():
+    random.seed(7)
+    later = 0
+    rounds = 2000
+    for _ in range(rounds):
+        stats = EndpointStats(sample_bodies=1)
+        # Many bodiless records first, then two bodies that should each be kept half the time
+        for _ in range(50):
+            stats.record(200, 0.01)
+        stats.record(200, 0.01, content='early')
+        stats.record(200, 0.01, content='late')
+        later += stats.samples == ['late']
+    assert stats.bodies_seen == 2
+    assert 0.45 < later / rounds < 0.55
@@ -0,0 +1,169 @@
+"""
+test_workspace   gitignore translation and the pruned walk of the workspace scanner
+"""
+
+import os
+
+import pytest
+
+from workspace import WorkspaceScanner, is_ignored, parse_gitignore
+
+
+def ignored(text: str, relative: str, is_dir: bool = False, base: str = '') -> bool:
+    return is_ignored(parse_gitignore(text, base), relative, is_dir)
+
+
+@pytest.mark.parametrize('pattern, path, expected', [
+    ('*.log', 'debug.log', True),
+    ('*.log', 'deep/down/debug.log', True),
+    ('*.log', 'debug.log.txt', False),
+    ('*.log', 'logs/debug', False),
+    ('debug?.txt', 'debug1.txt', True),
+    ('debug?.txt', 'debug10.txt', False),
+    ('debug?.txt', 'debug/.txt', False),
+    ('report[0-9].md', 'report7.md', True),
+    ('report[!0-9].md', 'report7.md', False),
+    ('report[!0-9].md', 'reportx.md', True),
+    (r'\#notes', '#notes', True),
+    ('# comment', '# comment', False),
+    ('trailing   ', 'trailing', True),
+])
+def test_globs(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize('pattern, path, expected', [
+    # A slash at the start or in the middle anchors to the .gitignore directory
+    ('/build', 'build', True),
+    ('/build', 'src/build', False),
+    ('docs/out', 'docs/out', True),
+    ('docs/out', 'site/docs/out', False),
+    # Without one the name matches at any depth
+    ('build', 'src/build', True),
+    ('*.tmp', 'a/b/c.tmp', True),
+    ('src/*.py', 'src/a.py', True),
+    ('src/*.py', 'src/pkg/a.py', False),
+])
+def test_anchoring(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize('pattern, path, expected', [
+    ('**/cache', 'cache', True),
+    ('**/cache', 'a/b/cache', True),
+    ('**/cache/data', 'x/cache/data', True),
+    ('logs/**', 'logs/a', True),
+    ('logs/**', 'logs/a/b.txt', True),
+    ('logs/**', 'logs', False),
+    ('a/**/b', 'a/b', True),
+    ('a/**/b', 'a/x/y/b', True),
+    ('a/**/b', 'c/a/x/b', False),
+])
+def test_double_star(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+def test_directory_only_patterns_skip_files():
+    assert ignored('out/', 'out', is_dir=True)
+    assert ignored('out/', 'nested/out', is_dir=True)
+    assert not ignored('out/', 'out', is_dir=False)
+
+
+def test_last_matching_rule_wins():
+    text = '*.md\n!keep.md\n'
+    assert ignored(text, 'drop.md')
+    assert not ignored(text, 'keep.md')
+    assert not ignored(text, 'docs/keep.md')
+    assert ignored(text + 'keep.md\n', 'keep.md')
+    assert ignored('!keep.md\n*.md\n', 'keep.md'), 'a negation before the pattern it undoes has no effect'
+
+
+def test_rules_only_apply_below_their_gitignore():
+    rules = parse_gitignore('/generated\n*.bak\n', base='pkg/')
+    assert is_ignored(rules, 'pkg/generated', True)
+    assert is_ignored(rules, 'pkg/sub/old.bak', False)
+    assert not is_ignored(rules, 'generated', True)
+    assert not is_ignored(rules, 'pkg/sub/generated', True)
+    assert not is_ignored(rules, 'other/old.bak', False)
+
+
+def make_tree(root, files):
+    for relative, content in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding='utf-8')
+
+
+TREE = {
+    '.gitignore': '*.log\nbuild/\n/secret.txt\n!important.log\n',
+    'main.py': '',
+    'run.log': '',
+    'important.log': '',
+    'secret.txt': '',
+    'build/out.py': '',
+    'node_modules/lib/index.js': '',
+    'src/app.py': '',
+    'src/secret.txt': '',
+    'src/trace.log': '',
+    'src/build/nested.py': '',
+    'src/.gitignore': 'generated/\n!trace.log\n*.tmp\n',
+    'src/generated/a.py': '',
+    'src/scratch.tmp': '',
+    'src/deep/keep.py': '',
+    'src/deep/x.tmp': '',
+    'docs/readme.md': '',
+    'docs/scratch.tmp': '',
+}
+
+
+def walked(scanner, start=None):
+    return sorted(os.path.relpath(entry.path, scanner.root).replace(os.sep, '/') for entry in scanner.walk(start))
+
+
+def test_walk_prunes_ignored_directories(tmp_path):
+    make_tree(tmp_path, TREE)
+    scanner = WorkspaceScanner(str(tmp_path))
+    assert walked(scanner) == [
+        '.gitignore', 'docs/readme.md', 'docs/scratch.tmp', 'important.log', 'main.py',
+        'src/.gitignore', 'src/app.py', 'src/deep/keep.py', 'src/secret.txt', 'src/trace.log',
+    ]
+    # build, node_modules, src/build and src/generated are never entered
+    assert scanner.directories_pruned == 4
+    assert sorted(os.path.relpath(d, tmp_path) for d in scanner.directories) == ['.', 'docs', 'src', 'src/deep']
+
+
+def test_walk_without_gitignore_keeps_default_names(tmp_path):
+    make_tree(tmp_path, TREE)
+    files = walked(WorkspaceScanner(str(tmp_path), use_gitignore=False))
+    assert 'build/out.py' in files and 'src/generated/a.py' in files
+    assert not any(path.startswith('node_modules/') for path in files)
+
+
+def test_walk_from_a_subdirectory_keeps_the_rules_above(tmp_path):
+    make_tree(tmp_path, TREE)
+    scanner = WorkspaceScanner(str(tmp_path))
+    assert walked(scanner, str(tmp_path / 'src')) == [
+        'src/.gitignore', 'src/app.py', 'src/deep/keep.py', 'src/secret.txt', 'src/trace.log',
+    ]
+
+
+def test_is_path_ignored_agrees_with_the_walk(tmp_path):
+    make_tree(tmp_path, TREE)
+    scanner = WorkspaceScanner(str(tmp_path))
+    kept = set(walked(scanner))
+    for relative in TREE:
+        assert scanner.is_path_ignored(str(tmp_path / relative)) is (relative not in kept), relative
+    assert scanner.is_path_ignored(str(tmp_path / 'src' / 'generated'), is_dir=True)
+    assert not scanner.is_path_ignored(str(tmp_path / 'src'), is_dir=True)
+    assert not scanner.is_path_ignored(str(tmp_path))
+    assert scanner.is_path_ignored(str(tmp_path.parent / 'elsewhere.py'))
+
+
+def test_changed_gitignore_needs_forget_ignore_rules(tmp_path):
+    make_tree(tmp_path, TREE)
+    scanner = WorkspaceScanner(str(tmp_path))
+    assert not scanner.is_path_ignored(str(tmp_path / 'main.py'))
+    (tmp_path / '.gitignore').write_text('*.py\n', encoding='utf-8')
+    assert not scanner.is_path_ignored(str(tmp_path / 'main.py'))
+    scanner.forget_ignore_rules()
+    assert scanner.is_path_ignored(str(tmp_path / 'main.py'))
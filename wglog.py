@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+wglog   shared logging pipeline for wooden ghost tools
+callers only put records on a queue, a background listener formats and writes them
+per item messages can be sampled or rate limited and output is the aesthetic text renderer or json lines
+
+environment
+    WG_LOG_FORMAT   text or json (default: text)
+    WG_LOG_LEVEL    debug info warning error (default: info)
+    WG_LOG_SAMPLE   keep one in N per item messages (default: 1, all of them)
+    WG_LOG_RATE     at most this many per item messages a second, 0 for no limit (default: 0)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, IO, Optional
+
+# Pass as extra= on messages logged once per file, gist or request, they are the ones sampling thins out
+ITEM = {'item': True}
+
+# Renderers for the formats each tool has always printed
+STYLES = {
+    'aesthetic': '%(asctime)s ○ %(message)s',
+    'plain': '%(message)s',
+    'eve': '%(asctime)s ◆ %(levelname)s ◆ %(message)s',
+    'eve-plain': '%(asctime)s | %(levelname)s | %(message)s',
+}
+DATE_FORMAT = '%H:%M:%S'
+
+# Attributes every LogRecord has, anything else came in through extra= and goes into json output
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'item'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+    """One json object per record, extra fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            'ts': round(record.created, 6),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                document[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            document['exception'] = record.exc_text
+        return json.dumps(document, ensure_ascii=False)
+
+
+class ItemFilter(logging.Filter):
+    """Thins out per item messages by sampling and a per second budget, warnings and above always pass
+
+    What was dropped is reported with the next message that gets through,
+    so the log still says how much happened.
+    """
+
+    def __init__(self, sample: int = 1, rate: float = 0.0):
+        super().__init__()
+        self.sample = max(1, sample)
+        self.rate = rate
+        self.seen = 0
+        self.dropped = 0
+        self.window = 0
+        self.window_count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, 'item', False):
+            return True
+        self.seen += 1
+        if (self.seen - 1) % self.sample:
+            self.dropped += 1
+            return False
+        if self.rate > 0:
+            window = int(time.monotonic())
+            if window != self.window:
+                self.window = window
+                self.window_count = 0
+            if self.window_count >= self.rate:
+                self.dropped += 1
+                return False
+            self.window_count += 1
+        if self.dropped:
+            record.suppressed = self.dropped
+            self.dropped = 0
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread
+
+    The stock handler merges args into the message before queueing, which is the
+    cost this pipeline exists to move off the calling thread. Records never leave
+    the process, so they can travel as they are. Tracebacks are rendered here
+    because the frames they point at are about to change.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SuppressedAwareFormatter(logging.Formatter):
+    """The aesthetic renderer, noting how many per item messages were left out before this one"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" (+{suppressed} similar)"
+        return text
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def configure(style: str = 'aesthetic', level: Optional[int] = None, json_output: Optional[bool] = None,
+              sample: Optional[int] = None, rate: Optional[float] = None,
+              stream: Optional[IO] = None) -> logging.Logger:
+    """Route the root logger through a queue to a background writer, only the first call has an effect
+
+    Like basicConfig it leaves an already configured root logger alone.
+    """
+    global _listener
+    root = logging.getLogger()
+    with _lock:
+        if _listener is not None or root.handlers:
+            return root
+        if json_output is None:
+            json_output = os.environ.get('WG_LOG_FORMAT', 'text').lower() == 'json'
+        if level is None:
+            level = logging.getLevelName(os.environ.get('WG_LOG_LEVEL', 'INFO').upper())
+            if not isinstance(level, int):
+                level = logging.INFO
+        if sample is None:
+            sample = int(_env_number('WG_LOG_SAMPLE', 1))
+        if rate is None:
+            rate = _env_number('WG_LOG_RATE', 0.0)
+
+        writer = logging.StreamHandler(stream or sys.stderr)
+        if json_output:
+            writer.setFormatter(JSONFormatter())
+        else:
+            writer.setFormatter(SuppressedAwareFormatter(STYLES.get(style, style), datefmt=DATE_FORMAT))
+
+        handler = DeferredQueueHandler(queue.SimpleQueue())
+        if sample > 1 or rate > 0:
+            handler.addFilter(ItemFilter(sample, rate))
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(flush)
+    return root
+
+
+def flush():
+    """Write out everything queued so far and stop the writer, safe to call more than once"""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, DeferredQueueHandler):
+                root.removeHandler(handler)
+        # Anything logged from here on, late exit hooks included, is written directly
+        for handler in listener.handlers:
+            root.addHandler(handler)
+
+
+LEVELS: Dict[str, int] = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+workspace   single walk workspace scanner for wooden ghost tools
+walks the tree once with scandir, prunes vendored and ignored directories
+and dispatches files by suffix to the handlers registered by syntaxguru repairxml and cleanmd
+"""
+
+import argparse
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import instrumentation
+import wglog
+
+logger = logging.getLogger('WoodenGhost.Workspace')
+
+# Directories never worth descending into, whatever the ignore files say
+DEFAULT_IGNORE_NAMES = frozenset({
+    '.git', '.hg', '.svn', 'node_modules', 'target', '__pycache__',
+    '.venv', 'venv', '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.gradle',
+})
+
+GITIGNORE_NAME = '.gitignore'
+
+# (directory relative to the root with a trailing slash, compiled pattern, negated, directories only)
+IgnoreRule = Tuple[str, 're.Pattern', bool, bool]
+
+
+def _translate(pattern: str) -> str:
+    """Regex source for one gitignore glob, matched against a path relative to its .gitignore"""
+    parts = []
+    index = 0
+    length = len(pattern)
+    while index < length:
+        char = pattern[index]
+        if pattern.startswith('**/', index):
+            parts.append('(?:.*/)?')
+            index += 3
+            continue
+        if pattern.startswith('**', index):
+            parts.append('.*')
+            index += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', index + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[index + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append('[' + body.replace('\\', '\\\\') + ']')
+                index = end
+        elif char == '\\' and index + 1 < length:
+            index += 1
+            parts.append(re.escape(pattern[index]))
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return ''.join(parts)
+
+
+def parse_gitignore(text: str, base: str = '') -> List[IgnoreRule]:
+    """Rules from one .gitignore whose directory is base relative to the scan root"""
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        directory_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        if '/' in line:
+            # A slash anywhere but the end anchors the pattern to the .gitignore directory
+            source = _translate(line.lstrip('/'))
+        else:
+            source = '(?:.*/)?' + _translate(line)
+        rules.append((base, re.compile(source + r'\Z', re.DOTALL), negated, directory_only))
+    return rules
+
+
+def is_ignored(rules: Iterable[IgnoreRule], relative: str, is_dir: bool) -> bool:
+    """Apply rules in order, the last one matching decides like in git"""
+    ignored = False
+    for base, pattern, negated, directory_only in rules:
+        if directory_only and not is_dir:
+            continue
+        if base and not relative.startswith(base):
+            continue
+        if pattern.match(relative, len(base)):
+            ignored = not negated
+    return ignored
+
+
+class WorkspaceScanner:
+    """One scandir walk of a tree, handing every file to the handlers registered for its suffix"""
+
+    def __init__(self, root: str = '.', ignore_names: Iterable[str] = DEFAULT_IGNORE_NAMES,
+                 use_gitignore: bool = True):
+        self.root = Path(root)
+        self.ignore_names = frozenset(ignore_names)
+        self.use_gitignore = use_gitignore
+        self.handlers: Dict[str, Callable[[List[Path]], object]] = {}
+        self.suffix_handlers: Dict[str, List[str]] = {}
+        self.directories: List[str] = []
+        self.directories_walked = 0
+        self.directories_pruned = 0
+        self.files_seen = 0
+        # Rules of each .gitignore by its directory relative to root, what is_path_ignored consults
+        self._gitignores: Dict[str, List[IgnoreRule]] = {}
+
+    def register(self, name: str, suffixes: Iterable[str], handler: Callable[[List[Path]], object]):
+        """Send files ending in any of suffixes to handler, called once with all of them after the walk"""
+        self.handlers[name] = handler
+        for suffix in suffixes:
+            self.suffix_handlers.setdefault(suffix.lower(), []).append(name)
+
+    def _load_gitignore(self, directory: str, relative: str) -> List[IgnoreRule]:
+        try:
+            with open(os.path.join(directory, GITIGNORE_NAME), 'r', encoding='utf-8', errors='ignore') as f:
+                return parse_gitignore(f.read(), relative)
+        except OSError:
+            return []
+
+    def _gitignore_rules(self, relative: str) -> List[IgnoreRule]:
+        rules = self._gitignores.get(relative)
+        if rules is None:
+            rules = self._gitignores[relative] = self._load_gitignore(os.path.join(self.root, relative), relative)
+        return rules
+
+    def forget_ignore_rules(self):
+        """Drop the cached .gitignore rules, after one of the files changed"""
+        self._gitignores.clear()
+
+    def is_path_ignored(self, path: str, is_dir: bool = False) -> bool:
+        """Whether the walk would leave path out, for paths reported after it such as watcher events
+
+        Every directory on the way from root is checked like the walk checks it, so a
+        file below an ignored directory is ignored too. Paths outside root always are.
+        """
+        relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+        if relative == '.':
+            return False
+        if relative == '..' or relative.startswith('../'):
+            return True
+        names = relative.split('/')
+        rules: List[IgnoreRule] = []
+        prefix = ''
+        for index, name in enumerate(names):
+            if self.use_gitignore:
+                local = self._gitignore_rules(prefix)
+                if local:
+                    rules = rules + local
+            directory = is_dir or index < len(names) - 1
+            if directory and name in self.ignore_names:
+                return True
+            if rules and is_ignored(rules, prefix + name, directory):
+                return True
+            prefix += name + '/'
+        return False
+
+    def walk(self, start: Optional[str] = None) -> Iterator[os.DirEntry]:
+        """Every file below root that no ignore rule excludes, symlinked directories are not followed
+
+        start limits the walk to one directory below root, still under the rules of the
+        .gitignore files above it. The directories visited are kept in self.directories,
+        for watchers
+        """
+        stack: List[Tuple[str, str, List[IgnoreRule]]] = [(str(self.root), '', [])]
+        if start is not None:
+            relative = os.path.relpath(start, self.root).replace(os.sep, '/')
+            rules: List[IgnoreRule] = []
+            prefix = ''
+            for name in relative.split('/') if relative != '.' else []:
+                if self.use_gitignore:
+                    rules = rules + self._gitignore_rules(prefix)
+                prefix += name + '/'
+            stack = [(str(start), prefix, rules)]
+        while stack:
+            directory, relative, rules = stack.pop()
+            if self.use_gitignore:
+                local = self._load_gitignore(directory, relative)
+                if local:
+                    rules = rules + local
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError as e:
+                logger.warning(f"could not read {directory}: {e}")
+                continue
+            self.directories.append(directory)
+            self.directories_walked += 1
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                path = relative + entry.name
+                if is_dir:
+                    if entry.name in self.ignore_names or (rules and is_ignored(rules, path, True)):
+                        self.directories_pruned += 1
+                        continue
+                    stack.append((entry.path, path + '/', rules))
+                elif rules and is_ignored(rules, path, False):
+                    continue
+                else:
+                    self.files_seen += 1
+                    yield entry
+
+    def collect(self) -> Dict[str, List[Path]]:
+        """Walk once and group matching files by handler name"""
+        batches: Dict[str, List[Path]] = {name: [] for name in self.handlers}
+        suffix_handlers = self.suffix_handlers
+        with instrumentation.phase('walk'):
+            for entry in self.walk():
+                names = suffix_handlers.get(os.path.splitext(entry.name)[1].lower())
+                if names:
+                    path = Path(entry.path)
+                    for name in names:
+                        batches[name].append(path)
+        return batches
+
+    def run(self) -> Dict[str, object]:
+        """Walk once, then call every handler in registration order with its files"""
+        started = time.perf_counter()
+        batches = self.collect()
+        logger.info(f"walked {self.directories_walked} directories and {self.files_seen} files "
+                    f"in {time.perf_counter() - started:.2f}s, pruned {self.directories_pruned} directories")
+        return {name: handler(batches[name]) for name, handler in self.handlers.items()}
+
+
+def collect_files(root: str, suffixes: Iterable[str]) -> List[Path]:
+    """Files below root with one of suffixes, for tools running on their own"""
+    scanner = WorkspaceScanner(root)
+    scanner.register('files', suffixes, lambda files: files)
+    return scanner.collect()['files']
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the workspace checks from a single walk of the tree")
+    parser.add_argument("root", nargs="?", default=".", help="directory to scan (default: current)")
+    parser.add_argument("--no-python", action="store_true", help="skip the python syntax audit")
+    parser.add_argument("--no-xml", action="store_true", help="skip xml validation and repair")
+    parser.add_argument("--markdown", action="store_true",
+                        help="also convert markdown to text, this replaces the .md files")
+    parser.add_argument("--no-gitignore", action="store_true", help="do not honour .gitignore files")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_arguments()
+    instrumentation.setup('workspace', args)
+    scanner = WorkspaceScanner(args.root, use_gitignore=not args.no_gitignore)
+    if not args.no_python:
+        import syntaxguru
+        scanner.register('python', syntaxguru.PYTHON_SUFFIXES, syntaxguru.audit_python)
+    if not args.no_xml:
+        import repairxml
+        scanner.register('xml', repairxml.XML_SUFFIXES, repairxml.XMLRepairer(args.root).scan_and_repair)
+    if args.markdown:
+        import cleanmd
+        scanner.register('markdown', cleanmd.MARKDOWN_SUFFIXES,
+                         cleanmd.SafeMarkdownConverter(args.root).process_files)
+    scanner.run()
+
+
+if __name__ == '__main__':
+    wglog.configure()
+    main()